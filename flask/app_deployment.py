@@ -4,19 +4,87 @@ Handles deployment of AI-generated apps to the VPN Enterprise platform
 """
 
 import asyncio
+import gzip
+import hashlib
 import httpx
+import importlib.util
+import logging
 import os
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime
 import json
 
+from task_graph import TaskGraph
+
+logger = logging.getLogger(__name__)
+
+class TransientDeploymentError(Exception):
+    """Platform answered with a gateway error; the step is safe to retry"""
+
+# Only retry failures where the platform cannot have acted on the request
+RETRYABLE_STEP_ERRORS = (
+    httpx.ConnectError,
+    httpx.ConnectTimeout,
+    httpx.PoolTimeout,
+    TransientDeploymentError
+)
+
+# Bulk upload tuning for _deploy_files
+UPLOAD_CHUNK_BYTES = int(os.getenv("DEPLOY_UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+UPLOAD_CONCURRENCY = int(os.getenv("DEPLOY_UPLOAD_CONCURRENCY", "4"))
+UPLOAD_CHUNK_RETRIES = int(os.getenv("DEPLOY_UPLOAD_CHUNK_RETRIES", "3"))
+
 class AppDeploymentService:
     """Deploy AI-generated apps to the platform with database and hosting"""
     
-    def __init__(self):
+    def __init__(self, client: Optional[httpx.AsyncClient] = None):
         self.platform_api = os.getenv("PLATFORM_API_URL", "http://vpn-api:5000")
         self.hosting_api = os.getenv("HOSTING_API_URL", "http://vpn-api:5000/api/v1/hosting")
         
+        # Connection pool tuning (one long-lived client shared by every deployment)
+        self.pool_limits = httpx.Limits(
+            max_connections=int(os.getenv("DEPLOY_HTTP_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.getenv("DEPLOY_HTTP_MAX_KEEPALIVE", "20")),
+            keepalive_expiry=float(os.getenv("DEPLOY_HTTP_KEEPALIVE_EXPIRY", "30"))
+        )
+        # HTTP/2 needs the optional h2 package and an https:// upstream
+        self.http2 = (
+            os.getenv("DEPLOY_HTTP2", "true").lower() == "true"
+            and importlib.util.find_spec("h2") is not None
+        )
+        self._client = client
+        
+        self.step_retry = {
+            "retries": int(os.getenv("DEPLOY_STEP_RETRIES", "2")),
+            "retry_on": RETRYABLE_STEP_ERRORS,
+            "backoff": float(os.getenv("DEPLOY_STEP_BACKOFF", "0.5"))
+        }
+    
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Shared pooled client, created on first use if start() was not called"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                limits=self.pool_limits,
+                http2=self.http2,
+                timeout=30.0
+            )
+        return self._client
+    
+    async def start(self):
+        """Open the pooled client (call from the FastAPI lifespan)"""
+        _ = self.client
+    
+    async def aclose(self):
+        """Close the pooled client and its keep-alive connections"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+    
+    async def _post(self, url: str, **kwargs: Any) -> httpx.Response:
+        """POST through the shared client (per-call timeouts still apply)"""
+        return await self.client.post(url, **kwargs)
+        
     async def deploy_app(
         self, 
         user_id: str,
@@ -29,99 +97,125 @@ class AppDeploymentService:
         """
         Deploy an AI-generated app to the platform
         
-        Steps:
-        1. Create tenant database (if needed)
-        2. Create hosting service
-        3. Deploy app files
-        4. Install dependencies
-        5. Configure environment
-        6. Start the app
+        Steps (run as a graph, independent steps in parallel):
+        1. Create tenant database (if needed)   } concurrently
+        2. Create hosting service               }
+        3. Deploy app files + install dependencies (after hosting)
+        4. Configure environment (after database and hosting)
+        5. Start the app (after files and environment)
+        
+        result["steps"] records status, attempts and duration_ms per step.
         """
         
         deployment_id = f"deploy_{datetime.utcnow().timestamp()}"
         
-        try:
-            result = {
-                "deployment_id": deployment_id,
-                "app_name": app_name,
-                "status": "deploying",
-                "steps": []
-            }
-            
-            # Step 1: Create database if needed
-            if requires_database:
-                database_info = await self._provision_database(user_id, app_name)
-                result["database"] = database_info
-                result["steps"].append({"step": "database", "status": "completed"})
-            
-            # Step 2: Create hosting service
-            hosting_info = await self._provision_hosting(user_id, app_name, framework)
-            result["hosting"] = hosting_info
-            result["steps"].append({"step": "hosting", "status": "completed"})
-            
-            # Step 3: Deploy files
-            deploy_info = await self._deploy_files(
-                hosting_info["service_id"],
-                files,
-                dependencies
-            )
-            result["deployment"] = deploy_info
-            result["steps"].append({"step": "files", "status": "completed"})
-            
-            # Step 4: Generate environment config
-            env_config = self._generate_env_config(
-                database_info if requires_database else None,
-                hosting_info
+        # Database and hosting are independent; everything else waits on hosting,
+        # and the environment (and so the start) also needs the database.
+        graph = TaskGraph()
+        env_deps = ["hosting"]
+        if requires_database:
+            graph.add(
+                "database",
+                lambda done: self._provision_database(user_id, app_name),
+                **self.step_retry
             )
-            result["environment"] = env_config
-            result["steps"].append({"step": "environment", "status": "completed"})
-            
-            # Step 5: Start the app
-            start_info = await self._start_app(hosting_info["service_id"])
-            result["app_url"] = start_info["url"]
-            result["status"] = "deployed"
-            result["steps"].append({"step": "start", "status": "completed"})
-            
-            return result
-            
+            env_deps.append("database")
+        graph.add(
+            "hosting",
+            lambda done: self._provision_hosting(user_id, app_name, framework),
+            **self.step_retry
+        )
+        graph.add(
+            "files",
+            lambda done: self._deploy_files(done["hosting"]["service_id"], files, dependencies),
+            deps=["hosting"],
+            **self.step_retry
+        )
+        
+        async def build_environment(done: Dict[str, Any]) -> Dict[str, str]:
+            return self._generate_env_config(done.get("database"), done["hosting"])
+        
+        graph.add("environment", build_environment, deps=env_deps)
+        graph.add(
+            "start",
+            lambda done: self._start_app(done["hosting"]["service_id"]),
+            deps=["files", "environment"],
+            **self.step_retry
+        )
+        
+        try:
+            done = await graph.run()
         except Exception as e:
             return {
                 "deployment_id": deployment_id,
                 "status": "failed",
-                "error": str(e)
+                "error": str(e),
+                "steps": self._step_report(graph)
             }
+        
+        result = {
+            "deployment_id": deployment_id,
+            "app_name": app_name,
+            "status": "deployed",
+            "steps": self._step_report(graph),
+            "hosting": done["hosting"],
+            "deployment": done["files"],
+            "environment": done["environment"],
+            "app_url": done["start"]["url"]
+        }
+        if requires_database:
+            result["database"] = done["database"]
+        return result
+    
+    def _step_report(self, graph: TaskGraph) -> List[Dict[str, Any]]:
+        """Per-step status, attempts and timing for result["steps"]"""
+        return [
+            {
+                "step": name,
+                "status": graph.stats[name].status,
+                "attempts": graph.stats[name].attempts,
+                "duration_ms": graph.stats[name].duration_ms
+            }
+            for name in graph.names
+        ]
+    
+    def _check_response(self, response: httpx.Response, expected: int, action: str):
+        """Raise for unexpected status codes (gateway errors are retryable)"""
+        if response.status_code == expected:
+            return
+        if response.status_code in (502, 503, 504):
+            raise TransientDeploymentError(f"Failed to {action}: {response.text}")
+        raise Exception(f"Failed to {action}: {response.text}")
     
     async def _provision_database(self, user_id: str, app_name: str) -> Dict[str, Any]:
         """Create a new tenant database for the app"""
         
-        async with httpx.AsyncClient() as client:
-            # Create tenant database
-            response = await client.post(
-                f"{self.platform_api}/api/v1/tenants/provision",
-                json={
-                    "name": f"{app_name}_db",
-                    "description": f"Database for {app_name}",
-                    "owner_id": user_id,
-                    "plan": "starter",  # Can be upgraded later
-                    "region": "us-east-1"
-                },
-                timeout=30.0
-            )
-            
-            if response.status_code != 201:
-                raise Exception(f"Failed to provision database: {response.text}")
-            
-            data = response.json()
-            
-            return {
-                "tenant_id": data["tenant_id"],
-                "database_name": data["database_name"],
-                "connection_string": data["connection_string"],
-                "host": data["host"],
-                "port": data["port"],
-                "username": data["username"],
-                "password": data["password"]
-            }
+        # Create tenant database
+        response = await self._post(
+            f"{self.platform_api}/api/v1/tenants/provision",
+            json={
+                "name": f"{app_name}_db",
+                "description": f"Database for {app_name}",
+                "owner_id": user_id,
+                "plan": "starter",  # Can be upgraded later
+                "region": "us-east-1"
+            },
+            timeout=30.0
+        )
+        
+        self._check_response(response, 201, "provision database")
+        
+        data = response.json()
+        
+        return {
+            "tenant_id": data["tenant_id"],
+            "database_name": data["database_name"],
+            "connection_string": data["connection_string"],
+            "host": data["host"],
+            "port": data["port"],
+            "username": data["username"],
+            "password": data["password"]
+        }
     
     async def _provision_hosting(
         self, 
@@ -131,36 +225,34 @@ class AppDeploymentService:
     ) -> Dict[str, Any]:
         """Create hosting service for the app"""
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.hosting_api}/services",
-                json={
-                    "name": app_name,
-                    "type": self._get_service_type(framework),
-                    "plan": "starter",
-                    "owner_id": user_id,
-                    "config": {
-                        "framework": framework,
-                        "node_version": "20",
-                        "auto_deploy": True,
-                        "build_command": self._get_build_command(framework),
-                        "start_command": self._get_start_command(framework)
-                    }
-                },
-                timeout=30.0
-            )
-            
-            if response.status_code != 201:
-                raise Exception(f"Failed to provision hosting: {response.text}")
-            
-            data = response.json()
-            
-            return {
-                "service_id": data["service_id"],
-                "domain": data["domain"],
-                "status": data["status"],
-                "resource_limits": data["resource_limits"]
-            }
+        response = await self._post(
+            f"{self.hosting_api}/services",
+            json={
+                "name": app_name,
+                "type": self._get_service_type(framework),
+                "plan": "starter",
+                "owner_id": user_id,
+                "config": {
+                    "framework": framework,
+                    "node_version": "20",
+                    "auto_deploy": True,
+                    "build_command": self._get_build_command(framework),
+                    "start_command": self._get_start_command(framework)
+                }
+            },
+            timeout=30.0
+        )
+        
+        self._check_response(response, 201, "provision hosting")
+        
+        data = response.json()
+        
+        return {
+            "service_id": data["service_id"],
+            "domain": data["domain"],
+            "status": data["status"],
+            "resource_limits": data["resource_limits"]
+        }
     
     async def _deploy_files(
         self,
@@ -168,38 +260,159 @@ class AppDeploymentService:
         files: List[Dict[str, Any]],
         dependencies: Dict[str, str]
     ) -> Dict[str, Any]:
-        """Deploy app files to hosting service"""
-        
-        async with httpx.AsyncClient() as client:
-            # Create deployment
-            response = await client.post(
-                f"{self.hosting_api}/services/{service_id}/deployments",
-                json={
-                    "files": files,
-                    "dependencies": dependencies,
-                    "auto_install": True
-                },
-                timeout=120.0  # Longer timeout for file upload
-            )
-            
-            if response.status_code != 201:
-                raise Exception(f"Failed to deploy files: {response.text}")
-            
-            return response.json()
+        """
+        Deploy app files to hosting service
+        
+        Files are uploaded as gzip blobs addressed by the SHA-256 of their content:
+        1. Ask the hosting API which blobs it does not already hold
+        2. Upload only those, in resumable chunks
+        3. Create the deployment from a manifest of (path, hash) entries
+        Redeploys of lightly edited apps therefore only transfer changed files.
+        Hosting APIs without the blob endpoints get the legacy inline upload.
+        """
+        
+        manifest, blobs = await asyncio.to_thread(self._pack_files, files)
+        missing = await self._missing_blobs(service_id, list(blobs))
+        if missing is None:
+            return await self._deploy_files_inline(service_id, files, dependencies)
+        unknown = [digest for digest in missing if digest not in blobs]
+        if unknown:
+            logger.warning(f"⚠️  Hosting API asked for {len(unknown)} unknown blob(s), ignoring: {unknown[:3]}")
+            missing = [digest for digest in missing if digest in blobs]
+        
+        semaphore = asyncio.Semaphore(UPLOAD_CONCURRENCY)
+        
+        async def upload(digest: str):
+            async with semaphore:
+                await self._upload_blob(service_id, digest, blobs[digest])
+        
+        await asyncio.gather(*(upload(digest) for digest in missing))
+        
+        response = await self._post(
+            f"{self.hosting_api}/services/{service_id}/deployments",
+            json={
+                "manifest": manifest,
+                "dependencies": dependencies,
+                "auto_install": True
+            },
+            timeout=60.0
+        )
+        
+        self._check_response(response, 201, "deploy files")
+        
+        data = response.json()
+        data["upload"] = {
+            "blobs": len(blobs),
+            "uploaded": len(missing),
+            "bytes_uploaded": sum(len(blobs[d]) for d in missing),
+            "bytes_skipped": sum(len(blobs[d]) for d in blobs if d not in missing)
+        }
+        return data
+    
+    async def _deploy_files_inline(
+        self,
+        service_id: str,
+        files: List[Dict[str, Any]],
+        dependencies: Dict[str, str]
+    ) -> Dict[str, Any]:
+        """Legacy upload: every file inline in a single JSON body"""
+        
+        # Create deployment
+        response = await self._post(
+            f"{self.hosting_api}/services/{service_id}/deployments",
+            json={
+                "files": files,
+                "dependencies": dependencies,
+                "auto_install": True
+            },
+            timeout=120.0  # Longer timeout for file upload
+        )
+        
+        self._check_response(response, 201, "deploy files")
+        
+        return response.json()
+    
+    def _pack_files(self, files: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[str, bytes]]:
+        """Build the deployment manifest and the gzip blobs keyed by content hash"""
+        manifest = []
+        blobs: Dict[str, bytes] = {}
+        for file in files:
+            raw = file.get("content", "").encode("utf-8")
+            digest = hashlib.sha256(raw).hexdigest()
+            if digest not in blobs:
+                blobs[digest] = gzip.compress(raw, compresslevel=6, mtime=0)
+            manifest.append({
+                "path": file["path"],
+                "hash": digest,
+                "size": len(raw),
+                "language": file.get("language", "text")
+            })
+        return manifest, blobs
+    
+    async def _missing_blobs(self, service_id: str, digests: List[str]) -> Optional[List[str]]:
+        """Hashes the hosting API still needs, or None if it has no blob store"""
+        response = await self._post(
+            f"{self.hosting_api}/services/{service_id}/blobs/missing",
+            json={"hashes": digests},
+            timeout=30.0
+        )
+        if response.status_code in (404, 405, 501):
+            return None
+        self._check_response(response, 200, "query deployed blobs")
+        return response.json().get("missing", [])
+    
+    async def _upload_blob(self, service_id: str, digest: str, data: bytes):
+        """Upload one blob in chunks, resuming from the server's offset after failures"""
+        url = f"{self.hosting_api}/services/{service_id}/blobs/{digest}"
+        offset = 0
+        failures = 0
+        resume = False  # After a failure: ask the server how much it stored first
+        
+        while resume or offset < len(data):
+            try:
+                if resume:
+                    # Probed under the same retries: the network may still be down
+                    status = await self.client.get(url, timeout=30.0)
+                    offset = int(status.json().get("received", 0)) if status.status_code == 200 else 0
+                    resume = False
+                    if offset >= len(data):
+                        return
+                chunk = data[offset:offset + UPLOAD_CHUNK_BYTES]
+                end = offset + len(chunk) - 1
+                response = await self.client.put(
+                    url,
+                    content=chunk,
+                    headers={
+                        "Content-Type": "application/gzip",
+                        "Content-Range": f"bytes {offset}-{end}/{len(data)}"
+                    },
+                    timeout=60.0
+                )
+                if response.status_code in (200, 201):
+                    return
+                if response.status_code == 308:
+                    offset = int(response.json().get("received", end + 1))
+                    continue
+                self._check_response(response, 201, f"upload blob {digest[:12]}")
+            except (httpx.TransportError, TransientDeploymentError):
+                failures += 1
+                if failures > UPLOAD_CHUNK_RETRIES:
+                    raise
+                await asyncio.sleep(0.5 * 2 ** (failures - 1))
+                # Resume from whatever the server actually stored
+                resume = True
     
     async def _start_app(self, service_id: str) -> Dict[str, Any]:
         """Start the deployed app"""
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.hosting_api}/services/{service_id}/start",
-                timeout=60.0
-            )
-            
-            if response.status_code != 200:
-                raise Exception(f"Failed to start app: {response.text}")
-            
-            return response.json()
+        response = await self._post(
+            f"{self.hosting_api}/services/{service_id}/start",
+            timeout=60.0
+        )
+        
+        self._check_response(response, 200, "start app")
+        
+        return response.json()
     
     def _generate_env_config(
         self, 
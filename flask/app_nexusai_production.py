@@ -18,11 +18,12 @@ Version: 2.0.0 (Production)
 
 from fastapi import FastAPI, HTTPException, status, Request, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel, Field, ValidationError
 from datetime import datetime, timedelta
 from contextlib import asynccontextmanager
-from typing import Optional, Dict, Any, List, Literal
+from typing import Optional, Dict, Any, List, Literal, AsyncIterator, Awaitable, Callable, NoReturn
 import httpx
 import os
 import logging
@@ -30,16 +31,36 @@ import hashlib
 import json
 import time
 import asyncio
-import re
 from enum import Enum
 
 # AI Provider imports
 from openai import AsyncOpenAI
 from anthropic import AsyncAnthropic
-from json_repair import repair_json
 
 # Redis for async job queue
 import redis.asyncio as redis
+from redis.exceptions import WatchError
+
+from task_graph import TaskGraph
+from streaming_json import StreamingFilesParser
+from json_extract import ExtractedJSON, decode_json, extract_json
+from cpu_pool import CPUPool
+from loop_monitor import LoopLagMonitor
+from job_executor import JobExecutor, JobQueueFullError
+from job_queue import RedisJobQueue
+from job_events import JobEventBus
+from job_results import (
+    save_result, load_result, load_result_meta, load_result_files, split_result,
+    save_checkpoint, load_checkpoints, delete_checkpoints
+)
+from response_cache import ResponseCache
+from semantic_cache import SemanticCache
+from single_flight import SingleFlight
+from rate_limiter import ClusterRateLimiter
+from token_budget import TokenBudget, Reservation
+from provider_router import ProviderRouter
+from llm_client import LLMClient, OpenAIClient, AnthropicClient, CacheWarmup, Usage
+from model_selector import ModelSelector, app_complexity, prompt_complexity, CLEAN, REPAIRED, FAILED
 
 # Setup logging
 logging.basicConfig(
@@ -79,7 +100,8 @@ def read_secret(env_var_name: str, file_env_var_name: str) -> str:
 def sanitize_and_parse_json(text: str, context: str = "AI response") -> dict:
     """
     Enterprise-grade JSON sanitization and parsing for AI-generated content.
-    Multi-layer approach: clean → parse → repair → parse → fail with details.
+    Valid output is parsed as is; damaged output is repaired in one pass and
+    only the region around a remaining error is re-repaired (see json_extract).
     
     Args:
         text: Raw text response from AI
@@ -91,77 +113,42 @@ def sanitize_and_parse_json(text: str, context: str = "AI response") -> dict:
     Raises:
         ValueError: If JSON cannot be parsed even after all repair attempts
     """
+    return parse_ai_json(text, context).value
+
+def parse_ai_json(text: str, context: str = "AI response") -> ExtractedJSON:
+    """sanitize_and_parse_json, also reporting how much repair the output needed"""
     try:
-        # Layer 1: Remove markdown code fences
-        cleaned = text.strip()
-        if cleaned.startswith("```"):
-            cleaned = re.sub(r'```json?\n?', '', cleaned)
-            cleaned = re.sub(r'\n?```$', '', cleaned)
-        
-        # Layer 2: Try fast-path parsing (works for 90% of cases)
-        try:
-            return json.loads(cleaned)
-        except json.JSONDecodeError:
-            pass
-        
-        # Layer 3: Aggressive control character sanitization
-        # Remove or escape control characters (0x00-0x1F except whitespace)
-        def clean_control_chars(match):
-            char = match.group(0)
-            code = ord(char)
-            if code == 0x09:  # tab
-                return '\\t'
-            elif code == 0x0A:  # newline
-                return '\\n'
-            elif code == 0x0D:  # carriage return
-                return '\\r'
-            else:  # other control chars - remove completely
-                return ''
-        
-        cleaned = re.sub(r'[\x00-\x1F]', clean_control_chars, cleaned)
-        
-        # Layer 4: Try parsing with cleaned control characters
-        try:
-            return json.loads(cleaned)
-        except json.JSONDecodeError:
-            pass
-        
-        # Layer 5: Use json-repair as fallback (enterprise-grade recovery)
-        try:
-            logger.info(f"Attempting JSON repair for {context}...")
-            repaired = repair_json(cleaned, return_objects=True)
-            if isinstance(repaired, dict):
-                logger.info(f"✅ JSON repair successful for {context}")
-                return repaired
-            else:
-                # repair_json returned string, parse it
-                return json.loads(repaired)
-        except Exception as repair_error:
-            logger.warning(f"JSON repair failed for {context}: {str(repair_error)}")
-        
-        # Layer 6: Final attempt - detailed error reporting
-        try:
-            json.loads(cleaned)
-        except json.JSONDecodeError as e:
-            error_pos = e.pos if hasattr(e, 'pos') else 0
-            snippet_start = max(0, error_pos - 150)
-            snippet_end = min(len(cleaned), error_pos + 150)
-            problematic = cleaned[snippet_start:snippet_end]
-            
-            logger.error(f"❌ JSON parse failed in {context} at position {error_pos}")
-            logger.error(f"Problematic snippet: ...{problematic}...")
-            logger.error(f"Error: {str(e)}")
-            
-            raise ValueError(
-                f"AI returned invalid JSON in {context}: {str(e)}. "
-                f"Position: {error_pos}. Check logs for details."
-            )
-            
-    except ValueError:
-        raise  # Re-raise ValueError with our custom message
-    except Exception as e:
-        logger.error(f"Unexpected error in JSON sanitization for {context}: {str(e)}")
-        raise ValueError(f"Failed to process JSON from {context}: {str(e)}")
+        extracted = extract_json(text)
+    except ValueError as e:
+        _json_parse_failed(context, e)
+    _log_json_repair(extracted, context)
+    return extracted
+
+async def parse_ai_json_async(text: str, context: str = "AI response") -> ExtractedJSON:
+    """parse_ai_json that repairs large outputs in the CPU pool, off the event loop"""
+    if len(text) < JSON_OFFLOAD_CHARS:
+        return parse_ai_json(text, context)
+    # Valid output is one C-speed parse: cheaper here than shipping it to a worker and back
+    extracted = decode_json(text)
+    if extracted is not None:
+        return extracted
+    try:
+        extracted = await cpu_pool.run(extract_json, text)
+    except ValueError as e:
+        _json_parse_failed(context, e)
+    _log_json_repair(extracted, context)
+    return extracted
+
+def _json_parse_failed(context: str, error: ValueError) -> NoReturn:
+    logger.error(f"❌ JSON parse failed in {context}: {str(error)}")
+    raise ValueError(f"AI returned invalid JSON in {context}: {str(error)}")
+
+def _log_json_repair(extracted: ExtractedJSON, context: str):
+    if extracted.repaired:
+        logger.info(
+            f"✅ JSON repaired for {context} ({extracted.fixes} fixes"
+            f"{', output was truncated' if extracted.truncated else ''})"
+        )
 
 # ============================================
 # CONFIGURATION
@@ -192,54 +179,177 @@ if REDIS_PASSWORD:
 else:
     REDIS_URL = f"redis://{REDIS_HOST}:{REDIS_PORT}"
 redis_client: Optional[redis.Redis] = None
+redis_binary_client: Optional[redis.Redis] = None  # decode_responses=False, for compressed job results
+JOB_TTL = 86400  # Jobs and their results expire after 24 hours
 
 # Cache & Rate Limiting
 CACHE_TTL = 3600  # 1 hour
-memory_cache: Dict[str, Any] = {}
-rate_limit_store: Dict[str, List[float]] = {}
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "500"))                 # Per-worker LRU, in front of Redis
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+JOB_FALLBACK_MAX_ENTRIES = int(os.getenv("JOB_FALLBACK_MAX_ENTRIES", "1000"))  # Jobs kept in memory without Redis
+JOB_FALLBACK_MAX_BYTES = int(os.getenv("JOB_FALLBACK_MAX_BYTES", str(256 * 1024 * 1024)))
+response_cache = ResponseCache(max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES, default_ttl=CACHE_TTL)
+# Opt-in: reuse a cached /ai/generate/app result for a description that means the same thing
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.88"))  # Cosine similarity, 0-1
+semantic_cache = SemanticCache(threshold=SEMANTIC_CACHE_THRESHOLD)
+# Identical AI requests in flight at once share one provider call (across workers via Redis)
+single_flight = SingleFlight(lock_ttl=float(os.getenv("SINGLE_FLIGHT_LOCK_TTL", "300")))
+# Same LRU, local only: jobs land here when Redis is down, apart from responses so they can't evict each other
+job_fallback = ResponseCache(max_entries=JOB_FALLBACK_MAX_ENTRIES, max_bytes=JOB_FALLBACK_MAX_BYTES, default_ttl=JOB_TTL)
+rate_limiter = ClusterRateLimiter()  # One Lua script per check in Redis; per-process if Redis is down
 
 # Rate limits by subscription tier
+# queue_weight: share of background job slots when tiers compete (see job_executor.py)
+# tokens: AI credits per window, 1 credit = 1 token on a cost-10 model (see token_budget.py)
 RATE_LIMITS = {
-    "free": {"ai": 10, "deploy": 5, "window": 3600},      # 10 AI calls/hour, 5 deploys/day
-    "pro": {"ai": 100, "deploy": 50, "window": 3600},     # 100 AI calls/hour, 50 deploys/day
-    "enterprise": {"ai": 1000, "deploy": 500, "window": 3600}  # Unlimited
+    "free": {"ai": 10, "deploy": 5, "tokens": 200_000, "window": 3600, "queue_weight": 1},      # 10 AI calls/hour, 5 deploys/day
+    "pro": {"ai": 100, "deploy": 50, "tokens": 2_000_000, "window": 3600, "queue_weight": 3},     # 100 AI calls/hour, 50 deploys/day
+    "enterprise": {"ai": 1000, "deploy": 500, "tokens": 20_000_000, "window": 3600, "queue_weight": 10}  # Unlimited
 }
+FULLSTACK_CREDIT_ESTIMATE = int(os.getenv("FULLSTACK_CREDIT_ESTIMATE", "60000"))  # Reserved per fullstack job, settled when it ends
+# Frontend/backend phases with more planned components/API resources than this are split into
+# batches generated in parallel, plus one call for the shared files (0 = one call per phase)
+FULLSTACK_FANOUT_BATCH_SIZE = int(os.getenv("FULLSTACK_FANOUT_BATCH_SIZE", "6"))
+FULLSTACK_FANOUT_CONCURRENCY = int(os.getenv("FULLSTACK_FANOUT_CONCURRENCY", "6"))  # Generation calls in flight per job
+
+# Background job execution (per uvicorn worker)
+JOB_MAX_CONCURRENCY = int(os.getenv("JOB_MAX_CONCURRENCY", "4"))   # Fullstack pipelines running at once
+JOB_MAX_QUEUE = int(os.getenv("JOB_MAX_QUEUE", "100"))            # Waiting jobs before POSTs get 503
+JOB_DRAIN_TIMEOUT = float(os.getenv("JOB_DRAIN_TIMEOUT", "25"))   # Seconds running jobs get on shutdown
+
+# Cluster-wide job queue (Redis Streams). "local" keeps jobs on the worker that received them
+JOB_QUEUE_BACKEND = os.getenv("JOB_QUEUE_BACKEND", "redis")
+JOB_QUEUE_CONSUME = os.getenv("JOB_QUEUE_CONSUME", "true").lower() == "true"  # false = only worker.py runs jobs
+JOB_QUEUE_MAX_BACKLOG = int(os.getenv("JOB_QUEUE_MAX_BACKLOG", "1000"))       # Jobs in the streams before 503
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", "10"))
+JOB_CLAIM_IDLE = float(os.getenv("JOB_CLAIM_IDLE", "60"))  # Seconds without heartbeat before a job is taken over
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_EVENTS_KEEPALIVE = float(os.getenv("JOB_EVENTS_KEEPALIVE", "15"))  # SSE keepalive + resync interval
 
 # AI Model Configuration
+# quality (0-1) and tokens_per_second are the model selector's starting points; it learns both from traffic
 OPENAI_MODELS = {
-    "gpt-4o": {"cost": 10, "max_tokens": 16384, "best_for": "complex apps"},
-    "gpt-4o-mini": {"cost": 5, "max_tokens": 16384, "best_for": "simple apps"},
-    "gpt-3.5-turbo": {"cost": 3, "max_tokens": 4096, "best_for": "quick prototypes"}
+    "gpt-4o": {"cost": 10, "max_tokens": 16384, "best_for": "complex apps", "quality": 0.9, "tokens_per_second": 80},
+    "gpt-4o-mini": {"cost": 5, "max_tokens": 16384, "best_for": "simple apps", "quality": 0.75, "tokens_per_second": 110},
+    "gpt-3.5-turbo": {"cost": 3, "max_tokens": 4096, "best_for": "quick prototypes", "quality": 0.55, "tokens_per_second": 120}
 }
 
 ANTHROPIC_MODELS = {
-    "claude-3-5-sonnet-20241022": {"cost": 10, "max_tokens": 8192, "best_for": "balanced"},
-    "claude-3-5-sonnet-20240620": {"cost": 10, "max_tokens": 8192, "best_for": "legacy"},
-    "claude-3-opus-20240229": {"cost": 12, "max_tokens": 8192, "best_for": "production code"},
-    "claude-3-haiku-20240307": {"cost": 5, "max_tokens": 4096, "best_for": "fast generation"}
+    "claude-3-5-sonnet-20241022": {"cost": 10, "max_tokens": 8192, "best_for": "balanced", "quality": 0.92, "tokens_per_second": 70},
+    "claude-3-5-sonnet-20240620": {"cost": 10, "max_tokens": 8192, "best_for": "legacy", "quality": 0.85, "tokens_per_second": 70},
+    "claude-3-opus-20240229": {"cost": 12, "max_tokens": 8192, "best_for": "production code", "quality": 0.9, "tokens_per_second": 25},
+    "claude-3-haiku-20240307": {"cost": 5, "max_tokens": 4096, "best_for": "fast generation", "quality": 0.65, "tokens_per_second": 130}
+}
+
+# Per-tier model SLOs: expected seconds per call, and the least quality a tier gets whatever the request
+MODEL_SLOS = {
+    "free": {"latency": 120, "min_quality": 0.0},
+    "pro": {"latency": 90, "min_quality": 0.75},
+    "enterprise": {"latency": 60, "min_quality": 0.85}
 }
 
-# Initialize clients
+# Per-tenant AI credit budgets on top of the request limits (reserve up front, settle on usage)
+token_budget = TokenBudget(
+    rate_limiter,
+    model_costs={name: info["cost"] for name, info in {**OPENAI_MODELS, **ANTHROPIC_MODELS}.items()}
+)
+
+# Requests without an explicit model get the cheapest one meeting their tier's SLO at their complexity
+model_selector = ModelSelector({"openai": OPENAI_MODELS, "anthropic": ANTHROPIC_MODELS}, MODEL_SLOS)
+
+# Initialize clients (retries are done by the LLMClient wrappers, so the SDKs' own are off)
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "600"))        # Seconds per provider request
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))    # Retries of transient errors before failing over
+LLM_MAX_CONTINUATIONS = int(os.getenv("LLM_MAX_CONTINUATIONS", "3"))  # Follow-up requests for output cut off at max_tokens
 openai_client = None
 anthropic_client = None
 http_client: Optional[httpx.AsyncClient] = None
 
 if OPENAI_API_KEY:
-    openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+    openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY, max_retries=0)
     logger.info("✅ OpenAI client initialized with GPT-4o access")
     
 if ANTHROPIC_API_KEY:
-    anthropic_client = AsyncAnthropic(api_key=ANTHROPIC_API_KEY)
+    anthropic_client = AsyncAnthropic(api_key=ANTHROPIC_API_KEY, max_retries=0)
     logger.info("✅ Anthropic client initialized with Claude 3.5 Sonnet access")
 
+# Health-aware routing: AUTO requests fail over between providers when one errors or its circuit is open.
+# With hedging, a backup provider is started when the first has no token after its p95 time-to-first-token.
+provider_router = ProviderRouter(
+    ["openai", "anthropic"],
+    hedge=os.getenv("PROVIDER_HEDGING", "false").lower() == "true",
+    hedge_multiplier=float(os.getenv("PROVIDER_HEDGE_MULTIPLIER", "1.0")),
+    hedge_min_delay=float(os.getenv("PROVIDER_HEDGE_MIN_DELAY", "1.0")),   # Seconds
+    hedge_max_delay=float(os.getenv("PROVIDER_HEDGE_MAX_DELAY", "20.0")),  # Used until a provider has enough samples
+    failure_threshold=int(os.getenv("PROVIDER_FAILURE_THRESHOLD", "5")),   # Consecutive failures that open the circuit
+    cooldown=float(os.getenv("PROVIDER_COOLDOWN", "30"))                   # Seconds before a probe is let through
+)
+
+# Repairing a damaged multi-megabyte output takes long enough to stall every request on the
+# worker, so outputs this large that need repair are repaired in worker processes
+JSON_OFFLOAD_CHARS = int(os.getenv("JSON_OFFLOAD_CHARS", str(256 * 1024)))
+cpu_pool = CPUPool(
+    max_workers=int(os.getenv("CPU_POOL_WORKERS", "1")),       # Per API worker process
+    max_pending=int(os.getenv("CPU_POOL_MAX_PENDING", "4"))    # Calls in flight; more wait their turn
+)
+loop_monitor = LoopLagMonitor()
 # ============================================
 # LIFESPAN & APP INITIALIZATION
 # ============================================
 
+async def connect_redis(decode_responses: bool = True) -> Optional[redis.Redis]:
+    """Connect an async Redis client (None = memory-only mode)"""
+    try:
+        # Use direct connection parameters for async Redis client
+        client = redis.Redis(
+            host=REDIS_HOST,
+            port=REDIS_PORT,
+            password=REDIS_PASSWORD if REDIS_PASSWORD else None,
+            encoding="utf-8",
+            decode_responses=decode_responses,
+            socket_connect_timeout=5
+        )
+        await client.ping()
+        # Mask password in log output
+        safe_log = f"{REDIS_HOST}:{REDIS_PORT}" + (f" (password: ****)" if REDIS_PASSWORD else "")
+        purpose = "Async Job Queue" if decode_responses else "Job Results"
+        logger.info(f"✅ Redis connected: {safe_log} ({purpose})")
+        return client
+    except Exception as e:
+        logger.error(f"❌ Redis connection failed: {e}")
+        logger.warning("⚠️  Job queue will operate in memory-only mode (not recommended for production)")
+        return None
+
+async def start_shared_state():
+    """
+    Connect Redis and attach it to everything that shares state across workers
+    (API lifespan and worker.py): caches, rate limits, token budgets and the
+    daily ledger, single-flight. Without Redis they all stay per-process.
+    """
+    global redis_client, redis_binary_client
+    redis_client = await connect_redis()
+    if redis_client:
+        redis_binary_client = await connect_redis(decode_responses=False)
+    response_cache.attach(redis_client)
+    semantic_cache.attach(redis_client)
+    rate_limiter.attach(redis_client)
+    token_budget.attach(redis_client)
+    await single_flight.start(redis_client)
+
+async def stop_shared_state():
+    """Undo start_shared_state()"""
+    await single_flight.stop()
+    if redis_binary_client:
+        await redis_binary_client.aclose()
+    if redis_client:
+        await redis_client.aclose()
+        logger.info("✅ Redis connection closed")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan - startup and shutdown"""
-    global http_client, redis_client
+    global http_client
     
     logger.info("=" * 60)
     logger.info("🚀 VPN ENTERPRISE AI API - PRODUCTION MODE")
@@ -263,36 +373,29 @@ async def lifespan(app: FastAPI):
     
     # Initialize HTTP client for webhooks
     http_client = httpx.AsyncClient(timeout=10.0)
+    logger.info("✅ HTTP client initialized for N8N webhooks")
     
     # Initialize Redis for async job queue
+    await start_shared_state()
+    
+    await start_job_runtime(consume=JOB_QUEUE_CONSUME)
+    loop_monitor.start()
     try:
-        # Use direct connection parameters for async Redis client
-        redis_client = redis.Redis(
-            host=REDIS_HOST,
-            port=REDIS_PORT,
-            password=REDIS_PASSWORD if REDIS_PASSWORD else None,
-            encoding="utf-8",
-            decode_responses=True,
-            socket_connect_timeout=5
-        )
-        await redis_client.ping()
-        # Mask password in log output
-        safe_log = f"{REDIS_HOST}:{REDIS_PORT}" + (f" (password: ****)" if REDIS_PASSWORD else "")
-        logger.info(f"✅ Redis connected: {safe_log} (Async Job Queue)")
+        await cpu_pool.start()
+        logger.info(f"✅ CPU pool started ({cpu_pool.max_workers} workers) for JSON repair")
     except Exception as e:
-        logger.error(f"❌ Redis connection failed: {e}")
-        logger.warning("⚠️  Job queue will operate in memory-only mode (not recommended for production)")
-    logger.info("✅ HTTP client initialized for N8N webhooks")
+        logger.error(f"❌ CPU pool failed to start, it will retry on first use: {e}")
     logger.info("=" * 60)
     
     yield
     
-    # Shutdown
+    # Shutdown - drain jobs first so they can still write their final status to Redis
+    await stop_job_runtime()
+    cpu_pool.shutdown()
+    await loop_monitor.stop()
     if http_client:
         await http_client.aclose()
-    if redis_client:
-        await redis_client.aclose()
-        logger.info("✅ Redis connection closed")
+    await stop_shared_state()
     logger.info("🛑 API shutting down gracefully")
 
 app = FastAPI(
@@ -342,6 +445,7 @@ class AIGenerateRequest(BaseModel):
     provider: AIProvider = Field(default=AIProvider.AUTO)
     temperature: float = Field(default=0.7, ge=0.0, le=2.0)
     max_tokens: int = Field(default=8192, le=16384)
+    stream: bool = Field(default=False)  # Server-Sent Events token stream
 
 class MultiFileAppRequest(BaseModel):
     description: str = Field(..., min_length=20, max_length=10000)
@@ -373,6 +477,15 @@ class JobPhase(str, Enum):
     INTEGRATION = "integration"        # Phase 4: Config
     DATABASE = "database"              # Phase 5: Schema + save
 
+# Progress weight and start message per generation phase (Phases 1-4 sum to 80%,
+# Phase 5 reports 85-100% itself). Phases 2-4 run concurrently after Phase 1.
+FULLSTACK_PHASE_PLAN = {
+    JobPhase.ARCHITECTURE.value: {"weight": 20, "start": "Designing system architecture with Claude 3.5 Sonnet..."},
+    JobPhase.FRONTEND.value: {"weight": 20, "start": "Generating frontend code with GPT-4o..."},
+    JobPhase.BACKEND.value: {"weight": 20, "start": "Generating backend API with GPT-4o..."},
+    JobPhase.INTEGRATION.value: {"weight": 20, "start": "Generating deployment configs and documentation..."},
+}
+
 class JobInfo(BaseModel):
     """Job metadata for async fullstack generation"""
     job_id: str
@@ -384,6 +497,8 @@ class JobInfo(BaseModel):
     updated_at: datetime
     result: Optional[Dict[str, Any]] = None
     error: Optional[str] = None
+    queue_position: Optional[int] = None  # 1 = next to run, 0 = running; None if unknown to this worker
+    result_files: Optional[int] = None  # Number of files in the result (page via /ai/jobs/{job_id}/result)
 
 class MultiFileAppResponse(BaseModel):
     files: List[FileOutput]
@@ -417,6 +532,8 @@ class HealthResponse(BaseModel):
     version: str
     ai_providers: Dict[str, bool]
     n8n_enabled: bool
+    event_loop: Dict[str, Any] = Field(default_factory=dict)  # Lag samples: how responsive this worker is
+    cpu_pool: Dict[str, Any] = Field(default_factory=dict)
 
 class ModelsResponse(BaseModel):
     models: List[str]
@@ -470,7 +587,7 @@ class DeploymentResponse(BaseModel):
     hosting: Optional[Dict[str, Any]] = None
     app_url: Optional[str] = None
     environment: Optional[Dict[str, str]] = None
-    steps: List[Dict[str, str]]
+    steps: List[Dict[str, Any]]
 
 # ============================================
 # UTILITY FUNCTIONS
@@ -482,26 +599,19 @@ def cache_key(prefix: str, *args: Any) -> str:
     hash_val = hashlib.md5(data.encode()).hexdigest()
     return f"{prefix}:{hash_val}"
 
-def get_cache(key: str) -> Optional[Any]:
-    """Get from cache"""
-    if key in memory_cache:
-        entry = memory_cache[key]
-        if entry["expires"] > time.time():
-            logger.info(f"💾 Cache HIT: {key}")
-            return entry["data"]
-        else:
-            del memory_cache[key]
-    return None
-
-def set_cache(key: str, data: Any, ttl: int = CACHE_TTL):
-    """Set cache"""
-    memory_cache[key] = {
-        "data": data,
-        "expires": time.time() + ttl
-    }
+async def get_cache(key: str) -> Optional[Any]:
+    """Get from cache (local LRU, then Redis)"""
+    data = await response_cache.get(key)
+    if data is not None:
+        logger.info(f"💾 Cache HIT: {key}")
+    return data
+
+async def set_cache(key: str, data: Any, ttl: int = CACHE_TTL):
+    """Set cache (local LRU and Redis)"""
+    await response_cache.set(key, data, ttl=ttl)
     logger.info(f"💾 Cache SET: {key} (TTL: {ttl}s)")
 
-def check_rate_limit(user_id: str, tier: str, limit_type: str = "ai") -> bool:
+async def check_rate_limit(user_id: str, tier: str, limit_type: str = "ai") -> bool:
     """Check if user is within rate limits"""
     if tier not in RATE_LIMITS:
         tier = "free"
@@ -510,21 +620,29 @@ def check_rate_limit(user_id: str, tier: str, limit_type: str = "ai") -> bool:
     limit = limits.get(limit_type, limits["ai"])
     window = limits["window"]
     
-    key = f"{user_id}:{limit_type}"
-    now = time.time()
-    
-    if key not in rate_limit_store:
-        rate_limit_store[key] = []
-    
-    # Remove old entries
-    rate_limit_store[key] = [t for t in rate_limit_store[key] if now - t < window]
-    
-    if len(rate_limit_store[key]) >= limit:
-        logger.warning(f"⚠️  Rate limit exceeded for {user_id} ({tier}): {len(rate_limit_store[key])}/{limit}")
-        return False
-    
-    rate_limit_store[key].append(now)
-    return True
+    result = await rate_limiter.hit(f"{user_id}:{limit_type}", limit, window)
+    if not result.allowed:
+        logger.warning(f"⚠️  Rate limit exceeded for {user_id} ({tier}): {result.used}/{limit}")
+    return result.allowed
+
+async def reserve_credits(user_id: str, tier: str, credits: int) -> Reservation:
+    """Hold AI credits against the tenant's token budget (429 with Retry-After if over)"""
+    if tier not in RATE_LIMITS:
+        tier = "free"
+    limits = RATE_LIMITS[tier]
+    reservation = await token_budget.reserve(user_id, limits["tokens"], limits["window"], credits)
+    if not reservation.result.allowed:
+        logger.warning(f"⚠️  Token budget exceeded for {user_id} ({tier}): {reservation.result.used}+{credits}/{limits['tokens']}")
+        raise HTTPException(
+            status_code=429,
+            detail=f"Token budget exceeded for {tier} tier",
+            headers={"Retry-After": str(reservation.result.retry_after)}
+        )
+    return reservation
+
+async def reserve_tokens(user_id: str, tier: str, model: str, prompt: str, max_tokens: int) -> Reservation:
+    """Reserve the most a single completion can use: the prompt (~4 chars/token) plus max_tokens"""
+    return await reserve_credits(user_id, tier, token_budget.credits(model, len(prompt) // 4 + max_tokens))
 
 async def send_n8n_webhook(webhook_url: str, payload: Dict[str, Any]):
     """Send webhook to N8N (fire and forget)"""
@@ -535,36 +653,25 @@ async def send_n8n_webhook(webhook_url: str, payload: Dict[str, Any]):
     except Exception as e:
         logger.error(f"❌ N8N webhook failed: {str(e)}")
 
-def choose_ai_provider(description: str, provider: AIProvider) -> tuple[str, Any]:
-    """Intelligently choose AI provider"""
-    if provider == AIProvider.OPENAI and openai_client:
-        return ("openai", openai_client)
-    
-    if provider == AIProvider.ANTHROPIC and anthropic_client:
-        return ("anthropic", anthropic_client)
-    
-    # AUTO mode - intelligent routing
-    if provider == AIProvider.AUTO:
-        # Prefer OpenAI GPT-4o as primary (most reliable and widely available)
-        if openai_client:
-            logger.info("🧠 AUTO: Chose GPT-4o (primary provider)")
-            return ("openai", openai_client)
-        
-        # Fallback to Claude if OpenAI unavailable
-        if anthropic_client:
-            logger.info("🧠 AUTO: Chose Claude 3.5 Sonnet (fallback)")
-            return ("anthropic", anthropic_client)
-    
-    raise HTTPException(
-        status_code=503,
-        detail="No AI provider available for the requested provider type"
-    )
+def provider_candidates(provider: AIProvider, prefer: Optional[str] = None) -> List[tuple[str, LLMClient]]:
+    """
+    Providers to try for a request, in order.
+    A specific provider is used alone; AUTO prefers `prefer` (default OpenAI GPT-4o)
+    and fails over to the other, with any provider whose circuit is open moved to the back.
+    """
+    candidates = provider_router.candidates(provider.value, prefer)
+    if not candidates:
+        raise HTTPException(
+            status_code=503,
+            detail="No AI provider available for the requested provider type"
+        )
+    return candidates
 
 # ============================================
 # ASYNC JOB QUEUE MANAGEMENT (Redis-backed)
 # ============================================
 
-async def create_job(user_id: str, request_data: Dict[str, Any]) -> str:
+async def create_job(user_id: str, request_data: Dict[str, Any], reservation: Optional[Reservation] = None) -> str:
     """Create a new async job and return job_id immediately"""
     import uuid
     job_id = str(uuid.uuid4())
@@ -581,7 +688,9 @@ async def create_job(user_id: str, request_data: Dict[str, Any]) -> str:
         "updated_at": now.isoformat(),
         "request_data": json.dumps(request_data),
         "result": None,
-        "error": None
+        "error": None,
+        "reserved_credits": reservation.credits if reservation else None,
+        "reserved_window": reservation.window if reservation else None
     }
     
     if redis_client:
@@ -589,14 +698,14 @@ async def create_job(user_id: str, request_data: Dict[str, Any]) -> str:
             # Store job in Redis with 24-hour TTL (filter out None values for Redis)
             redis_safe_data = {k: v for k, v in job_data.items() if v is not None}
             await redis_client.hset(f"job:{job_id}", mapping=redis_safe_data)
-            await redis_client.expire(f"job:{job_id}", 86400)  # 24 hours
+            await redis_client.expire(f"job:{job_id}", JOB_TTL)  # 24 hours
             logger.info(f"✅ Job created in Redis: {job_id}")
         except Exception as e:
             logger.error(f"❌ Redis job creation failed: {e}, using memory fallback")
-            memory_cache[f"job:{job_id}"] = {"data": job_data, "expires": time.time() + 86400}
+            job_fallback.set_local(f"job:{job_id}", job_data, ttl=JOB_TTL)
     else:
         # Fallback to memory
-        memory_cache[f"job:{job_id}"] = {"data": job_data, "expires": time.time() + 86400}
+        job_fallback.set_local(f"job:{job_id}", job_data, ttl=JOB_TTL)
         logger.warning(f"⚠️  Job {job_id} created in memory (Redis unavailable)")
     
     return job_id
@@ -618,12 +727,12 @@ async def update_job_progress(job_id: str, phase: JobPhase, progress: int, messa
         except Exception as e:
             logger.error(f"❌ Redis update failed for {job_id}: {e}")
             # Update memory fallback
-            if f"job:{job_id}" in memory_cache:
-                memory_cache[f"job:{job_id}"]["data"].update(update_data)
+            job_fallback.update_local(f"job:{job_id}", **update_data)
     else:
         # Memory fallback
-        if f"job:{job_id}" in memory_cache:
-            memory_cache[f"job:{job_id}"]["data"].update(update_data)
+        job_fallback.update_local(f"job:{job_id}", **update_data)
+    
+    await job_events.publish(job_id, "progress", {"job_id": job_id, **update_data})
 
 async def complete_job(job_id: str, result: Dict[str, Any]):
     """Mark job as completed with final result"""
@@ -632,20 +741,33 @@ async def complete_job(job_id: str, result: Dict[str, Any]):
         "progress_percent": 100,
         "message": "Generation completed successfully!",
         "updated_at": datetime.utcnow().isoformat(),
-        "result": json.dumps(result)
+        "result_files": len(result.get("files") or [])
     }
     
-    if redis_client:
+    key = f"job:{job_id}"
+    if redis_client and key not in job_fallback:
+        stored = None
+        if redis_binary_client:
+            try:
+                # Result goes to its own compressed hash first so "completed" always has a result
+                stored = await save_result(redis_binary_client, job_id, result, JOB_TTL)
+            except Exception as e:
+                logger.error(f"❌ Redis result save failed for {job_id}, storing it inline: {e}")
         try:
-            await redis_client.hset(f"job:{job_id}", mapping=completion_data)
-            logger.info(f"✅ Job {job_id} completed successfully")
+            if stored:
+                await redis_client.hset(key, mapping=completion_data)
+                logger.info(f"✅ Job {job_id} completed successfully ({stored['files']} files, {stored['bytes'] // 1024} KiB stored)")
+            else:
+                # The job lives in Redis: an inline result (read by get_job_status) beats a job stuck "running"
+                await redis_client.hset(key, mapping={**completion_data, "result": json.dumps(result)})
+                logger.info(f"✅ Job {job_id} completed successfully (result stored inline)")
         except Exception as e:
             logger.error(f"❌ Redis completion failed for {job_id}: {e}")
-            if f"job:{job_id}" in memory_cache:
-                memory_cache[f"job:{job_id}"]["data"].update(completion_data)
     else:
-        if f"job:{job_id}" in memory_cache:
-            memory_cache[f"job:{job_id}"]["data"].update(completion_data)
+        job_fallback.update_local(key, **completion_data, result=json.dumps(result))
+    
+    # Listeners fetch the result from the job itself; it is never broadcast
+    await job_events.publish(job_id, "completed", {"job_id": job_id, **completion_data})
 
 async def fail_job(job_id: str, error: str):
     """Mark job as failed with error message"""
@@ -662,40 +784,104 @@ async def fail_job(job_id: str, error: str):
             logger.error(f"❌ Job {job_id} failed: {error}")
         except Exception as e:
             logger.error(f"❌ Redis failure update failed for {job_id}: {e}")
-            if f"job:{job_id}" in memory_cache:
-                memory_cache[f"job:{job_id}"]["data"].update(failure_data)
+            job_fallback.update_local(f"job:{job_id}", **failure_data)
     else:
-        if f"job:{job_id}" in memory_cache:
-            memory_cache[f"job:{job_id}"]["data"].update(failure_data)
-
-async def get_job_status(job_id: str) -> Optional[JobInfo]:
-    """Get current job status for polling"""
-    job_data = None
+        job_fallback.update_local(f"job:{job_id}", **failure_data)
     
+    await job_events.publish(job_id, "failed", {"job_id": job_id, **failure_data})
+
+async def save_job_checkpoint(job_id: str, phase: str, output: Dict[str, Any]):
+    """Keep a finished phase's output so a failed or crashed job can resume after it"""
+    key = f"job:{job_id}"
+    if redis_client and key not in job_fallback:
+        if redis_binary_client:
+            try:
+                size = await save_checkpoint(redis_binary_client, job_id, phase, output, JOB_TTL)
+                logger.info(f"💾 Job {job_id}: checkpointed {phase} ({size // 1024} KiB)")
+                return
+            except Exception as e:
+                logger.error(f"❌ Redis checkpoint failed for {job_id}/{phase}, storing it inline: {e}")
+        try:
+            # The job lives in Redis, so its checkpoints must too (uncompressed, in the job hash)
+            await redis_client.hset(key, f"checkpoint:{phase}", json.dumps(output))
+        except Exception as e:
+            logger.error(f"❌ Redis checkpoint failed for {job_id}/{phase}, a resume will redo it: {e}")
+        return
+    job_data = job_fallback.get_local(key)
+    if job_data is not None:
+        job_fallback.update_local(key, checkpoints={**(job_data.get("checkpoints") or {}), phase: output})
+
+async def load_job_checkpoints(job_id: str) -> Dict[str, Any]:
+    """Checkpointed phase outputs of a job, keyed by phase (empty if none)"""
+    checkpoints: Dict[str, Any] = {}
+    if redis_client:
+        try:
+            inline = await redis_client.hmget(f"job:{job_id}", [f"checkpoint:{phase}" for phase in FULLSTACK_PHASE_PLAN])
+            checkpoints = {phase: json.loads(raw) for phase, raw in zip(FULLSTACK_PHASE_PLAN, inline) if raw}
+        except Exception as e:
+            logger.error(f"❌ Redis inline checkpoint load failed for {job_id}: {e}")
+    if redis_binary_client:
+        try:
+            checkpoints.update(await load_checkpoints(redis_binary_client, job_id))
+        except Exception as e:
+            logger.error(f"❌ Redis checkpoint load failed for {job_id}: {e}")
+    job_data = job_fallback.get_local(f"job:{job_id}")
+    if job_data and job_data.get("checkpoints"):
+        checkpoints = {**job_data["checkpoints"], **checkpoints}
+    return checkpoints
+
+async def delete_job_checkpoints(job_id: str):
+    """Drop a job's checkpoints once its result is stored"""
+    try:
+        if redis_binary_client:
+            await delete_checkpoints(redis_binary_client, job_id)
+        if redis_client:
+            await redis_client.hdel(f"job:{job_id}", *[f"checkpoint:{phase}" for phase in FULLSTACK_PHASE_PLAN])
+    except Exception as e:
+        logger.warning(f"⚠️  Failed to delete checkpoints of {job_id}: {e}")
+    job_fallback.update_local(f"job:{job_id}", checkpoints=None)
+
+async def load_job_data(job_id: str) -> Optional[Dict[str, Any]]:
+    """The raw job hash from Redis, or the memory fallback (None if unknown or expired)"""
     if redis_client:
         try:
             data = await redis_client.hgetall(f"job:{job_id}")
             if data:
-                job_data = data
+                return data
         except Exception as e:
             logger.error(f"❌ Redis get failed for {job_id}: {e}")
     
     # Fallback to memory
-    if not job_data and f"job:{job_id}" in memory_cache:
-        entry = memory_cache[f"job:{job_id}"]
-        if entry["expires"] > time.time():
-            job_data = entry["data"]
+    return job_fallback.get_local(f"job:{job_id}")
+
+async def get_job_status(job_id: str, include_result: bool = True) -> Optional[JobInfo]:
+    """Get current job status for polling (the result is only loaded if include_result)"""
+    job_data = await load_job_data(job_id)
     
     if not job_data:
         return None
     
-    # Parse result and error from JSON if present
+    # Load the result: separate compressed hash, or inline JSON for memory/legacy jobs
     result = None
-    if job_data.get("result"):
+    if include_result and job_data.get("result"):
         try:
             result = json.loads(job_data["result"])
         except:
             result = job_data["result"]
+    elif include_result and job_data.get("status") == JobStatus.COMPLETED.value and redis_binary_client:
+        try:
+            result = await load_result(redis_binary_client, job_id)
+        except Exception as e:
+            logger.error(f"❌ Redis result load failed for {job_id}: {e}")
+    
+    queue_position = None
+    if job_data.get("status", "pending") == "pending":
+        queue_position = job_executor.position(job_id)
+        if queue_position is None and job_queue and job_data.get("queue_id"):
+            try:
+                queue_position = await job_queue.position(job_data.get("tier", "free"), job_data["queue_id"])
+            except Exception as e:
+                logger.warning(f"⚠️  Queue position lookup failed for {job_id}: {e}")
     
     # Handle missing keys gracefully
     try:
@@ -708,12 +894,91 @@ async def get_job_status(job_id: str) -> Optional[JobInfo]:
             created_at=datetime.fromisoformat(job_data["created_at"]) if job_data.get("created_at") else datetime.utcnow(),
             updated_at=datetime.fromisoformat(job_data["updated_at"]) if job_data.get("updated_at") else datetime.utcnow(),
             result=result,
-            error=job_data.get("error")
+            error=job_data.get("error"),
+            queue_position=queue_position,
+            result_files=int(job_data["result_files"]) if job_data.get("result_files") else None
         )
     except Exception as e:
         logger.error(f"❌ Failed to parse job data for {job_id}: {e}, data keys: {list(job_data.keys())}")
         return None
 
+# Redis Streams queue feeding job_executor; None when running in local mode
+job_queue: Optional[RedisJobQueue] = None
+
+# Progress events for /ai/jobs/{job_id}/events (Redis pub/sub, in-process without Redis)
+job_events = JobEventBus()
+
+async def _release_job(job_id: str, reason: str):
+    """Executor shutdown hook: hand queued jobs back to the cluster, fail local ones"""
+    if job_queue:
+        try:
+            if await job_queue.release(job_id):
+                await redis_client.hset(f"job:{job_id}", mapping={
+                    "status": JobStatus.PENDING.value,
+                    "message": "Worker restarting, job re-queued...",
+                    "updated_at": datetime.utcnow().isoformat()
+                })
+                return
+        except Exception as e:
+            logger.error(f"❌ Failed to re-queue job {job_id}: {e}")
+    await fail_job(job_id, reason)
+
+# Per-process executor for background fullstack jobs; tier weights come from RATE_LIMITS
+job_executor = JobExecutor(
+    max_concurrency=JOB_MAX_CONCURRENCY,
+    max_queue=JOB_MAX_QUEUE,
+    tier_weights={tier: limits["queue_weight"] for tier, limits in RATE_LIMITS.items()},
+    on_abandon=_release_job
+)
+
+async def _run_queued_job(job_id: str):
+    """Job queue handler: rebuild the request from the job hash and run the pipeline"""
+    job_data = await redis_client.hgetall(f"job:{job_id}")
+    try:
+        request = MultiFileAppRequest(**json.loads(job_data["request_data"]))
+    except Exception as e:
+        await fail_job(job_id, f"Invalid job payload: {e}")
+        return
+    user_id = job_data.get("user_id", "anonymous")
+    reservation = None
+    if job_data.get("reserved_credits"):
+        reservation = Reservation(user_id, int(job_data["reserved_credits"]), int(job_data["reserved_window"]))
+    await _execute_fullstack_generation_background(job_id, request, user_id, reservation, job_data.get("tier", "free"))
+
+async def start_job_runtime(consume: bool = True):
+    """
+    Start background job execution (API lifespan and worker.py).
+    With Redis available, jobs go through the shared stream queue and this
+    process pulls from it when `consume` is set; otherwise they stay local.
+    """
+    global job_queue
+    await job_events.start(redis_client)
+    await job_executor.start()
+    logger.info(f"✅ Job executor started ({JOB_MAX_CONCURRENCY} concurrent, {JOB_MAX_QUEUE} queued max)")
+    
+    if redis_client and JOB_QUEUE_BACKEND == "redis":
+        job_queue = RedisJobQueue(
+            redis_client,
+            job_executor,
+            handler=_run_queued_job,
+            heartbeat_interval=JOB_HEARTBEAT_INTERVAL,
+            claim_idle=JOB_CLAIM_IDLE,
+            max_attempts=JOB_MAX_ATTEMPTS,
+            on_dead=fail_job
+        )
+        try:
+            await job_queue.start(consume=consume)
+        except Exception as e:
+            logger.error(f"❌ Job queue unavailable, running jobs locally: {e}")
+            job_queue = None
+
+async def stop_job_runtime():
+    """Stop pulling queued jobs, then drain the executor"""
+    if job_queue:
+        await job_queue.stop()
+    await job_executor.shutdown(JOB_DRAIN_TIMEOUT)
+    await job_events.stop()
+
 def _default_openai_model() -> str:
     return "gpt-4o"
 
@@ -759,6 +1024,35 @@ def _normalize_requested_model(provider_name: str, requested_model: Optional[str
         return requested_model
     return _default_anthropic_model()
 
+def slo_tier(tier: Optional[str]) -> str:
+    """The tier whose SLO picks a caller's models (unknown tiers get the free SLO)"""
+    return tier if tier in MODEL_SLOS else "free"
+
+def select_model(provider_name: str, requested_model: Optional[str], complexity: float, tier: Optional[str], max_tokens: int) -> str:
+    """The requested model if one was named, otherwise the model selector's choice for this request"""
+    if requested_model and requested_model.strip() not in {"auto", "default"}:
+        return _normalize_requested_model(provider_name, requested_model)
+    return model_selector.choose(provider_name, complexity, slo_tier(tier), max_tokens) or _normalize_requested_model(provider_name, None)
+
+# Provider-neutral clients: every AI call goes through these (and the router, for failover)
+llm_clients: Dict[str, LLMClient] = {}
+if openai_client:
+    llm_clients["openai"] = OpenAIClient(
+        openai_client, _default_openai_model(),
+        model_limits={name: info["max_tokens"] for name, info in OPENAI_MODELS.items()},
+        default_max_tokens=16000, max_retries=LLM_MAX_RETRIES, timeout=LLM_TIMEOUT,
+        observer=lambda usage, seconds: model_selector.observe(usage.model, seconds, usage.output_tokens)
+    )
+if anthropic_client:
+    llm_clients["anthropic"] = AnthropicClient(
+        anthropic_client, _default_anthropic_model(),
+        model_limits={name: info["max_tokens"] for name, info in ANTHROPIC_MODELS.items()},
+        default_max_tokens=4096, max_retries=LLM_MAX_RETRIES, timeout=LLM_TIMEOUT,
+        observer=lambda usage, seconds: model_selector.observe(usage.model, seconds, usage.output_tokens)
+    )
+provider_router.register("openai", llm_clients.get("openai"))
+provider_router.register("anthropic", llm_clients.get("anthropic"))
+
 _deployment_status_store: Dict[str, DeploymentStatusResponse] = {}
 
 # ============================================
@@ -813,6 +1107,176 @@ Return a JSON object with this EXACT structure:
     
     return prompt
 
+# Fullstack phases 2-4 send the same system prompt and project context, then
+# their own task, so the shared part is served from the provider's prompt
+# cache after the first call: the system prompt across every job, the
+# context across a job's phases. Keep both byte-identical - nothing
+# request-specific in the system prompt, no phase-specific text in the context.
+FULLSTACK_FILES_SYSTEM_PROMPT = """You are an expert full-stack engineer (frontend, backend and DevOps) generating complete, production-ready code for one part of a larger application.
+
+**Code rules:**
+- Generate COMPLETE files: no placeholders, no TODO comments, no "rest of the code here"
+- Follow the architecture, database schema and API endpoints you are given exactly, so the parts generated separately fit together
+- Include error handling and input validation
+- package.json / requirements.txt must list ALL dependencies used
+
+**CRITICAL JSON FORMATTING RULES:**
+- Properly escape ALL special characters in file content: \\n for newlines, \\t for tabs, \\" for quotes, \\\\ for backslashes
+- No unescaped control characters in "content" fields
+- Code must be a valid JSON string with proper escaping: use \\n instead of actual newlines in code content
+- SQL CREATE TABLE statements, package.json and config files must have properly escaped content strings
+- README content must escape all markdown special characters
+- Validate that your entire output is valid, parseable JSON before returning
+
+Output ONLY this JSON object, no markdown, no explanations (your task may add top-level keys):
+{
+  "files": [
+    {"path": "src/App.jsx", "content": "...", "language": "javascript"},
+    ...
+  ]
+}"""
+
+
+def fullstack_context_prompt(request: MultiFileAppRequest, architecture: Dict[str, Any]) -> str:
+    """The project context every fullstack file phase shares (the cached part of its prompt)"""
+    features_text = ", ".join(request.features) if request.features else "Standard CRUD operations"
+    return f"""**Project:** {request.description}
+**Framework:** {request.framework.value}
+**Features:** {features_text}
+**Requires Auth:** {"Yes" if request.include_auth else "No"}
+**Requires API:** {"Yes" if request.include_api else "No"}
+
+**Architecture:** {json.dumps(architecture.get('architecture', {}), indent=2)}
+**Database Schema:** {json.dumps(architecture.get('database_schema', {}), indent=2)}
+**API Endpoints:** {json.dumps(architecture.get('api_endpoints', []), indent=2)}
+
+"""
+
+
+def fullstack_task_prompt(phase: JobPhase, request: MultiFileAppRequest) -> str:
+    """What one fullstack file phase generates (the uncached part of its prompt)"""
+    if phase == JobPhase.FRONTEND:
+        return f"""**Your task:** as the frontend developer, generate a COMPLETE, production-ready {request.framework.value} frontend application.
+
+**Generate ALL frontend files:**
+- src/App.jsx (main app with routing)
+- src/components/* (all UI components based on database entities)
+- src/pages/* (CRUD views for all entities)
+- src/services/api.js (API client with all endpoints)
+- src/utils/auth.js (if auth required)
+- public/index.html
+- tailwind.config.js, postcss.config.js
+- package.json (with ALL dependencies)"""
+    if phase == JobPhase.BACKEND:
+        return """**Your task:** as the backend developer, generate a COMPLETE, production-ready backend API.
+
+**Generate ALL backend files:**
+- server.js or app.py (Express/FastAPI/Flask server)
+- routes/* (all API endpoints)
+- models/* (database models for all entities)
+- middleware/auth.js (JWT authentication)
+- middleware/validation.js
+- middleware/errorHandler.js
+- config/database.js
+- .env.example
+- package.json or requirements.txt"""
+    return """**Your task:** as the DevOps engineer, generate deployment configs and integration files.
+
+**Generate ONLY these deployment/config files:**
+1. frontend/package.json
+2. backend/package.json or requirements.txt
+3. database/schema.sql (CREATE TABLE statements)
+4. README.md (complete setup guide)
+5. postman_collection.json (all API endpoints)
+6. docker-compose.yml (optional)
+7. .env.example
+8. .gitignore
+
+Besides "files", include "setup_instructions": "..." and "dependencies": {"frontend": {}, "backend": {}} in the JSON object."""
+
+
+def _plan_item_name(item: Any) -> str:
+    if isinstance(item, dict):
+        return str(item.get("path") or item.get("name") or json.dumps(item, sort_keys=True))
+    return str(item)
+
+
+def _endpoint_resource(endpoint: Any) -> str:
+    """The resource an API endpoint belongs to: /api/v1/users/:id -> users"""
+    path = endpoint.get("path", "") if isinstance(endpoint, dict) else next(
+        (part for part in str(endpoint).split() if part.startswith("/")), str(endpoint)
+    )
+    segments = [
+        segment for segment in str(path).split("/")
+        if segment and segment != "api" and not segment.startswith((":", "{", "<"))
+        and not (segment[0] == "v" and segment[1:].isdigit())
+    ]
+    return segments[0] if segments else "root"
+
+
+def fullstack_fanout_items(phase: JobPhase, architecture: Dict[str, Any]) -> List[str]:
+    """
+    The units a frontend/backend phase can be split into: one per planned
+    component, one per API resource (with its endpoints). Empty for other phases.
+    """
+    if phase == JobPhase.FRONTEND:
+        components = architecture.get("frontend_components") or []
+        return list(dict.fromkeys(_plan_item_name(component) for component in components))
+    if phase == JobPhase.BACKEND:
+        resources: Dict[str, List[str]] = {}
+        for endpoint in architecture.get("api_endpoints") or []:
+            if isinstance(endpoint, dict):
+                label = f"{endpoint.get('method', '')} {endpoint.get('path', '')}".strip()
+            else:
+                label = str(endpoint)
+            resources.setdefault(_endpoint_resource(endpoint), []).append(label)
+        return [f"{resource} ({', '.join(endpoints)})" for resource, endpoints in resources.items()]
+    return []
+
+
+def fullstack_batch_prompt(phase: JobPhase, request: MultiFileAppRequest, items: List[str], batch: Optional[List[str]]) -> str:
+    """
+    The task of one fanned-out frontend/backend call: batch=None writes the
+    shared files for all items, otherwise only the files of the batch's items.
+    """
+    listed = "\n".join(f"- {item}" for item in (items if batch is None else batch))
+    if phase == JobPhase.FRONTEND:
+        if batch is None:
+            return f"""**Your task:** as the frontend developer, generate the SHARED files of a COMPLETE, production-ready {request.framework.value} frontend application. Other developers write the components and pages in parallel.
+
+**Generate ONLY these shared files:**
+- src/App.jsx (main app with routing to every page below)
+- src/services/api.js (API client with all endpoints)
+- src/utils/auth.js (if auth required)
+- public/index.html
+- tailwind.config.js, postcss.config.js
+- package.json (with ALL dependencies)
+
+Do NOT generate these components/pages, only import them (src/components/<Name>.jsx, src/pages/<Name>.jsx):
+{listed}"""
+        return f"""**Your task:** as a frontend developer on a {request.framework.value} application, generate ONLY these components/pages, COMPLETE and production-ready:
+{listed}
+
+Write each to src/components/<Name>.jsx, or src/pages/<Name>.jsx for full-page CRUD views. Other developers write the rest in parallel: use src/services/api.js for API calls and src/utils/auth.js for auth, but do NOT generate them, App.jsx, package.json or any component not listed."""
+    if batch is None:
+        return f"""**Your task:** as the backend developer, generate the SHARED files of a COMPLETE, production-ready backend API. Other developers write the routes and models in parallel.
+
+**Generate ONLY these shared files:**
+- server.js or app.py (Express/FastAPI/Flask server, mounting routes/<resource> for every resource below)
+- middleware/auth.js (JWT authentication)
+- middleware/validation.js
+- middleware/errorHandler.js
+- config/database.js
+- .env.example
+- package.json or requirements.txt
+
+Do NOT generate the routes or models of these resources, only mount them:
+{listed}"""
+    return f"""**Your task:** as a backend developer, generate ONLY the routes/<resource> and models/<resource> files (COMPLETE and production-ready) of these API resources and their endpoints:
+{listed}
+
+Other developers write the rest in parallel: use config/database, middleware/auth, middleware/validation and middleware/errorHandler, but do NOT generate them, the server entry point, package.json or any resource not listed."""
+
 # ============================================
 # API ENDPOINTS
 # ============================================
@@ -850,7 +1314,9 @@ async def health_check():
             "openai": openai_client is not None,
             "anthropic": anthropic_client is not None
         },
-        n8n_enabled=bool(N8N_WEBHOOK_BASE)
+        n8n_enabled=bool(N8N_WEBHOOK_BASE),
+        event_loop=loop_monitor.stats(),
+        cpu_pool=cpu_pool.stats()
     )
 
 @app.get("/models", response_model=ModelsResponse)
@@ -882,25 +1348,83 @@ async def list_models():
 @app.get("/ai/ai/providers", response_model=AIProvidersResponse)
 async def ai_providers():
     """Expose provider availability for the frontend UI."""
+    def provider_status(name: str, client: Any) -> str:
+        if client is None:
+            return "unconfigured"
+        return "available" if provider_router.health[name].ready() else "degraded"
+
     providers: List[Dict[str, str]] = []
     providers.append({
         "name": "OpenAI",
         "model": _default_openai_model(),
-        "status": "available" if openai_client is not None else "unconfigured",
+        "status": provider_status("openai", openai_client),
     })
     providers.append({
         "name": "Anthropic",
         "model": _default_anthropic_model(),
-        "status": "available" if anthropic_client is not None else "unconfigured",
+        "status": provider_status("anthropic", anthropic_client),
     })
-    return AIProvidersResponse(providers=providers, routing_strategy="auto")
+    return AIProvidersResponse(providers=providers, routing_strategy="hedged" if provider_router.hedge else "auto")
+
+@app.get("/ai/providers/health", response_model=Dict[str, Any])
+async def ai_providers_health():
+    """Latency, error rate and circuit state per provider, as seen by this worker"""
+    return {
+        **provider_router.stats(),
+        "clients": {provider_name: llm.stats() for provider_name, llm in llm_clients.items()},
+        "model_selection": model_selector.stats()
+    }
+
+@app.get("/ai/cache/stats", response_model=Dict[str, Any])
+async def cache_stats():
+    """Hit/miss/eviction counters of this worker's caches"""
+    return {
+        "responses": response_cache.stats(),
+        "job_fallback": job_fallback.stats(),
+        "semantic": {"enabled": SEMANTIC_CACHE_ENABLED, **semantic_cache.stats()},
+        "single_flight": single_flight.stats()
+    }
+
+@app.get("/usage", response_model=Dict[str, Any])
+@app.get("/ai/usage", response_model=Dict[str, Any])
+async def get_usage(
+    x_user_id: Optional[str] = Header(None),
+    x_user_tier: Optional[str] = Header("free")
+):
+    """Request quota, remaining token budget and today's usage for the caller"""
+    user_id = x_user_id or "anonymous"
+    tier = x_user_tier if x_user_tier in RATE_LIMITS else "free"
+    limits = RATE_LIMITS[tier]
+    requests_used = await rate_limiter.peek(f"{user_id}:ai", limits["ai"], limits["window"])
+    budget = await token_budget.remaining(user_id, limits["tokens"], limits["window"])
+    return {
+        "user_id": user_id,
+        "tier": tier,
+        "window_seconds": limits["window"],
+        "requests": {
+            "used": requests_used.used,
+            "limit": limits["ai"],
+            "remaining": requests_used.remaining
+        },
+        "token_budget": {
+            "credits_used": budget.used,
+            "credits_limit": limits["tokens"],
+            "credits_remaining": budget.remaining,
+            "resets_at": datetime.utcfromtimestamp(budget.reset_at).isoformat()
+        },
+        "today": await token_budget.ledger(user_id)
+    }
 
 @app.post("/sql/assist", response_model=SQLAssistResponse)
 @app.post("/ai/sql/assist", response_model=SQLAssistResponse)
-async def sql_assist(request: SQLAssistRequest):
+async def sql_assist(
+    request: SQLAssistRequest,
+    x_user_id: Optional[str] = Header(None),
+    x_user_tier: Optional[str] = Header("free")
+):
     """SQL assistance endpoint used by the NexusAI frontend."""
-    provider_name, client = choose_ai_provider(request.query, request.provider)
-    model = _normalize_requested_model(provider_name, request.model)
+    candidates = provider_candidates(request.provider)
+    user_id = x_user_id or "anonymous"
 
     schema_text = f"\n\nSchema:\n{request.schema}" if request.schema else ""
     sql_text = f"\n\nSQL:\n{request.sql}" if request.sql else ""
@@ -914,25 +1438,27 @@ async def sql_assist(request: SQLAssistRequest):
     else:  # fix
         prompt = f"Fix this SQL for PostgreSQL. Provide fixed SQL only.\n{request.query}{schema_text}{sql_text}"
 
-    try:
-        if provider_name == "openai":
-            response = await client.chat.completions.create(
-                model=model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.2,
-                max_tokens=2048,
-            )
-            text = response.choices[0].message.content
-        else:
-            response = await client.messages.create(
-                model=model,
-                max_tokens=2048,
-                temperature=0.2,
-                messages=[{"role": "user", "content": prompt}],
-            )
-            text = response.content[0].text
+    sql_complexity = prompt_complexity(prompt, 2048)
+    model = select_model(candidates[0][0], request.model, sql_complexity, x_user_tier, 2048)
+    reservation = await reserve_tokens(user_id, x_user_tier, model, prompt, 2048)
+    spent_tokens = 0  # Stays 0 if another caller's in-flight request answers this one
+
+    async def ask(provider_name: str, llm: LLMClient) -> Dict[str, Any]:
+        nonlocal spent_tokens
+        model = select_model(provider_name, request.model, sql_complexity, x_user_tier, 2048)
+        completion = await llm.complete(prompt, model=model, max_tokens=2048, temperature=0.2)
+        spent_tokens = completion.usage.tokens
+        return {"text": completion.text.strip(), "provider": provider_name, "model": model}
 
-        text = (text or "").strip()
+    async def assist() -> Dict[str, Any]:
+        return (await provider_router.call(candidates, ask))[1]
+
+    try:
+        # Identical questions asked at the same time share one provider call
+        # (per SLO tier: it picks the model)
+        flight_key = cache_key("sql", request.action, prompt, request.provider.value, request.model, slo_tier(x_user_tier))
+        answer = await single_flight.do(flight_key, assist)
+        text, provider_name, model = answer["text"], answer["provider"], answer["model"]
         if request.action == "explain":
             return SQLAssistResponse(
                 explanation=text,
@@ -958,40 +1484,304 @@ async def sql_assist(request: SQLAssistRequest):
     except Exception as e:
         logger.error(f"❌ SQL assist failed: {str(e)}")
         raise HTTPException(status_code=500, detail=f"SQL assist failed: {str(e)}")
+    finally:
+        await token_budget.settle(reservation, model, spent_tokens)
+
+def _sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format one Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _stream_routed(
+    candidates: List[tuple[str, LLMClient]],
+    open_stream: Callable[[LLMClient, Usage], AsyncIterator[str]],
+    usage: Usage
+) -> AsyncIterator[str]:
+    """
+    Stream through the provider router: providers are failed over (and hedged)
+    until one produces its first token, then that one is streamed.
+    open_stream(llm, usage) starts one provider's stream; usage ends up with
+    the provider, model and token counts of the one that won.
+    """
+    attempts: Dict[str, Usage] = {}
+    
+    def open_attempt(provider_name: str, llm: LLMClient) -> AsyncIterator[str]:
+        attempts[provider_name] = Usage()
+        return open_stream(llm, attempts[provider_name])
+    
+    provider_name, stream = await provider_router.stream(candidates, open_attempt)
+    try:
+        async for delta in stream:
+            yield delta
+    finally:
+        vars(usage).update(vars(attempts[provider_name]))
+
+async def _parse_files_stream(
+    deltas: AsyncIterator[str],
+    context: str,
+    on_file: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+    parser: Optional[StreamingFilesParser] = None,
+    usage: Optional[Usage] = None
+) -> tuple[Dict[str, Any], bool]:
+    """
+    Parse a streamed multi-file generation incrementally: (document, reparsed).
+    on_file is awaited with each files[] entry as soon as it is complete.
+    
+    If the parser never saw the document close although the provider did not
+    report truncation (usage.finish_reason != "length"), it lost track - an
+    unescaped quote in a file's content, say. The whole output is then
+    re-parsed with extract_json (reparsed=True), and the files the parser
+    missed are passed to on_file.
+    """
+    parser = parser or StreamingFilesParser()
+    raw: List[str] = []
+    
+    async for delta in deltas:
+        raw.append(delta)
+        for file in parser.feed(delta):
+            if on_file:
+                await on_file(file)
+    
+    if not parser.complete and not (usage and usage.finish_reason == "length"):
+        logger.warning(f"⚠️  {context}: streaming parser lost track of the JSON, re-parsing the whole output")
+        document = (await parse_ai_json_async("".join(raw), context)).value
+        if not isinstance(document, dict):
+            raise ValueError(f"AI returned invalid JSON in {context}: output is not a JSON object")
+        files = [file for file in document.get("files") or [] if isinstance(file, dict)]
+        emitted = {_file_key(file) for file in parser.files}
+        for file in files:
+            if on_file and _file_key(file) not in emitted:
+                await on_file(file)
+        document["files"] = files
+        return document, True
+    
+    try:
+        document = parser.finish()
+    except ValueError as e:
+        raise ValueError(f"AI returned invalid JSON in {context}: {str(e)}")
+    if not parser.complete:
+        logger.warning(f"⚠️  {context}: output ended before the JSON closed, kept {len(parser.files)} complete files")
+    return document, False
+
+async def _generate_files(
+    candidates: List[tuple[str, LLMClient]],
+    context: str,
+    prompt: str,
+    usage: Usage,
+    on_file: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+    choose_model: Optional[Callable[[str], str]] = None,
+    warmup: Optional[CacheWarmup] = None,
+    **options: Any
+) -> Dict[str, Any]:
+    """
+    Stream a multi-file generation from the first healthy provider and parse it incrementally.
+    choose_model(provider_name) picks the model (default: the provider's default);
+    warmup staggers calls sharing a cached prompt prefix on the preferred provider;
+    options are LLMClient.stream() arguments (system, prefix, max_tokens, temperature, json_mode).
+    
+    Output cut off at max_tokens is continued: up to LLM_MAX_CONTINUATIONS more
+    requests list the files already complete (paths only, not their content) and
+    ask for the rest, and their files are spliced in after the ones kept.
+    usage gets the provider, model and tokens used over all requests, even if
+    parsing fails, and how cleanly each output parsed is fed back to the model selector.
+    """
+    document: Optional[Dict[str, Any]] = None
+    written: Dict[Any, Dict[str, Any]] = {}  # _file_key -> file, in the order they were written
+    
+    async def on_new_file(file: Dict[str, Any]):
+        # A continuation may repeat a file it was told is done; keep the first copy
+        key = _file_key(file)
+        if key in written:
+            return
+        written[key] = file
+        if on_file:
+            await on_file(file)
+    
+    for continuation in range(LLM_MAX_CONTINUATIONS + 1):
+        request_prompt = prompt if not continuation else prompt + _continuation_note(
+            [file["path"] for file in written.values() if isinstance(file, dict) and file.get("path")]
+        )
+        part = Usage()
+        parser = StreamingFilesParser()
+        written_before = len(written)
+        try:
+            part_document = await _stream_files_once(
+                candidates, f"{context} (continuation {continuation})" if continuation else context,
+                request_prompt, part, parser, on_new_file, choose_model, warmup if not continuation else None, options
+            )
+        except Exception as e:
+            if document is None:
+                raise
+            # The files already written stand on their own
+            logger.warning(f"⚠️  {context}: continuation {continuation} failed ({e}), keeping {len(written)} files")
+            break
+        finally:
+            _add_usage(usage, part)
+        
+        if document is None:
+            document = part_document
+        else:
+            for key, value in part_document.items():
+                document.setdefault(key, value)
+        document["files"] = list(written.values())
+        
+        # Only output the provider cut off is continued (a lost parser re-parses the whole output instead)
+        truncated = part.finish_reason == "length"
+        if not truncated:
+            break
+        if len(written) == written_before:
+            logger.warning(f"⚠️  {context}: continuation wrote no new files, keeping {len(written)}")
+            break
+        if continuation == LLM_MAX_CONTINUATIONS:
+            logger.warning(f"⚠️  {context}: still truncated after {continuation} continuations, keeping {len(written)} files")
+            break
+        logger.info(f"↪️  {context}: output hit max_tokens after {len(written)} files, continuing")
+        # Continue on the provider that wrote the first part, so the files match in style
+        candidates = sorted(candidates, key=lambda candidate: candidate[0] != part.provider)
+    
+    return document
+
+def _file_key(file: Any) -> Any:
+    """What identifies a generated file: its path (files without one are all distinct)"""
+    if isinstance(file, dict) and file.get("path"):
+        return file["path"]
+    return id(file)
+
+def _continuation_note(paths: List[str]) -> str:
+    """What a continuation request adds to the prompt: the files that are done"""
+    return (
+        "\n\n**CONTINUATION:** Your previous answer was cut off. These files are already complete; "
+        "do NOT output them again:\n"
+        + "\n".join(f"- {path}" for path in paths)
+        + "\n\nOutput the same JSON object with ONLY the remaining files (and any other top-level keys)."
+    )
+
+def _add_usage(total: Usage, part: Usage):
+    """Fold one request's usage into the running total of a multi-request generation"""
+    total.provider, total.model, total.finish_reason = part.provider or total.provider, part.model or total.model, part.finish_reason
+    total.input_tokens += part.input_tokens
+    total.output_tokens += part.output_tokens
+    total.cached_tokens += part.cached_tokens
+    total.cache_write_tokens += part.cache_write_tokens
+
+async def _stream_files_once(
+    candidates: List[tuple[str, LLMClient]],
+    context: str,
+    prompt: str,
+    usage: Usage,
+    parser: StreamingFilesParser,
+    on_file: Callable[[Dict[str, Any]], Awaitable[None]],
+    choose_model: Optional[Callable[[str], str]],
+    warmup: Optional[CacheWarmup],
+    options: Dict[str, Any]
+) -> Dict[str, Any]:
+    """One streamed request of _generate_files"""
+    def open_stream(llm: LLMClient, attempt: Usage) -> AsyncIterator[str]:
+        model = choose_model(llm.provider) if choose_model else None
+        return llm.stream(prompt, usage=attempt, model=model, **options)
+    
+    outcome = None  # Provider errors and cancellations say nothing about output quality
+    try:
+        def routed() -> AsyncIterator[str]:
+            return _stream_routed(candidates, open_stream, usage)
+        deltas = warmup.stream(candidates[0][0], routed) if warmup else routed()
+        document, reparsed = await _parse_files_stream(deltas, context, on_file, parser, usage)
+        if usage.finish_reason == "length" or (not parser.complete and not reparsed):
+            outcome = FAILED
+        else:
+            outcome = REPAIRED if reparsed or parser.repairs or parser.skipped else CLEAN
+        return document
+    except ValueError:
+        outcome = FAILED
+        raise
+    finally:
+        if usage.model and outcome:
+            model_selector.record_json(usage.model, outcome)
+
+async def _stream_ai_text(
+    request: AIGenerateRequest,
+    candidates: List[tuple[str, LLMClient]],
+    start_time: float,
+    reservation: Optional[Reservation] = None,
+    tier: Optional[str] = None
+) -> AsyncIterator[str]:
+    """
+    Forward provider tokens as SSE "token" events as soon as they arrive.
+    Ends with a "done" event carrying tokens_used and generation_time_ms,
+    or an "error" event if the provider call fails mid-stream.
+    The reservation is settled with the tokens used once the stream ends.
+    """
+    usage = Usage()
+    text_complexity = prompt_complexity(request.prompt, request.max_tokens)
+    
+    def open_stream(llm: LLMClient, attempt: Usage) -> AsyncIterator[str]:
+        return llm.stream(
+            request.prompt, usage=attempt,
+            model=select_model(llm.provider, request.model, text_complexity, tier, request.max_tokens),
+            max_tokens=request.max_tokens,
+            temperature=request.temperature
+        )
+    
+    try:
+        async for delta in _stream_routed(candidates, open_stream, usage):
+            yield _sse_event("token", {"text": delta})
+        
+        yield _sse_event("done", {
+            "provider": usage.provider,
+            "model": usage.model,
+            "tokens_used": usage.tokens,
+            "generation_time_ms": int((time.time() - start_time) * 1000)
+        })
+    
+    except Exception as e:
+        # Headers are already sent, so the failure has to travel in-band
+        logger.error(f"❌ AI streaming failed: {str(e)}")
+        yield _sse_event("error", {"error": f"AI generation failed: {str(e)}"})
+    
+    finally:
+        if reservation:
+            await token_budget.settle(reservation, usage.model or None, usage.tokens)
 
 @app.post("/ai/generate", response_model=Dict[str, Any])
 async def generate_ai_text(
     request: AIGenerateRequest,
-    x_api_key: Optional[str] = Header(None)
+    x_api_key: Optional[str] = Header(None),
+    x_user_id: Optional[str] = Header(None),
+    x_user_tier: Optional[str] = Header("free")
 ):
-    """Generate AI text/code"""
+    """Generate AI text/code (set "stream": true for a Server-Sent Events token stream)"""
     start_time = time.time()
     
-    # Choose provider
-    provider_name, client = choose_ai_provider(request.prompt, request.provider)
+    # Choose providers (the first healthy one, failing over to the rest)
+    candidates = provider_candidates(request.provider)
+    text_complexity = prompt_complexity(request.prompt, request.max_tokens)
+    model = select_model(candidates[0][0], request.model, text_complexity, x_user_tier, request.max_tokens)
+    reservation = await reserve_tokens(x_user_id or "anonymous", x_user_tier, model, request.prompt, request.max_tokens)
+    
+    if request.stream:
+        return StreamingResponse(
+            _stream_ai_text(request, candidates, start_time, reservation, x_user_tier),
+            media_type="text/event-stream",
+            headers={
+                "Cache-Control": "no-cache",
+                "X-Accel-Buffering": "no"  # Stop Nginx from buffering the stream
+            }
+        )
+    
+    tokens = 0
+    
+    async def complete(provider_name: str, llm: LLMClient) -> str:
+        nonlocal tokens, model
+        completion = await llm.complete(
+            request.prompt,
+            model=select_model(provider_name, request.model, text_complexity, x_user_tier, request.max_tokens),
+            max_tokens=request.max_tokens,
+            temperature=request.temperature
+        )
+        tokens, model = completion.usage.tokens, completion.usage.model
+        return completion.text
     
     try:
-        if provider_name == "openai":
-            model = _normalize_requested_model(provider_name, request.model)
-            response = await client.chat.completions.create(
-                model=model,
-                messages=[{"role": "user", "content": request.prompt}],
-                temperature=request.temperature,
-                max_tokens=request.max_tokens
-            )
-            result = response.choices[0].message.content
-            tokens = response.usage.total_tokens if response.usage else 0
-            
-        else:  # anthropic
-            model = _normalize_requested_model(provider_name, request.model)
-            response = await client.messages.create(
-                model=model,
-                max_tokens=request.max_tokens,
-                temperature=request.temperature,
-                messages=[{"role": "user", "content": request.prompt}]
-            )
-            result = response.content[0].text
-            tokens = response.usage.input_tokens + response.usage.output_tokens if hasattr(response, 'usage') else 0
+        provider_name, result = await provider_router.call(candidates, complete)
         
         elapsed = int((time.time() - start_time) * 1000)
         
@@ -1006,6 +1796,8 @@ async def generate_ai_text(
     except Exception as e:
         logger.error(f"❌ AI generation failed: {str(e)}")
         raise HTTPException(status_code=500, detail=f"AI generation failed: {str(e)}")
+    finally:
+        await token_budget.settle(reservation, model, tokens)
 
 @app.post("/ai/generate/app", response_model=MultiFileAppResponse)
 async def generate_full_app(
@@ -1022,7 +1814,7 @@ async def generate_full_app(
     user_id = x_user_id or "anonymous"
     
     # Rate limiting
-    if not check_rate_limit(user_id, x_user_tier, "ai"):
+    if not await check_rate_limit(user_id, x_user_tier, "ai"):
         raise HTTPException(
             status_code=429,
             detail=f"Rate limit exceeded for {x_user_tier} tier"
@@ -1031,58 +1823,51 @@ async def generate_full_app(
     logger.info(f"🎨 Generating {request.framework.value} app for user {user_id}")
     logger.info(f"📝 Description: {request.description[:100]}...")
     
-    # Check cache
-    cache_key_val = cache_key("app", request.description, request.framework, request.features)
-    cached = get_cache(cache_key_val)
+    # Check cache (per SLO tier: it picks the model, so tiers never share generations)
+    quality_tier = slo_tier(x_user_tier)
+    cache_key_val = cache_key("app", request.description, request.framework, request.features, quality_tier)
+    semantic_namespace = f"{request.framework.value}:{quality_tier}"
+    cached = await get_cache(cache_key_val)
     if cached:
         logger.info("💾 Returning cached app generation")
         return MultiFileAppResponse(**cached)
     
-    # Choose AI provider
-    provider_name, client = choose_ai_provider(request.description, request.provider)
-    
-    # Generate prompt
-    prompt = get_app_generation_prompt(request)
-    
-    try:
-        # Call AI
-        if provider_name == "openai":
-            model = _default_openai_model()  # Best for code generation
-            response = await client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": "You are an expert full-stack developer. Generate complete, production-ready code with no placeholders. Return valid JSON only."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=16000,
-                response_format={"type": "json_object"}
-            )
-            result_text = response.choices[0].message.content
-            tokens = response.usage.total_tokens if response.usage else 0
-            
-        else:  # anthropic
-            model = _default_anthropic_model()
-            max_tokens = _get_model_max_tokens("anthropic", model)
-            response = await client.messages.create(
-                model=model,
-                max_tokens=max_tokens,
+    if SEMANTIC_CACHE_ENABLED:
+        match = await semantic_cache.lookup(semantic_namespace, request.description, request.features)
+        if match:
+            similar_key, similarity = match
+            cached = await get_cache(similar_key)
+            if cached:
+                logger.info(f"💾 Returning semantically cached app generation (similarity {similarity:.2f})")
+                return MultiFileAppResponse(**cached)
+            semantic_cache.discard(semantic_namespace, similar_key)
+    
+    # Choose AI providers (the first healthy one, failing over to the rest)
+    candidates = provider_candidates(request.provider)
+    prompt = get_app_generation_prompt(request)
+    request_complexity = app_complexity(request.description, request.features, request.framework.value)
+    budget_model = select_model(candidates[0][0], None, request_complexity, x_user_tier, 16000)
+    reservation = await reserve_tokens(user_id, x_user_tier, budget_model, prompt, 16000)
+    spent_tokens = 0  # Stays 0 if another caller's in-flight generation answers this one
+    
+    async def generate() -> Dict[str, Any]:
+        nonlocal spent_tokens, budget_model
+        
+        # Call AI (streamed, so files are parsed as soon as each one is complete)
+        usage = Usage()
+        try:
+            result_json = await _generate_files(
+                candidates, "generate_app", prompt, usage,
+                choose_model=lambda provider_name: select_model(provider_name, None, request_complexity, x_user_tier, 16000),
+                system="You are an expert full-stack developer. Generate complete, production-ready code with no placeholders. Return valid JSON only.",
+                max_tokens=16000,  # Capped at the model's limit
                 temperature=0.7,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": "You are an expert full-stack developer. Generate complete, production-ready code with no placeholders. Return valid JSON only."},
-                            {"type": "text", "text": prompt}
-                        ]
-                    }
-                ]
+                json_mode=True
             )
-            result_text = response.content[0].text
-            tokens = response.usage.input_tokens + response.usage.output_tokens
-        
-        # Parse AI response with sanitization
-        result_json = sanitize_and_parse_json(result_text, "generate_app")
+        finally:
+            spent_tokens = usage.tokens
+            budget_model = usage.model or budget_model
+        provider_name, model, tokens = usage.provider, usage.model, usage.tokens
         
         elapsed = int((time.time() - start_time) * 1000)
         
@@ -1104,7 +1889,9 @@ async def generate_full_app(
         }
         
         # Cache result
-        set_cache(cache_key_val, response_data, ttl=3600)
+        await set_cache(cache_key_val, response_data, ttl=3600)
+        if SEMANTIC_CACHE_ENABLED:
+            await semantic_cache.add(semantic_namespace, request.description, request.features, cache_key_val, ttl=3600)
         
         # Send N8N webhook (async, non-blocking)
         asyncio.create_task(send_n8n_webhook(N8N_APP_GENERATED, {
@@ -1119,12 +1906,15 @@ async def generate_full_app(
         }))
         
         logger.info(f"✅ App generated successfully: {len(response_data['files'])} files in {elapsed}ms using {provider_name}")
-        
+        return response_data
+    
+    try:
+        # Identical requests already being generated (here or on another worker) share that call
+        response_data = await single_flight.do(cache_key_val, generate)
         return MultiFileAppResponse(**response_data)
         
-    except json.JSONDecodeError as e:
+    except ValueError as e:  # The streaming parser's invalid-JSON error
         logger.error(f"❌ Failed to parse AI response as JSON: {str(e)}")
-        logger.error(f"Raw response: {result_text[:500]}...")
         raise HTTPException(
             status_code=500,
             detail="AI returned invalid JSON. Please try again."
@@ -1132,6 +1922,8 @@ async def generate_full_app(
     except Exception as e:
         logger.error(f"❌ App generation failed: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Generation failed: {str(e)}")
+    finally:
+        await token_budget.settle(reservation, budget_model, spent_tokens)
 
 @app.post("/deploy/app", response_model=Dict[str, Any])
 async def deploy_app(
@@ -1146,7 +1938,7 @@ async def deploy_app(
     user_id = request.user_id
     
     # Rate limiting
-    if not check_rate_limit(user_id, x_user_tier, "deploy"):
+    if not await check_rate_limit(user_id, x_user_tier, "deploy"):
         raise HTTPException(
             status_code=429,
             detail=f"Deploy rate limit exceeded for {x_user_tier} tier"
@@ -1757,7 +2549,7 @@ Return ONLY valid JSON."""
         
         return MultiFileAppResponse(**response_data)
         
-    except json.JSONDecodeError as e:
+    except ValueError as e:  # sanitize_and_parse_json's invalid-JSON error
         logger.error(f"JSON parsing error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"AI returned invalid JSON: {str(e)}")
     except Exception as e:
@@ -1777,15 +2569,33 @@ Return ONLY valid JSON."""
 # ASYNC FULLSTACK GENERATION (Job Queue)
 # ============================================
 
+async def _settle_job_credits(job_id: str, reservation: Reservation, tokens_by_model: Dict[str, int]):
+    """Settle a job's reserved credits and record the new holding, so a re-run settles the difference"""
+    await token_budget.settle_models(reservation, tokens_by_model)
+    if redis_client:
+        try:
+            await redis_client.hset(f"job:{job_id}", "reserved_credits", reservation.credits)
+        except Exception as e:
+            logger.warning(f"⚠️  Failed to record settled credits for {job_id}: {e}")
+
 async def _execute_fullstack_generation_background(
     job_id: str,
     request: MultiFileAppRequest,
-    user_id: str
+    user_id: str,
+    reservation: Optional[Reservation] = None,
+    tier: str = "free"
 ):
     """
     Background task: Execute 5-phase fullstack generation with progress updates
     This runs asynchronously and updates job status in Redis
     """
+    spent_tokens: Dict[str, int] = {}  # model -> tokens of the phases this run finished
+    request_complexity = app_complexity(request.description, request.features, request.framework.value)
+
+    def choose_model(provider_name: str) -> str:
+        # Whole-app phases: as much output room as the model allows
+        return select_model(provider_name, None, request_complexity, tier, 16000)
+
     try:
         start_time = time.time()
         
@@ -1799,11 +2609,30 @@ async def _execute_fullstack_generation_background(
         logger.info(f"🎯 JOB {job_id}: Starting DUAL-AI FULLSTACK generation")
         
         # ==============================================
-        # PHASE 1: ARCHITECTURE & DATABASE DESIGN (20%)
+        # PHASES 1-4: DEPENDENCY-AWARE GENERATION
         # ==============================================
-        await update_job_progress(job_id, JobPhase.ARCHITECTURE, 10, "Designing system architecture with Claude 3.5 Sonnet...")
-        
-        architecture_prompt = f"""You are a senior software architect. Design a COMPLETE, production-grade full-stack application.
+        # Frontend, backend and integration only need the Phase 1 output, so the
+        # task graph launches them together as soon as the architecture exists.
+
+        # Progress only moves forward: each finished phase adds its weight, and a
+        # running phase reports the completed total plus a small head start.
+        completed_percent = 0
+
+        def report_file_written(phase: JobPhase, label: str) -> Callable[[Dict[str, Any]], Awaitable[None]]:
+            """Surface each streamed file on the job as soon as it is parsed"""
+            written = 0
+
+            async def on_file(file: Dict[str, Any]):
+                nonlocal written
+                written += 1
+                await update_job_progress(
+                    job_id, phase, completed_percent + 5,
+                    f"{label}: {written} files written (latest: {file.get('path', 'unknown')})"
+                )
+            return on_file
+
+        async def run_architecture_phase(results: Dict[str, Any]) -> Dict[str, Any]:
+            architecture_prompt = f"""You are a senior software architect. Design a COMPLETE, production-grade full-stack application.
 
 **Project:** {request.description}
 **Framework:** {request.framework.value}
@@ -1830,199 +2659,175 @@ Return ONLY valid JSON:
   "frontend_components": [...]
 }}"""
 
-        if has_anthropic:
-            model = _default_anthropic_model()
-            max_tokens = _get_model_max_tokens("anthropic", model)
-            architecture_response = await anthropic_client.messages.create(
-                model=model,
-                max_tokens=max_tokens,
-                temperature=0.5,
-                messages=[{"role": "user", "content": architecture_prompt}]
-            )
-            architecture_text = architecture_response.content[0].text.strip()
-            architecture_tokens = architecture_response.usage.input_tokens + architecture_response.usage.output_tokens
-        else:
-            architecture_response = await openai_client.chat.completions.create(
-                model=_default_openai_model(),
-                messages=[
-                    {"role": "system", "content": "You are a senior software architect."},
-                    {"role": "user", "content": architecture_prompt}
-                ],
-                temperature=0.5
+            # Claude designs when it is configured and healthy, GPT-4o otherwise
+            _, completion = await provider_router.call(
+                provider_candidates(AIProvider.AUTO, prefer="anthropic"),
+                lambda provider_name, llm: llm.complete(
+                    architecture_prompt, system="You are a senior software architect.",
+                    model=choose_model(provider_name), temperature=0.5
+                )
             )
-            architecture_text = architecture_response.choices[0].message.content.strip()
-            architecture_tokens = architecture_response.usage.total_tokens
-        
-        architecture = sanitize_and_parse_json(architecture_text, "Phase 1: Architecture")
-        database_schema = architecture.get('database_schema', {})
-        
-        await update_job_progress(job_id, JobPhase.ARCHITECTURE, 20, "✅ Architecture designed")
-        
-        # ==============================================
-        # PHASE 2: FRONTEND GENERATION (40%)
-        # ==============================================
-        await update_job_progress(job_id, JobPhase.FRONTEND, 25, "Generating frontend code with GPT-4o...")
-        
-        frontend_prompt = f"""Generate a COMPLETE, production-ready {request.framework.value} frontend application.
-
-**Architecture:** {json.dumps(architecture['architecture'], indent=2)}
-**Database Schema:** {json.dumps(database_schema, indent=2)}
-
-**Generate ALL frontend files:**
-- src/App.jsx (main app with routing)
-- src/components/* (all UI components based on database entities)
-- src/pages/* (CRUD views for all entities)
-- src/services/api.js (API client with all endpoints)
-- src/utils/auth.js (if auth required)
-- public/index.html
-- tailwind.config.js, postcss.config.js
-- package.json (with ALL dependencies)
-
-**CRITICAL JSON FORMATTING RULES:**
-- Properly escape ALL special characters: \\n for newlines, \\t for tabs, \\" for quotes, \\\\ for backslashes
-- No unescaped control characters in "content" field
-- Code must be valid JSON string with proper escaping  
-- Use \\n instead of actual newlines in code content
-- Validate that output is parseable JSON before returning
-
-Output JSON:
-{{
-  "files": [
-    {{"path": "src/App.jsx", "content": "...", "language": "javascript"}},
-    ...
-  ]
-}}"""
 
-        frontend_response = await openai_client.chat.completions.create(
-            model=_default_openai_model(),
-            messages=[
-                {"role": "system", "content": "You are an expert frontend developer."},
-                {"role": "user", "content": frontend_prompt}
-            ],
-            temperature=0.6
-        )
-        frontend_text = frontend_response.choices[0].message.content.strip()
-        frontend_tokens = frontend_response.usage.total_tokens
-        frontend_data = sanitize_and_parse_json(frontend_text, "Phase 2: Frontend")
-        frontend_files = frontend_data.get('files', [])
-        
-        await update_job_progress(job_id, JobPhase.FRONTEND, 40, f"✅ Generated {len(frontend_files)} frontend files")
-        
-        # ==============================================
-        # PHASE 3: BACKEND GENERATION (60%)
-        # ==============================================
-        await update_job_progress(job_id, JobPhase.BACKEND, 45, "Generating backend API with GPT-4o...")
-        
-        backend_prompt = f"""Generate a COMPLETE, production-ready backend API.
-
-**Architecture:** {json.dumps(architecture['architecture'], indent=2)}
-**Database Schema:** {json.dumps(database_schema, indent=2)}
-**API Endpoints:** {json.dumps(architecture.get('api_endpoints', []), indent=2)}
-
-**Generate ALL backend files:**
-- server.js or app.py (Express/FastAPI/Flask server)
-- routes/* (all API endpoints)
-- models/* (database models for all entities)
-- middleware/auth.js (JWT authentication)
-- middleware/validation.js
-- middleware/errorHandler.js
-- config/database.js
-- .env.example
-- package.json or requirements.txt
-
-**CRITICAL JSON FORMATTING RULES:**
-- Properly escape ALL special characters: \\n for newlines, \\t for tabs, \\" for quotes, \\\\ for backslashes
-- No unescaped control characters in "content" field
-- Code must be valid JSON string with proper escaping
-- Use \\n instead of actual newlines in code content
-- Validate that output is parseable JSON before returning
+            try:
+                extracted = await parse_ai_json_async(completion.text, "Phase 1: Architecture")
+            except ValueError:
+                model_selector.record_json(completion.usage.model, FAILED)
+                raise
+            if extracted.truncated or completion.usage.finish_reason == "length":
+                outcome = FAILED
+            else:
+                outcome = REPAIRED if extracted.repaired else CLEAN
+            model_selector.record_json(completion.usage.model, outcome)
+            architecture = extracted.value
+            return {
+                "data": architecture,
+                "tokens": completion.usage.tokens,
+                "model_tokens": {completion.usage.model: completion.usage.tokens},
+                "summary": "✅ Architecture designed"
+            }
+
+        # Phases 2-4 share a cacheable prompt prefix: one call per provider
+        # writes it to the prompt cache before the others start
+        prompt_warmup = CacheWarmup()
+        # Every generation call of the job, fanned-out batches included
+        generation_slots = asyncio.Semaphore(FULLSTACK_FANOUT_CONCURRENCY)
+
+        async def run_files_phase(
+            results: Dict[str, Any], phase: JobPhase, context: str, label: str, prefer: str, temperature: float
+        ) -> tuple[Dict[str, Any], Usage, Dict[str, int]]:
+            """The phase's document, its summed usage and its tokens per model (each is charged at its own rate)"""
+            architecture = results[JobPhase.ARCHITECTURE.value]["data"]
+            on_file = report_file_written(phase, label)
+            prefix = [fullstack_context_prompt(request, architecture)]
+
+            async def generate(task: str, call_context: str) -> tuple[Dict[str, Any], Usage]:
+                usage = Usage()
+                async with generation_slots:
+                    document = await _generate_files(
+                        provider_candidates(AIProvider.AUTO, prefer=prefer),
+                        call_context,
+                        task,
+                        usage,
+                        on_file=on_file,
+                        choose_model=choose_model,
+                        warmup=prompt_warmup,
+                        system=FULLSTACK_FILES_SYSTEM_PROMPT,
+                        prefix=prefix,
+                        temperature=temperature
+                    )
+                return document, usage
+
+            # One call writes every file of the phase, unless the plan is big enough to
+            # split: then its output is no longer capped by one call's max_tokens, and
+            # the batches stream in parallel
+            items = fullstack_fanout_items(phase, architecture)
+            size = FULLSTACK_FANOUT_BATCH_SIZE
+            model_tokens: Dict[str, int] = {}
+            if size <= 0 or len(items) <= size:
+                document, usage = await generate(fullstack_task_prompt(phase, request), context)
+                model_tokens[usage.model] = usage.tokens
+            else:
+                batches = [items[start:start + size] for start in range(0, len(items), size)]
+                logger.info(f"🔀 {label}: {len(items)} planned units in {len(batches)} batches + shared files")
+                batch_graph = TaskGraph()
+                for index, batch in enumerate([None] + batches):
+                    batch_context = f"{context} (shared files)" if batch is None else f"{context} (batch {index}/{len(batches)})"
+                    batch_graph.add(
+                        str(index),
+                        lambda _, batch=batch, batch_context=batch_context: generate(
+                            fullstack_batch_prompt(phase, request, items, batch), batch_context
+                        )
+                    )
+                parts = await batch_graph.run()  # The first failed batch fails the phase
+                document, usage = {}, Usage()
+                files: Dict[Any, Dict[str, Any]] = {}
+                for name in batch_graph.names:
+                    part_document, part_usage = parts[name]
+                    _add_usage(usage, part_usage)
+                    model_tokens[part_usage.model] = model_tokens.get(part_usage.model, 0) + part_usage.tokens
+                    for key, value in part_document.items():
+                        document.setdefault(key, value)
+                    for file in part_document.get("files", []):
+                        # Batches are told not to write each other's files; the first copy wins if they do
+                        files.setdefault(_file_key(file), file)
+                document["files"] = list(files.values())
+            if usage.cached_tokens:
+                logger.info(f"   ♻️  {label}: {usage.cached_tokens}/{usage.input_tokens} prompt tokens from cache")
+            return document, usage, model_tokens
+
+        async def run_frontend_phase(results: Dict[str, Any]) -> Dict[str, Any]:
+            frontend_data, usage, model_tokens = await run_files_phase(results, JobPhase.FRONTEND, "Phase 2: Frontend", "Frontend", "openai", 0.6)
+            frontend_files = frontend_data.get('files', [])
+            return {
+                "files": frontend_files,
+                "tokens": usage.tokens,
+                "model_tokens": model_tokens,
+                "cached_tokens": usage.cached_tokens,
+                "summary": f"✅ Generated {len(frontend_files)} frontend files"
+            }
+
+        async def run_backend_phase(results: Dict[str, Any]) -> Dict[str, Any]:
+            backend_data, usage, model_tokens = await run_files_phase(results, JobPhase.BACKEND, "Phase 3: Backend", "Backend", "openai", 0.6)
+            backend_files = backend_data.get('files', [])
+            return {
+                "files": backend_files,
+                "tokens": usage.tokens,
+                "model_tokens": model_tokens,
+                "cached_tokens": usage.cached_tokens,
+                "summary": f"✅ Generated {len(backend_files)} backend files"
+            }
+
+        async def run_integration_phase(results: Dict[str, Any]) -> Dict[str, Any]:
+            integration_data, usage, model_tokens = await run_files_phase(results, JobPhase.INTEGRATION, "Phase 4: Integration", "Config", "anthropic", 0.5)
+            integration_files = integration_data.get('files', [])
+            return {
+                "data": integration_data,
+                "files": integration_files,
+                "tokens": usage.tokens,
+                "model_tokens": model_tokens,
+                "cached_tokens": usage.cached_tokens,
+                "summary": f"✅ Generated {len(integration_files)} config files"
+            }
+
+        phase_graph = TaskGraph()
+        phase_graph.add(JobPhase.ARCHITECTURE.value, run_architecture_phase)
+        phase_graph.add(JobPhase.FRONTEND.value, run_frontend_phase, deps=[JobPhase.ARCHITECTURE.value])
+        phase_graph.add(JobPhase.BACKEND.value, run_backend_phase, deps=[JobPhase.ARCHITECTURE.value])
+        phase_graph.add(JobPhase.INTEGRATION.value, run_integration_phase, deps=[JobPhase.ARCHITECTURE.value])
+
+        async def on_phase_start(name: str):
+            await update_job_progress(
+                job_id, JobPhase(name), completed_percent + 5, FULLSTACK_PHASE_PLAN[name]["start"]
+            )
 
-Output JSON:
-{{
-  "files": [
-    {{"path": "server.js", "content": "...", "language": "javascript"}},
-    ...
-  ]
-}}"""
+        async def on_phase_complete(name: str, phase_result: Dict[str, Any]):
+            nonlocal completed_percent
+            # Checkpointed before anything else can fail, so a retry or resume skips this phase
+            await save_job_checkpoint(job_id, name, phase_result)
+            for model, tokens in phase_result["model_tokens"].items():
+                spent_tokens[model] = spent_tokens.get(model, 0) + tokens
+            completed_percent += FULLSTACK_PHASE_PLAN[name]["weight"]
+            await update_job_progress(job_id, JobPhase(name), completed_percent, phase_result["summary"])
+
+        # A resumed or recovered job skips the phases an earlier run finished
+        checkpoints = {
+            name: output for name, output in (await load_job_checkpoints(job_id)).items()
+            if name in FULLSTACK_PHASE_PLAN
+        }
+        if checkpoints:
+            completed_percent = sum(FULLSTACK_PHASE_PLAN[name]["weight"] for name in checkpoints)
+            logger.info(f"⏩ JOB {job_id}: resuming after checkpointed phases {sorted(checkpoints)}")
 
-        backend_response = await openai_client.chat.completions.create(
-            model=_default_openai_model(),
-            messages=[
-                {"role": "system", "content": "You are an expert backend developer."},
-                {"role": "user", "content": backend_prompt}
-            ],
-            temperature=0.6
+        phase_results = await phase_graph.run(
+            on_start=on_phase_start, on_complete=on_phase_complete, completed=checkpoints
         )
-        backend_text = backend_response.choices[0].message.content.strip()
-        backend_tokens = backend_response.usage.total_tokens
-        backend_data = sanitize_and_parse_json(backend_text, "Phase 3: Backend")
-        backend_files = backend_data.get('files', [])
-        
-        await update_job_progress(job_id, JobPhase.BACKEND, 60, f"✅ Generated {len(backend_files)} backend files")
-        
-        # ==============================================
-        # PHASE 4: INTEGRATION FILES (80%)
-        # ==============================================
-        await update_job_progress(job_id, JobPhase.INTEGRATION, 65, "Generating deployment configs and documentation...")
-        
-        integration_prompt = f"""Generate deployment configs and integration files.
-
-**Database Schema:** {json.dumps(database_schema, indent=2)}
-
-**Generate ONLY these deployment/config files:**
-1. frontend/package.json
-2. backend/package.json or requirements.txt
-3. database/schema.sql (CREATE TABLE statements)
-4. README.md (complete setup guide)
-5. postman_collection.json (all API endpoints)
-6. docker-compose.yml (optional)
-7. .env.example
-8. .gitignore
-
-**CRITICAL JSON FORMATTING RULES:**
-- Properly escape ALL special characters in file content: \\n for newlines, \\t for tabs, \\" for quotes, \\\\ for backslashes
-- SQL CREATE TABLE statements must use \\n instead of actual line breaks
-- package.json and config files must have properly escaped content strings
-- README content must escape all markdown special characters
-- Validate that your entire output is valid, parseable JSON before returning
-
-Output JSON:
-{{
-  "files": [
-    {{"path": "database/schema.sql", "content": "CREATE TABLE...", "language": "sql"}},
-    ...
-  ],
-  "setup_instructions": "...",
-  "dependencies": {{"frontend": {{}}, "backend": {{}}}}
-}}"""
 
-        if has_anthropic:
-            model = _default_anthropic_model()
-            max_tokens = _get_model_max_tokens("anthropic", model)
-            integration_response = await anthropic_client.messages.create(
-                model=model,
-                max_tokens=max_tokens,
-                temperature=0.5,
-                messages=[{"role": "user", "content": integration_prompt}]
-            )
-            integration_text = integration_response.content[0].text.strip()
-            integration_tokens = integration_response.usage.input_tokens + integration_response.usage.output_tokens
-        else:
-            integration_response = await openai_client.chat.completions.create(
-                model=_default_openai_model(),
-                messages=[
-                    {"role": "system", "content": "You are an expert DevOps engineer."},
-                    {"role": "user", "content": integration_prompt}
-                ],
-                temperature=0.5
-            )
-            integration_text = integration_response.choices[0].message.content.strip()
-            integration_tokens = integration_response.usage.total_tokens
-        
-        integration_data = sanitize_and_parse_json(integration_text, "Phase 4: Integration")
-        integration_files = integration_data.get('files', [])
-        
-        await update_job_progress(job_id, JobPhase.INTEGRATION, 80, f"✅ Generated {len(integration_files)} config files")
+        architecture = phase_results[JobPhase.ARCHITECTURE.value]["data"]
+        database_schema = architecture.get('database_schema', {})
+        frontend_files = phase_results[JobPhase.FRONTEND.value]["files"]
+        backend_files = phase_results[JobPhase.BACKEND.value]["files"]
+        integration_data = phase_results[JobPhase.INTEGRATION.value]["data"]
+        integration_files = phase_results[JobPhase.INTEGRATION.value]["files"]
         
         # ==============================================
         # PHASE 5: DATABASE PROVISIONING (100%)
@@ -2051,7 +2856,7 @@ Output JSON:
             file.setdefault('content', '')
             file.setdefault('language', 'text')
         
-        total_tokens = architecture_tokens + frontend_tokens + backend_tokens + integration_tokens
+        total_tokens = sum(phase["tokens"] for phase in phase_results.values())
         elapsed = int((time.time() - start_time) * 1000)
         
         database_info = None
@@ -2139,11 +2944,13 @@ Output JSON:
             },
             "provider_used": "dual-ai/claude-3.5-sonnet+gpt-4o" if has_anthropic else "openai/gpt-4o",
             "generation_time_ms": elapsed,
-            "tokens_used": total_tokens
+            "tokens_used": total_tokens,
+            "cached_tokens": sum(phase.get("cached_tokens", 0) for phase in phase_results.values())
         }
         
         # Mark job complete
         await complete_job(job_id, result)
+        await delete_job_checkpoints(job_id)
         
         # Send N8N webhook
         asyncio.create_task(send_n8n_webhook(N8N_APP_GENERATED, {
@@ -2169,18 +2976,57 @@ Output JSON:
             "job_id": job_id,
             "timestamp": datetime.utcnow().isoformat()
         }))
+    
+    finally:
+        # Runs pay for the phases they finished (not those restored from checkpoints)
+        if reservation:
+            await _settle_job_credits(job_id, reservation, spent_tokens)
+
+
+async def _queue_fullstack_job(
+    job_id: str, request: MultiFileAppRequest, user_id: str, reservation: Reservation, tier: str
+) -> Optional[int]:
+    """
+    Queue a pending job for background execution and return its queue position:
+    the cluster stream if the job hash made it into Redis (any worker can pick
+    it up), otherwise this worker's executor (503 if that is full).
+    """
+    queue_id = None
+    position = None
+    if job_queue and f"job:{job_id}" not in job_fallback:
+        try:
+            queue_id = await job_queue.enqueue(job_id, tier)
+            await redis_client.hset(f"job:{job_id}", mapping={"tier": tier, "queue_id": queue_id})
+            position = await job_queue.position(tier, queue_id)
+        except Exception as e:
+            logger.error(f"❌ Job queue enqueue failed for {job_id}, running locally: {e}")
+            queue_id = None
+    
+    if not queue_id:
+        try:
+            position = job_executor.submit(
+                job_id, tier, lambda: _execute_fullstack_generation_background(job_id, request, user_id, reservation, tier)
+            )
+        except JobQueueFullError as e:
+            await fail_job(job_id, str(e))
+            await token_budget.settle(reservation, None, 0)
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    return position
 
 
 @app.post("/ai/generate/fullstack/async")
 async def generate_fullstack_app_async(
     request: MultiFileAppRequest,
     x_api_key: Optional[str] = Header(None),
-    x_user_id: Optional[str] = Header(None)
+    x_user_id: Optional[str] = Header(None),
+    x_user_tier: Optional[str] = Header("free")
 ):
     """
     🚀 ASYNC FULLSTACK GENERATION (Enterprise Job Queue)
     
     Returns job_id immediately. Poll GET /ai/jobs/{job_id} for progress and result.
+    Jobs wait in a tier-weighted queue (X-User-Tier) while the worker is busy;
+    a full queue answers 503 with Retry-After.
     
     **Benefits:**
     - ✅ No timeouts (generation runs in background)
@@ -2189,32 +3035,60 @@ async def generate_fullstack_app_async(
     - ✅ Handles concurrent generations
     """
     user_id = x_user_id or "anonymous"
+    tier = x_user_tier if x_user_tier in RATE_LIMITS else "free"
     
-    # Create job and return immediately
-    job_id = await create_job(user_id, request.dict())
+    if job_queue:
+        queue_full = await job_queue.backlog() >= JOB_QUEUE_MAX_BACKLOG
+    else:
+        queue_full = job_executor.queued >= job_executor.max_queue
+    if queue_full:
+        raise HTTPException(
+            status_code=503,
+            detail="Generation queue is full. Please retry shortly.",
+            headers={"Retry-After": "30"}
+        )
+    
+    # Hold the expected credits of a whole pipeline; the job settles them when it ends
+    reservation = await reserve_credits(user_id, tier, FULLSTACK_CREDIT_ESTIMATE)
     
-    # Start background task
-    asyncio.create_task(_execute_fullstack_generation_background(job_id, request, user_id))
+    # Create job and return immediately
+    job_id = await create_job(user_id, request.dict(), reservation)
+    position = await _queue_fullstack_job(job_id, request, user_id, reservation, tier)
     
-    logger.info(f"✅ Job {job_id} created for user {user_id}")
+    logger.info(f"✅ Job {job_id} queued for user {user_id} (tier: {tier}, position: {position})")
     
     return {
         "job_id": job_id,
         "status": "pending",
-        "message": "Fullstack generation started. Poll /ai/jobs/{job_id} for progress.",
+        "queue_position": position,
+        "message": "Fullstack generation queued. Poll /ai/jobs/{job_id} for progress.",
         "poll_url": f"/ai/jobs/{job_id}"
     }
 
 
 @app.get("/ai/jobs/{job_id}", response_model=JobInfo)
-async def get_job(job_id: str):
+async def get_job(job_id: str, include_result: bool = True, fields: Optional[str] = None):
     """
     📊 GET JOB STATUS (Polling Endpoint)
     
     Returns current job status, progress, and result if completed.
-    Frontend should poll this every 2-3 seconds.
+    Frontend should poll this every 2-3 seconds (or use /ai/jobs/{job_id}/events).
+    
+    **Keeping polls small:**
+    - `include_result=false` skips loading the result
+    - `fields=status,progress_percent,message` returns only those fields
+      (the result is loaded only if `result` is listed)
+    - Large results can be paged with GET /ai/jobs/{job_id}/result
     """
-    job_info = await get_job_status(job_id)
+    selected = None
+    if fields:
+        selected = {name.strip() for name in fields.split(",") if name.strip()}
+        unknown = selected - set(JobInfo.model_fields)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {sorted(unknown)}")
+        include_result = include_result and "result" in selected
+    
+    job_info = await get_job_status(job_id, include_result=include_result)
     
     if not job_info:
         raise HTTPException(
@@ -2222,8 +3096,205 @@ async def get_job(job_id: str):
             detail=f"Job {job_id} not found. Jobs expire after 24 hours."
         )
     
+    if selected is not None:
+        return JSONResponse(content=jsonable_encoder(job_info, include=selected))
     return job_info
 
+
+@app.post("/ai/jobs/{job_id}/resume")
+async def resume_job(job_id: str, x_user_tier: Optional[str] = Header(None)):
+    """
+    ⏩ RESUME A FAILED JOB
+    
+    Re-queues a failed fullstack job. Phases it already finished are restored
+    from their checkpoints, so generation restarts at the first incomplete
+    phase and only that work is paid for again. Poll GET /ai/jobs/{job_id} as usual.
+    
+    409 if the job has not failed (it is queued, running or completed).
+    """
+    job_data = await load_job_data(job_id)
+    if not job_data:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Job {job_id} not found. Jobs expire after 24 hours."
+        )
+    if job_data.get("status") != JobStatus.FAILED.value:
+        raise HTTPException(status_code=409, detail=f"Only failed jobs can be resumed (job is {job_data.get('status')})")
+    try:
+        request = MultiFileAppRequest(**json.loads(job_data["request_data"]))
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=f"Job {job_id} cannot be resumed: invalid payload ({e})")
+    
+    user_id = job_data.get("user_id", "anonymous")
+    tier = job_data.get("tier") or x_user_tier
+    tier = tier if tier in RATE_LIMITS else "free"
+    checkpoints = await load_job_checkpoints(job_id)
+    resumed_phases = [name for name in FULLSTACK_PHASE_PLAN if name in checkpoints]
+    reservation = await reserve_credits(user_id, tier, FULLSTACK_CREDIT_ESTIMATE)
+    
+    resumed_data = {
+        "status": JobStatus.PENDING.value,
+        "message": f"Job resumed after {', '.join(resumed_phases)}, waiting to start..." if resumed_phases
+                   else "Job resumed from the start, waiting to start...",
+        "updated_at": datetime.utcnow().isoformat(),
+        "reserved_credits": reservation.credits,
+        "reserved_window": reservation.window,
+        "attempts": 0  # A fresh run for the job queue's crash-retry limit
+    }
+    key = f"job:{job_id}"
+    if redis_client and key not in job_fallback:
+        # Only one resume may win the failed -> pending transition
+        try:
+            async with redis_client.pipeline(transaction=True) as pipe:
+                await pipe.watch(key)
+                if await pipe.hget(key, "status") != JobStatus.FAILED.value:
+                    raise WatchError()
+                pipe.multi()
+                pipe.hset(key, mapping=resumed_data)
+                pipe.hdel(key, "error")
+                await pipe.execute()
+        except WatchError:
+            await token_budget.settle(reservation, None, 0)
+            raise HTTPException(status_code=409, detail=f"Job {job_id} is already being resumed")
+    else:
+        job_fallback.update_local(key, **resumed_data, error=None)
+    
+    position = await _queue_fullstack_job(job_id, request, user_id, reservation, tier)
+    logger.info(f"⏩ Job {job_id} resumed for user {user_id} (restored: {resumed_phases or 'none'}, position: {position})")
+    await job_events.publish(job_id, "progress", {"job_id": job_id, **resumed_data})
+    
+    return {
+        "job_id": job_id,
+        "status": "pending",
+        "queue_position": position,
+        "resumed_phases": resumed_phases,
+        "message": "Job resumed. Poll /ai/jobs/{job_id} for progress.",
+        "poll_url": f"/ai/jobs/{job_id}"
+    }
+
+
+@app.get("/ai/jobs/{job_id}/result")
+async def get_job_result(job_id: str, offset: int = 0, limit: int = 20):
+    """
+    📦 PAGED JOB RESULT
+    
+    Download a completed result a few files at a time. Every page carries the
+    non-file parts of the result (instructions, dependencies, ...) plus a
+    `file_index` of all paths; follow `next_offset` until it is null.
+    """
+    offset = max(0, offset)
+    limit = max(1, min(limit, 100))
+    
+    job_info = await get_job_status(job_id, include_result=False)
+    if not job_info:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Job {job_id} not found. Jobs expire after 24 hours."
+        )
+    if job_info.status != JobStatus.COMPLETED:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Job {job_id} is {job_info.status.value}; the result is available once it completes."
+        )
+    
+    meta = None
+    if redis_binary_client:
+        try:
+            meta = await load_result_meta(redis_binary_client, job_id)
+        except Exception as e:
+            logger.error(f"❌ Redis result load failed for {job_id}: {e}")
+    
+    if meta is not None:
+        total = len(meta["file_index"])
+        files = await load_result_files(redis_binary_client, job_id, offset, limit, total)
+    else:
+        # Memory-mode (or pre-split) jobs keep the result inline
+        full = await get_job_status(job_id)
+        meta, all_files = split_result(full.result or {}) if full else ({"file_index": []}, [])
+        total = len(all_files)
+        files = all_files[offset:offset + limit]
+    
+    end = offset + len(files)
+    return {
+        **meta,
+        "job_id": job_id,
+        "total_files": total,
+        "offset": offset,
+        "limit": limit,
+        "next_offset": end if end < total else None,
+        "files": files
+    }
+
+
+@app.get("/ai/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, request: Request):
+    """
+    📡 JOB EVENTS (Server-Sent Events)
+    
+    Push alternative to polling GET /ai/jobs/{job_id}. Streams:
+    - `progress`: status/phase/percent on every update (first frame is the current state)
+    - `completed`: final state plus the full result, sent once
+    - `failed`: final state plus the error
+    The stream closes after `completed` or `failed`.
+    """
+    if not await get_job_status(job_id, include_result=False):
+        raise HTTPException(
+            status_code=404,
+            detail=f"Job {job_id} not found. Jobs expire after 24 hours."
+        )
+    
+    return StreamingResponse(
+        _job_event_stream(job_id, request),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # Stop Nginx from buffering the stream
+        }
+    )
+
+def _job_progress_payload(job_info: JobInfo) -> Dict[str, Any]:
+    return {
+        "job_id": job_info.job_id,
+        "status": job_info.status.value,
+        "phase": job_info.phase.value if job_info.phase else None,
+        "progress_percent": job_info.progress_percent,
+        "message": job_info.message,
+        "queue_position": job_info.queue_position,
+        "updated_at": job_info.updated_at.isoformat()
+    }
+
+async def _job_event_stream(job_id: str, request: Request) -> AsyncIterator[str]:
+    """SSE frames for one job: current state, live progress, then the result exactly once"""
+    async with job_events.subscribe(job_id) as events:
+        # Snapshot after subscribing so nothing published in between is missed
+        job_info = await get_job_status(job_id, include_result=False)
+        while True:
+            if job_info is None:
+                yield _sse_event("failed", {"job_id": job_id, "status": JobStatus.FAILED.value, "error": "Job expired"})
+                return
+            if job_info.status == JobStatus.COMPLETED:
+                job_info = await get_job_status(job_id) or job_info
+                yield _sse_event("completed", {**_job_progress_payload(job_info), "result": job_info.result})
+                return
+            if job_info.status == JobStatus.FAILED:
+                yield _sse_event("failed", {**_job_progress_payload(job_info), "error": job_info.error})
+                return
+            yield _sse_event("progress", _job_progress_payload(job_info))
+            
+            # Relay progress events straight through until the job ends
+            while True:
+                try:
+                    event = await asyncio.wait_for(events.get(), timeout=JOB_EVENTS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": keepalive\n\n"
+                    break  # Resync from the job hash in case an event was dropped
+                if event["event"] != "progress":
+                    break
+                yield _sse_event("progress", event["data"])
+            job_info = await get_job_status(job_id, include_result=False)
+
 # ============================================
 # ERROR HANDLERS
 # ============================================
@@ -0,0 +1,81 @@
+"""
+Benchmark: pooled vs per-step HTTP clients in AppDeploymentService
+
+Runs deploy_app against a local fake platform twice: once with the legacy
+behaviour (a fresh httpx.AsyncClient, and therefore a fresh connection, per
+deployment step) and once with the shared pooled client.
+
+Usage:
+    cd flask && python -m benchmarks.bench_deploy_client --deploys 200 --handshake-ms 15
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_deployment import AppDeploymentService  # noqa: E402
+from benchmarks.fake_platform import FakePlatform  # noqa: E402
+
+
+class PerStepClientService(AppDeploymentService):
+    """Legacy behaviour: open and close a client around every request"""
+
+    async def _post(self, url, **kwargs):
+        async with httpx.AsyncClient() as client:
+            return await client.post(url, **kwargs)
+
+
+async def run(service: AppDeploymentService, platform: FakePlatform, deploys: int, concurrency: int):
+    service.platform_api = platform.url
+    service.hosting_api = f"{platform.url}/api/v1/hosting"
+    files = [{"path": f"src/f{i}.ts", "content": "x" * 2000, "language": "typescript"} for i in range(20)]
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            result = await service.deploy_app("bench", "app", files, {"react": "^18"})
+            assert result["status"] == "deployed", result
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(deploys)))
+    wall = time.perf_counter() - started
+    await service.aclose()
+    return latencies, wall
+
+
+def report(name, latencies, wall, platform):
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(
+        f"{name:<10} mean {statistics.mean(latencies):8.2f} ms   p95 {p95:8.2f} ms   "
+        f"throughput {len(latencies) / wall:7.1f} deploys/s   connections {platform.connections}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--deploys", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--handshake-ms", type=float, default=15.0, help="simulated TLS handshake per new connection")
+    args = parser.parse_args()
+
+    for name, service in (("per-step", PerStepClientService()), ("pooled", AppDeploymentService())):
+        platform = FakePlatform(handshake_ms=args.handshake_ms)
+        await platform.start()
+        latencies, wall = await run(service, platform, args.deploys, args.concurrency)
+        await platform.stop()
+        report(name, latencies, wall, platform)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,72 @@
+"""
+Benchmark: sequential vs step-graph deploy_app
+
+Compares the legacy strictly sequential deployment flow with the step graph
+(database and hosting provisioned concurrently) against a local fake platform
+where every request takes --step-ms and tenant database provisioning takes
+--database-ms.
+
+Usage:
+    cd flask && python -m benchmarks.bench_deploy_steps --deploys 20 --step-ms 100 --database-ms 400
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_deployment import AppDeploymentService  # noqa: E402
+from benchmarks.fake_platform import FakePlatform  # noqa: E402
+
+
+class SequentialDeploymentService(AppDeploymentService):
+    """Legacy flow: database, hosting, files, environment, start one after another"""
+
+    async def deploy_app(self, user_id, app_name, files, dependencies, framework="react", requires_database=True):
+        database = await self._provision_database(user_id, app_name) if requires_database else None
+        hosting = await self._provision_hosting(user_id, app_name, framework)
+        await self._deploy_files(hosting["service_id"], files, dependencies)
+        self._generate_env_config(database, hosting)
+        started = await self._start_app(hosting["service_id"])
+        return {"status": "deployed", "app_url": started["url"]}
+
+
+async def deploy_many(service, platform, deploys):
+    service.platform_api = platform.url
+    service.hosting_api = f"{platform.url}/api/v1/hosting"
+    files = [{"path": "src/App.tsx", "content": "x", "language": "typescript"}]
+    latencies = []
+    await service.start()  # Keep client construction out of the timings
+
+    async def one():
+        started = time.perf_counter()
+        result = await service.deploy_app("bench", "app", files, {})
+        assert result["status"] == "deployed", result
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    await asyncio.gather(*(one() for _ in range(deploys)))
+    await service.aclose()
+    return latencies
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--deploys", type=int, default=20)
+    parser.add_argument("--step-ms", type=float, default=100.0)
+    parser.add_argument("--database-ms", type=float, default=400.0)
+    args = parser.parse_args()
+
+    for name, service in (("sequential", SequentialDeploymentService()), ("graph", AppDeploymentService())):
+        platform = FakePlatform(step_ms=args.step_ms, route_ms={"/tenants/provision": args.database_ms})
+        await platform.start()
+        latencies = await deploy_many(service, platform, args.deploys)
+        await platform.stop()
+        print(f"{name:<11} mean {statistics.mean(latencies):8.1f} ms   max {max(latencies):8.1f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
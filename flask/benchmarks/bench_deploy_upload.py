@@ -0,0 +1,72 @@
+"""
+Benchmark: inline vs content-addressed file upload in _deploy_files
+
+Deploys a generated app, edits one file, and redeploys. Reports the bytes the
+hosting API received for the legacy inline JSON upload and for the gzip,
+content-addressed blob upload (which skips blobs the server already holds).
+
+Usage:
+    cd flask && python -m benchmarks.bench_deploy_upload --files 50 --file-kb 40
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_deployment import AppDeploymentService  # noqa: E402
+from benchmarks.fake_platform import FakePlatform  # noqa: E402
+
+
+def generated_app(count: int, size_kb: int):
+    """Source-like files: repeated code lines with some per-file variation"""
+    rng = random.Random(7)
+    files = []
+    for i in range(count):
+        lines = []
+        while sum(len(l) for l in lines) < size_kb * 1024:
+            name = "".join(rng.choices(string.ascii_lowercase, k=8))
+            lines.append(f'  const {name} = await api.get("/api/{name}", {{ headers: authHeaders() }});\n')
+        files.append({"path": f"src/components/C{i}.tsx", "content": "".join(lines), "language": "typescript"})
+    return files
+
+
+async def deploy(service, platform, files):
+    before = platform.bytes_received
+    started = time.perf_counter()
+    await service._deploy_files("svc_1", files, {"react": "^18"})
+    return platform.bytes_received - before, (time.perf_counter() - started) * 1000
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=50)
+    parser.add_argument("--file-kb", type=int, default=40)
+    args = parser.parse_args()
+
+    files = generated_app(args.files, args.file_kb)
+    edited = [dict(f) for f in files]
+    edited[0]["content"] += "// edited\n"
+
+    for name, blob_store in (("inline", False), ("blobs", True)):
+        platform = FakePlatform(blob_store=blob_store)
+        await platform.start()
+        service = AppDeploymentService()
+        service.hosting_api = f"{platform.url}/api/v1/hosting"
+        first, first_ms = await deploy(service, platform, files)
+        second, second_ms = await deploy(service, platform, edited)
+        await service.aclose()
+        await platform.stop()
+        print(
+            f"{name:<7} first deploy {first / 1024:9.1f} KiB {first_ms:7.1f} ms   "
+            f"redeploy {second / 1024:9.1f} KiB {second_ms:7.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
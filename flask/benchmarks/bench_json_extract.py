@@ -0,0 +1,178 @@
+"""
+Benchmark: parsing malformed multi-file generation output
+
+Compares the legacy sanitize_and_parse_json body (fence regexes, json.loads,
+a re.sub callback over every control character, json.loads again, then
+json_repair over the whole document) with json_extract.extract_json, on a
+corpus of multi-file outputs carrying the defects models produce:
+
+    clean        fenced but valid JSON
+    raw_newlines code written with literal newlines/tabs inside strings
+    escapes      regexes and Windows paths with invalid escapes (\\d, \\w, C:\\)
+    quotes       a few files with unescaped quotes inside their content
+    commas       trailing commas after entries and members
+    truncated    cut off mid-file at max_tokens
+    mixed        all of the above at once
+
+For each case it reports throughput in MB/s and how many of the expected
+files came back intact. Captured outputs can be added with --corpus DIR
+(every *.txt / *.json file in it is one case; throughput only).
+
+Usage:
+    cd flask && python -m benchmarks.bench_json_extract --files 150 --repeat 3
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from json_repair import repair_json  # noqa: E402
+
+from json_extract import extract_json  # noqa: E402
+
+_SNIPPETS = [
+    'import React, { useState } from "react";\n',
+    'export default function {name}() {\n',
+    '  const [items, setItems] = useState([]);\n',
+    '  const pattern = /^\\d{3}-\\w+$/;\n',
+    '  return <div className="card p-4">{items.map(item => <Item key={item.id} {...item} />)}</div>;\n',
+    '}\n',
+    'router.get("/api/{name}", authenticate, async (req, res) => {\n',
+    '  res.json({ ok: true, data: await db.query("SELECT * FROM {name} WHERE id = $1", [req.params.id]) });\n',
+    '});\n',
+    '\t// Windows builds read C:\\config\\{name}.json\n',
+]
+
+
+def make_files(count: int, lines: int, rng: random.Random) -> List[Dict[str, str]]:
+    files = []
+    for index in range(count):
+        name = f"Entity{index}"
+        content = "".join(rng.choice(_SNIPPETS).replace("{name}", name) for _ in range(lines))
+        files.append({"path": f"src/components/{name}.jsx", "content": content, "language": "javascript"})
+    return files
+
+
+def serialize(files: List[Dict[str, str]], defects: List[str], rng: random.Random) -> str:
+    """The document a model would emit for files, with the given defects"""
+    entries = []
+    for file in files:
+        content = json.dumps(file["content"])[1:-1]
+        if "raw_newlines" in defects:
+            content = content.replace("\\n", "\n").replace("\\t", "\t")
+        if "escapes" in defects:
+            content = content.replace("\\\\d", "\\d").replace("\\\\w", "\\w").replace("C:\\\\", "C:\\")
+        if "quotes" in defects and rng.random() < 0.05:
+            content = content.replace('\\"', '"', 2)
+        entry = f'{{"path": "{file["path"]}", "content": "{content}", "language": "javascript"{"," if "commas" in defects else ""}}}'
+        entries.append(entry)
+    separator = ",\n    "
+    tail = "," if "commas" in defects else ""
+    document = f'```json\n{{\n  "files": [\n    {separator.join(entries)}{tail}\n  ],\n  "instructions": "npm install && npm run dev"\n}}\n```'
+    if "truncated" in defects:
+        document = document[:int(len(document) * 0.9)]
+    return document
+
+
+def legacy_parse(text: str) -> Any:
+    """The sanitize_and_parse_json body this replaces (logging removed)"""
+    cleaned = text.strip()
+    if cleaned.startswith("```"):
+        cleaned = re.sub(r'```json?\n?', '', cleaned)
+        cleaned = re.sub(r'\n?```$', '', cleaned)
+    try:
+        return json.loads(cleaned)
+    except json.JSONDecodeError:
+        pass
+
+    def clean_control_chars(match):
+        code = ord(match.group(0))
+        if code == 0x09:
+            return '\\t'
+        elif code == 0x0A:
+            return '\\n'
+        elif code == 0x0D:
+            return '\\r'
+        return ''
+
+    cleaned = re.sub(r'[\x00-\x1F]', clean_control_chars, cleaned)
+    try:
+        return json.loads(cleaned)
+    except json.JSONDecodeError:
+        pass
+    try:
+        repaired = repair_json(cleaned, return_objects=True)
+        if isinstance(repaired, dict):
+            return repaired
+        return json.loads(repaired)
+    except Exception:
+        pass
+    json.loads(cleaned)
+
+
+def intact(value: Any, files: Optional[List[Dict[str, str]]]) -> str:
+    if files is None:
+        return "-"
+    expected = {file["path"]: file["content"] for file in files}
+    got = value.get("files", []) if isinstance(value, dict) else []
+    good = sum(1 for file in got if isinstance(file, dict) and expected.get(file.get("path")) == file.get("content"))
+    return f"{good}/{len(files)}"
+
+
+def measure(parse: Callable[[str], Any], text: str, repeat: int) -> Tuple[Optional[float], Any]:
+    """Best-of-repeat MB/s (None if parsing failed) and the parsed value"""
+    best = None
+    value = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        try:
+            value = parse(text)
+        except Exception:
+            return None, None
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return len(text.encode()) / 1e6 / max(best, 1e-9), value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=150)
+    parser.add_argument("--lines", type=int, default=120, help="Lines of code per file")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--corpus", type=str, default=None, help="Directory of captured model outputs")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    files = make_files(args.files, args.lines, rng)
+    cases: List[Tuple[str, str, Optional[List[Dict[str, str]]]]] = []
+    for defects in (["clean"], ["raw_newlines"], ["escapes"], ["quotes"], ["commas"], ["truncated"],
+                    ["raw_newlines", "escapes", "quotes", "commas", "truncated"]):
+        name = "mixed" if len(defects) > 1 else defects[0]
+        cases.append((name, serialize(files, defects, random.Random(args.seed)), files))
+    if args.corpus:
+        for filename in sorted(os.listdir(args.corpus)):
+            if filename.endswith((".txt", ".json")):
+                with open(os.path.join(args.corpus, filename), encoding="utf-8") as handle:
+                    cases.append((filename, handle.read(), None))
+
+    print(f"{'case':>14} {'MB':>6} {'legacy MB/s':>12} {'intact':>9} {'extract MB/s':>13} {'intact':>9} {'speedup':>8}")
+    for name, text, expected in cases:
+        legacy_rate, legacy_value = measure(legacy_parse, text, args.repeat)
+        rate, value = measure(lambda document: extract_json(document).value, text, args.repeat)
+        legacy_cell = f"{legacy_rate:.1f}" if legacy_rate else "failed"
+        rate_cell = f"{rate:.1f}" if rate else "failed"
+        speedup = f"{rate / legacy_rate:.1f}x" if rate and legacy_rate else "-"
+        print(f"{name:>14} {len(text.encode()) / 1e6:>6.2f} {legacy_cell:>12} {intact(legacy_value, expected):>9} "
+              f"{rate_cell:>13} {intact(value, expected):>9} {speedup:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Benchmark: event-loop lag while repairing a large damaged output
+
+Repairs the same multi-megabyte output (raw newlines, invalid escapes,
+trailing commas) on the event loop and in CPUPool, while LoopLagMonitor
+samples the loop every 10ms. Inline, every repair is one stall of the whole
+loop - nothing else on the worker, /health included, runs meanwhile; in the
+pool the loop only pays for unpickling the result.
+
+Usage:
+    cd flask && python -m benchmarks.bench_json_offload --files 330 --repairs 3
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from typing import Any, Awaitable, Callable
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_json_extract import make_files, serialize  # noqa: E402
+from cpu_pool import CPUPool  # noqa: E402
+from json_extract import extract_json  # noqa: E402
+from loop_monitor import LoopLagMonitor  # noqa: E402
+
+
+async def trial(label: str, repair: Callable[[], Awaitable[Any]], repairs: int):
+    monitor = LoopLagMonitor(interval=0.01, window=100000, stall_threshold=0.05)
+    monitor.start()
+    await asyncio.sleep(0.1)
+    started = time.monotonic()
+    for _ in range(repairs):
+        await repair()
+    elapsed = time.monotonic() - started
+    await asyncio.sleep(0.05)
+    await monitor.stop()
+    stats = monitor.stats()
+    print(f"{label:>7} {elapsed * 1000 / repairs:>14.0f} {stats['p99_lag_ms']:>12.1f} "
+          f"{stats['max_lag_ms']:>12.1f} {stats['stalls']:>7}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=330)
+    parser.add_argument("--repairs", type=int, default=3)
+    args = parser.parse_args()
+
+    text = serialize(make_files(args.files, 120, random.Random(7)), ["raw_newlines", "escapes", "commas"], random.Random(7))
+    pool = CPUPool()
+    await pool.start()
+
+    async def inline() -> Any:
+        return extract_json(text)
+
+    print(f"{len(text) / 1e6:.1f} MB output")
+    print(f"{'where':>7} {'ms per repair':>14} {'p99 lag ms':>12} {'max lag ms':>12} {'stalls':>7}")
+    await trial("inline", inline, args.repairs)
+    await trial("pool", lambda: pool.run(extract_json, text), args.repairs)
+    pool.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,67 @@
+"""
+Benchmark: per-call cost of rate limiting as the window fills up
+
+Compares the legacy limiter (rebuild a list of every timestamp in the
+window on each call) with SlidingWindowLimiter. For each window size, the
+key is first filled with that many hits, then the cost of one more check is
+measured. The legacy cost grows with the number of hits in the window; the
+sliding-window counter stays flat.
+
+Usage:
+    cd flask && python -m benchmarks.bench_rate_limit --calls 2000
+"""
+
+import argparse
+import os
+import sys
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rate_limiter import SlidingWindowLimiter  # noqa: E402
+
+WINDOW = 3600.0
+
+
+def legacy_check(store: Dict[str, List[float]], key: str, limit: int, now: float) -> bool:
+    """The check_rate_limit body this replaces"""
+    if key not in store:
+        store[key] = []
+    store[key] = [t for t in store[key] if now - t < WINDOW]
+    if len(store[key]) >= limit:
+        return False
+    store[key].append(now)
+    return True
+
+
+def per_call_us(check, calls: int) -> float:
+    started = time.perf_counter()
+    for _ in range(calls):
+        check()
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--fills", type=str, default="10,100,1000,10000,100000")
+    args = parser.parse_args()
+
+    print(f"{'hits in window':>15} {'legacy us/call':>15} {'sliding us/call':>16}")
+    for fill in (int(value) for value in args.fills.split(",")):
+        limit = fill + args.calls + 1  # Never deny, so every call does the full amount of work
+        now = time.time()
+
+        store: Dict[str, List[float]] = {"user:ai": [now - WINDOW / 2] * fill}
+        legacy = per_call_us(lambda: legacy_check(store, "user:ai", limit, time.time()), args.calls)
+
+        limiter = SlidingWindowLimiter()
+        limiter.hit("user:ai", limit, WINDOW, cost=fill)
+        sliding = per_call_us(lambda: limiter.hit("user:ai", limit, WINDOW), args.calls)
+
+        print(f"{fill:>15} {legacy:>15.2f} {sliding:>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
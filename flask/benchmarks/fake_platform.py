@@ -0,0 +1,114 @@
+"""
+Fake Platform API
+Minimal keep-alive HTTP/1.1 server that answers the tenant and hosting calls
+made by AppDeploymentService. Used by the deployment benchmarks.
+
+handshake_ms is slept once per new TCP connection to stand in for the TLS
+handshake a real platform endpoint costs; step_ms is slept per request to
+stand in for the server-side work of each deployment step. route_ms overrides
+the per-request latency for paths ending with a given suffix. With
+blob_store=True it also serves the content-addressed blob upload endpoints.
+"""
+
+import asyncio
+import json
+from typing import Dict, Optional, Tuple
+
+
+class FakePlatform:
+    def __init__(
+        self,
+        handshake_ms: float = 0.0,
+        step_ms: float = 0.0,
+        route_ms: Optional[Dict[str, float]] = None,
+        blob_store: bool = False
+    ):
+        self.handshake_ms = handshake_ms
+        self.step_ms = step_ms
+        self.route_ms = route_ms or {}
+        self.blob_store = blob_store
+        self.blobs: Dict[str, bytearray] = {}
+        self.connections = 0
+        self.requests = 0
+        self.bytes_received = 0
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    def route(self, method: str, path: str, body: bytes, headers: Dict[str, str]) -> Tuple[int, Dict]:
+        """Return (status, payload) for a request; override to extend"""
+        if "/blobs/" in path:
+            return self._route_blobs(method, path, body, headers)
+        if path.endswith("/tenants/provision"):
+            return 201, {
+                "tenant_id": "t_1", "database_name": "app_db", "connection_string": "postgres://app",
+                "host": "db", "port": 5432, "username": "app", "password": "secret"
+            }
+        if path.endswith("/hosting/services"):
+            return 201, {"service_id": "svc_1", "domain": "app.example.com", "status": "created", "resource_limits": {}}
+        if path.endswith("/deployments"):
+            return 201, {"deployment": "ok"}
+        if path.endswith("/start"):
+            return 200, {"url": "https://app.example.com"}
+        return 404, {"error": "not found"}
+
+    def _route_blobs(self, method: str, path: str, body: bytes, headers: Dict[str, str]) -> Tuple[int, Dict]:
+        if not self.blob_store:
+            return 404, {"error": "not found"}
+        if path.endswith("/blobs/missing"):
+            hashes = json.loads(body)["hashes"]
+            return 200, {"missing": [h for h in hashes if h not in self.blobs or self.blobs[h] is None]}
+        digest = path.rsplit("/", 1)[1]
+        if method == "GET":
+            return 200, {"received": len(self.blobs.get(digest) or b"")}
+        # PUT with Content-Range: bytes start-end/total
+        span, total = headers["content-range"].split(" ", 1)[1].split("/")
+        start = int(span.split("-")[0])
+        stored = self.blobs.setdefault(digest, bytearray())
+        del stored[start:]
+        stored.extend(body)
+        if len(stored) >= int(total):
+            return 201, {"hash": digest}
+        return 308, {"received": len(stored)}
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        if self.handshake_ms:
+            await asyncio.sleep(self.handshake_ms / 1000)
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                lines = head.decode("latin-1").split("\r\n")
+                method, path, _ = lines[0].split(" ", 2)
+                headers = {k.lower(): v.strip() for k, v in (l.split(":", 1) for l in lines[1:] if ":" in l)}
+                body = await reader.readexactly(int(headers.get("content-length", "0")))
+                self.requests += 1
+                self.bytes_received += len(head) + len(body)
+
+                delay_ms = next(
+                    (ms for suffix, ms in self.route_ms.items() if path.endswith(suffix)),
+                    self.step_ms
+                )
+                if delay_ms:
+                    await asyncio.sleep(delay_ms / 1000)
+                status, payload = self.route(method, path, body, headers)
+                data = json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} X\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\nConnection: keep-alive\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
@@ -0,0 +1,90 @@
+"""
+CPU Pool
+Run CPU-bound work (JSON repair of large outputs) in worker processes so it
+never blocks the event loop.
+
+- At most `max_workers` processes, started with "spawn" (a forked copy of a
+  running server would inherit its sockets and locks)
+- At most `max_pending` calls in flight; further callers wait their turn
+  rather than queueing unbounded work (and unbounded copies of their input)
+- A pool whose worker died is replaced and the call retried once
+Functions and arguments must be picklable: module-level functions only.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CPUPool:
+    """A bounded process pool for the event loop"""
+
+    def __init__(self, max_workers: int = 1, max_pending: int = 4):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.calls = 0
+        self.failures = 0
+        self.restarts = 0
+        self.waiting = 0
+        self._seconds_total = 0.0
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def start(self):
+        """Start the workers now rather than on the first call (spawning takes a while)"""
+        await asyncio.get_running_loop().run_in_executor(self._pool(), int)
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """fn(*args) in a worker process"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        started = time.monotonic()
+        self.calls += 1
+        try:
+            loop = asyncio.get_running_loop()
+            try:
+                return await loop.run_in_executor(self._pool(), fn, *args)
+            except BrokenProcessPool:
+                logger.warning("⚠️  CPU pool worker died, restarting the pool")
+                self.restarts += 1
+                self._executor = None
+                return await loop.run_in_executor(self._pool(), fn, *args)
+        except Exception:
+            self.failures += 1
+            raise
+        finally:
+            self._seconds_total += time.monotonic() - started
+            self._slots.release()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.max_workers,
+            "calls": self.calls,
+            "failures": self.failures,
+            "restarts": self.restarts,
+            "waiting": self.waiting,
+            "avg_ms": round(self._seconds_total / self.calls * 1000) if self.calls else None
+        }
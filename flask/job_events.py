@@ -0,0 +1,122 @@
+"""
+Job Events
+Fan-out of job progress events to Server-Sent Events listeners.
+
+Events are published on Redis pub/sub (job-events:{job_id}) so a listener
+connected to any API worker sees updates from whichever node runs the job.
+Each process holds ONE pub/sub connection and subscribes to a job's channel
+only while someone on that process is listening to it. Without Redis, events
+are delivered in-process only.
+
+Events carry job metadata only - never the result - so megabyte-sized
+results are not broadcast to every node.
+"""
+
+import asyncio
+import json
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Set
+
+import redis.asyncio as redis
+
+logger = logging.getLogger(__name__)
+
+
+class JobEventBus:
+    """Publish job events and hand them to local subscribers"""
+
+    def __init__(self, channel_prefix: str = "job-events", queue_size: int = 100):
+        self.channel_prefix = channel_prefix
+        self.queue_size = queue_size
+        self.redis: Optional[redis.Redis] = None
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._pubsub = None
+        self._reader: Optional[asyncio.Task] = None
+        self._active: Optional[asyncio.Event] = None
+
+    def channel(self, job_id: str) -> str:
+        return f"{self.channel_prefix}:{job_id}"
+
+    async def start(self, redis_client: Optional[redis.Redis]):
+        """Use Redis pub/sub when a client is given, in-process delivery otherwise"""
+        self.redis = redis_client
+        if redis_client:
+            self._pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+            self._active = asyncio.Event()
+            self._reader = asyncio.create_task(self._read())
+
+    async def stop(self):
+        if self._reader:
+            self._reader.cancel()
+            await asyncio.gather(self._reader, return_exceptions=True)
+            self._reader = None
+        if self._pubsub:
+            await self._pubsub.aclose()
+            self._pubsub = None
+        self.redis = None
+
+    async def publish(self, job_id: str, event: str, data: Dict[str, Any]):
+        """Send an event to every listener of the job (never raises)"""
+        payload = {"event": event, "data": data}
+        if not self.redis:
+            self._deliver(job_id, payload)
+            return
+        try:
+            await self.redis.publish(self.channel(job_id), json.dumps(payload))
+        except Exception as e:
+            logger.warning(f"⚠️  Job event publish failed for {job_id}: {e}")
+            self._deliver(job_id, payload)
+
+    def _deliver(self, job_id: str, payload: Dict[str, Any]):
+        for queue in self._subscribers.get(job_id, ()):
+            try:
+                queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                pass  # Slow listener; it resyncs from the job hash on its next keepalive
+
+    async def _read(self):
+        prefix = f"{self.channel_prefix}:"
+        while True:
+            try:
+                if not self._pubsub.subscribed:
+                    self._active.clear()
+                    await self._active.wait()
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message and message["type"] == "message":
+                    job_id = message["channel"][len(prefix):]
+                    self._deliver(job_id, json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Job event reader failed: {e}")
+                await asyncio.sleep(1.0)
+
+    @asynccontextmanager
+    async def subscribe(self, job_id: str) -> AsyncIterator[asyncio.Queue]:
+        """Yield a queue receiving {"event", "data"} dicts for the job"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        listeners = self._subscribers.setdefault(job_id, set())
+        first = not listeners
+        listeners.add(queue)
+        try:
+            if first and self._pubsub:
+                await self._pubsub.subscribe(self.channel(job_id))
+                self._active.set()
+            yield queue
+        finally:
+            listeners.discard(queue)
+            if not listeners:
+                self._subscribers.pop(job_id, None)
+                if self._pubsub:
+                    try:
+                        await self._pubsub.unsubscribe(self.channel(job_id))
+                    except Exception as e:
+                        logger.warning(f"⚠️  Job event unsubscribe failed for {job_id}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "jobs_watched": len(self._subscribers),
+            "listeners": sum(len(queues) for queues in self._subscribers.values()),
+            "transport": "redis" if self.redis else "memory"
+        }
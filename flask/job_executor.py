@@ -0,0 +1,218 @@
+"""
+Job Executor
+Bounded, tier-prioritized runner for long background jobs (fullstack generation).
+
+- At most `max_concurrency` jobs run at once per process; the rest wait in a queue
+- The queue holds at most `max_queue` jobs; beyond that submit() raises JobQueueFullError
+- Tiers share the executor by weight (stride scheduling): with weights 10/3/1 an
+  enterprise job is picked ~10x as often as a free one, but free jobs never starve
+- Within a tier jobs run first-in, first-out
+"""
+
+import asyncio
+import logging
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+JobFactory = Callable[[], Awaitable[Any]]
+AbandonHook = Callable[[str, str], Awaitable[None]]
+
+
+class JobQueueFullError(Exception):
+    """The executor queue is at capacity (or shutting down)"""
+
+
+@dataclass
+class QueuedJob:
+    job_id: str
+    tier: str
+    factory: JobFactory
+
+
+class JobExecutor:
+    """Run submitted jobs with a concurrency cap and a weighted fair queue"""
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_queue: int,
+        tier_weights: Dict[str, int],
+        default_tier: str = "free",
+        on_abandon: Optional[AbandonHook] = None
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.tier_weights = {tier: max(1, weight) for tier, weight in tier_weights.items()}
+        self.default_tier = default_tier
+        self.on_abandon = on_abandon  # Awaited with (job_id, reason) for jobs dropped at shutdown
+
+        self._queues: Dict[str, Deque[QueuedJob]] = {tier: deque() for tier in self.tier_weights}
+        self._pass: Dict[str, float] = {tier: 0.0 for tier in self.tier_weights}
+        self._running: Dict[str, asyncio.Task] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._slot_freed: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._accepting = False
+
+    # ------------------------------------------------------------------
+    # Scheduling
+    # ------------------------------------------------------------------
+
+    def _stride(self, tier: str) -> float:
+        return 1.0 / self.tier_weights[tier]
+
+    def _next_tier(self, passes: Dict[str, float], queues: Dict[str, Any]) -> Optional[str]:
+        """Non-empty tier with the lowest pass value (ties go to the heavier tier)"""
+        candidates = [tier for tier, queue in queues.items() if queue]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda t: (passes[t], -self.tier_weights[t]))
+
+    def _pop_next(self) -> Optional[QueuedJob]:
+        tier = self._next_tier(self._pass, self._queues)
+        if tier is None:
+            return None
+        self._pass[tier] += self._stride(tier)
+        return self._queues[tier].popleft()
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    @property
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    @property
+    def running(self) -> int:
+        return len(self._running)
+
+    @property
+    def has_capacity(self) -> bool:
+        """True if a newly submitted job would start right away"""
+        return self._accepting and self.running + self.queued < self.max_concurrency
+
+    async def wait_for_capacity(self):
+        """Block until a job slot is free (used by queue consumers to pull work)"""
+        while not self.has_capacity:
+            self._slot_freed.clear()
+            await self._slot_freed.wait()
+
+    def submit(self, job_id: str, tier: str, factory: JobFactory) -> int:
+        """
+        Queue a job and return its 1-based queue position.
+
+        Raises:
+            JobQueueFullError: If the queue is full or the executor is draining
+        """
+        if not self._accepting:
+            raise JobQueueFullError("Job executor is not accepting work (shutting down)")
+        if self.queued >= self.max_queue:
+            raise JobQueueFullError(f"Job queue is full ({self.max_queue} waiting)")
+
+        tier = tier if tier in self._queues else self.default_tier
+        queue = self._queues[tier]
+        if not queue:
+            # A tier coming back from idle must not cash in credit from its idle time
+            active = [self._pass[t] for t, q in self._queues.items() if q]
+            self._pass[tier] = max(self._pass[tier], min(active) if active else 0.0)
+        queue.append(QueuedJob(job_id=job_id, tier=tier, factory=factory))
+        self._wakeup.set()
+        return self.position(job_id) or 1
+
+    def position(self, job_id: str) -> Optional[int]:
+        """1-based position in dispatch order, 0 if running, None if unknown"""
+        if job_id in self._running:
+            return 0
+        # Replay the scheduler on copies; queues are bounded so this stays cheap
+        passes = dict(self._pass)
+        cursors = {tier: 0 for tier in self._queues}
+        remaining = {tier: len(queue) for tier, queue in self._queues.items()}
+        for position in range(1, self.queued + 1):
+            tier = self._next_tier(passes, remaining)
+            if self._queues[tier][cursors[tier]].job_id == job_id:
+                return position
+            passes[tier] += self._stride(tier)
+            cursors[tier] += 1
+            remaining[tier] -= 1
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "queued": self.queued,
+            "queued_by_tier": {tier: len(queue) for tier, queue in self._queues.items()},
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "accepting": self._accepting
+        }
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    async def start(self):
+        """Start dispatching (call from the FastAPI lifespan)"""
+        self._wakeup = asyncio.Event()
+        self._slot_freed = asyncio.Event()
+        self._accepting = True
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def _dispatch(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self.running < self.max_concurrency:
+                job = self._pop_next()
+                if job is None:
+                    break
+                task = asyncio.create_task(self._run(job))
+                self._running[job.job_id] = task
+
+    async def _run(self, job: QueuedJob):
+        try:
+            await job.factory()
+        except Exception as e:
+            logger.error(f"❌ Job {job.job_id} raised outside its own error handling: {e}", exc_info=True)
+        finally:
+            self._running.pop(job.job_id, None)
+            self._wakeup.set()
+            self._slot_freed.set()
+
+    async def shutdown(self, timeout: float):
+        """
+        Stop accepting work and drain: running jobs get `timeout` seconds to
+        finish, then are cancelled. Queued and cancelled jobs are reported
+        through on_abandon so their status is not left dangling.
+        """
+        self._accepting = False
+        if self._dispatcher:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+
+        abandoned: List[str] = []
+        for queue in self._queues.values():
+            abandoned.extend(job.job_id for job in queue)
+            queue.clear()
+
+        running = dict(self._running)
+        if running:
+            logger.info(f"⏳ Draining {len(running)} running job(s) (timeout {timeout}s)...")
+            _, still_running = await asyncio.wait(running.values(), timeout=timeout)
+            for job_id, task in running.items():
+                if task in still_running:
+                    task.cancel()
+                    abandoned.append(job_id)
+            if still_running:
+                await asyncio.gather(*still_running, return_exceptions=True)
+
+        if self.on_abandon:
+            for job_id in abandoned:
+                try:
+                    await self.on_abandon(job_id, "Server shut down before the job finished. Please retry.")
+                except Exception as e:
+                    logger.error(f"❌ Failed to release abandoned job {job_id}: {e}")
+        logger.info(f"✅ Job executor drained ({len(abandoned)} job(s) abandoned)")
@@ -0,0 +1,282 @@
+"""
+Job Queue
+Redis Streams transport for background jobs so any node can run any job.
+
+- One stream per tier (jobs:fullstack:free, ...) read through one consumer group
+- A consumer only pulls a job when its local JobExecutor has a free slot, picking
+  the tier by the same weighted stride order the executor uses
+- Running jobs are heartbeated (XCLAIM to self resets their idle time); jobs idle
+  longer than claim_idle belong to a dead consumer and are taken over (XAUTOCLAIM)
+- A job is acked and deleted from the stream once its handler returns; a job
+  delivered more than max_attempts times is handed to on_dead instead of retried
+
+Only the job id travels on the stream - the job itself lives in the job:{id} hash.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import redis.asyncio as redis
+from redis.exceptions import ResponseError
+
+from job_executor import JobExecutor, JobQueueFullError
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[str], Awaitable[None]]
+DeadJobHook = Callable[[str, str], Awaitable[None]]
+
+# Must match the key create_job() stores jobs under
+JOB_KEY = "job:{job_id}"
+FINISHED_STATUSES = ("completed", "failed")
+
+
+class RedisJobQueue:
+    """Feed a JobExecutor from per-tier Redis Streams"""
+
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        executor: JobExecutor,
+        handler: JobHandler,
+        stream_prefix: str = "jobs:fullstack",
+        group: str = "fullstack-workers",
+        consumer: Optional[str] = None,
+        heartbeat_interval: float = 10.0,
+        claim_idle: float = 60.0,
+        max_attempts: int = 3,
+        on_dead: Optional[DeadJobHook] = None
+    ):
+        self.redis = redis_client
+        self.executor = executor
+        self.handler = handler  # Awaited with job_id; must record its own success/failure
+        self.stream_prefix = stream_prefix
+        self.group = group
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.heartbeat_interval = heartbeat_interval
+        self.claim_idle_ms = int(claim_idle * 1000)
+        self.max_attempts = max_attempts
+        self.on_dead = on_dead
+
+        self.tiers = list(executor.tier_weights)
+        self._pass: Dict[str, float] = {tier: 0.0 for tier in self.tiers}
+        self._owned: Dict[str, Tuple[str, str]] = {}  # job_id -> (stream, message_id)
+        self._attempted: set = set()  # Owned jobs whose attempt counter was bumped
+        self._tasks: list = []
+
+    def stream(self, tier: str) -> str:
+        return f"{self.stream_prefix}:{tier}"
+
+    # ------------------------------------------------------------------
+    # Producer side
+    # ------------------------------------------------------------------
+
+    async def enqueue(self, job_id: str, tier: str) -> str:
+        """Append a job to its tier stream and return the stream message id"""
+        tier = tier if tier in self._pass else self.executor.default_tier
+        return await self.redis.xadd(self.stream(tier), {"job_id": job_id, "tier": tier})
+
+    async def backlog(self) -> int:
+        """Jobs waiting or running across the cluster (acked jobs are deleted)"""
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for tier in self.tiers:
+                pipe.xlen(self.stream(tier))
+            return sum(await pipe.execute())
+
+    async def position(self, tier: str, message_id: str, limit: int = 1000) -> Optional[int]:
+        """1-based position within the tier stream, 0 once delivered, None if unknown"""
+        stream = self.stream(tier)
+        try:
+            groups = await self.redis.xinfo_groups(stream)
+        except ResponseError:
+            return None
+        group = next((g for g in groups if g["name"] == self.group), None)
+        if group is None:
+            return None
+        last = group["last-delivered-id"]
+        if _id_key(message_id) <= _id_key(last):
+            return 0
+        ahead = await self.redis.xrange(stream, min=f"({last}", max=message_id, count=limit)
+        return len(ahead) or None
+
+    # ------------------------------------------------------------------
+    # Consumer side
+    # ------------------------------------------------------------------
+
+    async def start(self, consume: bool = True):
+        """Create the consumer group if needed and (optionally) start pulling jobs"""
+        for tier in self.tiers:
+            try:
+                await self.redis.xgroup_create(self.stream(tier), self.group, id="0", mkstream=True)
+            except ResponseError as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
+        if not consume:
+            logger.info(f"✅ Job queue ready (producer only, {self.stream_prefix}:*)")
+            return
+        self._tasks = [
+            asyncio.create_task(self._consume()),
+            asyncio.create_task(self._maintain())
+        ]
+        logger.info(f"✅ Job queue consumer '{self.consumer}' reading {self.stream_prefix}:*")
+
+    async def stop(self):
+        """Stop pulling new jobs; running ones are left to the executor's drain"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _tier_order(self):
+        return sorted(self.tiers, key=lambda t: (self._pass[t], -self.executor.tier_weights[t]))
+
+    async def _consume(self):
+        while True:
+            try:
+                await self.executor.wait_for_capacity()
+
+                message = None
+                idle = []
+                for tier in self._tier_order():
+                    reply = await self.redis.xreadgroup(
+                        self.group, self.consumer, {self.stream(tier): ">"}, count=1
+                    )
+                    if reply:
+                        message = reply[0]
+                        break
+                    idle.append(tier)
+                if message is None:
+                    # Nothing waiting anywhere: block until any tier gets a job
+                    streams = {self.stream(tier): ">" for tier in self._tier_order()}
+                    reply = await self.redis.xreadgroup(
+                        self.group, self.consumer, streams, count=1, block=5000
+                    )
+                    if not reply:
+                        continue
+                    message = reply[0]
+
+                stream, entries = message
+                tier = stream.rsplit(":", 1)[-1]
+                if tier in self._pass:
+                    # Tiers with nothing waiting do not bank credit for later bursts
+                    for other in idle:
+                        self._pass[other] = max(self._pass[other], self._pass[tier])
+                    self._pass[tier] += 1.0 / self.executor.tier_weights[tier]
+                for message_id, fields in entries:
+                    self._submit(stream, message_id, fields)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Job queue read failed: {e}")
+                await asyncio.sleep(self.heartbeat_interval)
+
+    def _submit(self, stream: str, message_id: str, fields: Dict[str, Any]):
+        job_id = fields.get("job_id")
+        if not job_id:
+            logger.warning(f"⚠️  Dropping malformed job message {message_id} on {stream}")
+            asyncio.create_task(self._ack(stream, message_id))
+            return
+        self._owned[job_id] = (stream, message_id)
+        try:
+            self.executor.submit(job_id, fields.get("tier", ""), lambda: self._run(job_id))
+        except JobQueueFullError:
+            # Shutting down between read and submit; leave it pending for reclaim
+            self._owned.pop(job_id, None)
+
+    async def _run(self, job_id: str):
+        stream, message_id = self._owned[job_id]
+        key = JOB_KEY.format(job_id=job_id)
+        try:
+            status = await self.redis.hget(key, "status")
+            if status is None or status in FINISHED_STATUSES:
+                logger.info(f"⏭️  Job {job_id} already {status or 'expired'}, acking duplicate delivery")
+            else:
+                attempts = await self.redis.hincrby(key, "attempts", 1)
+                self._attempted.add(job_id)
+                if attempts > self.max_attempts:
+                    if self.on_dead:
+                        await self.on_dead(job_id, f"Job abandoned after {self.max_attempts} attempts (worker crashes or timeouts)")
+                else:
+                    await self.handler(job_id)
+        except asyncio.CancelledError:
+            # Cancelled by shutdown: keep the message pending, release() re-queues it
+            raise
+        except Exception:
+            # Stop heartbeating so another consumer reclaims and retries it
+            self._owned.pop(job_id, None)
+            self._attempted.discard(job_id)
+            raise
+        await self._ack(stream, message_id)
+        self._owned.pop(job_id, None)
+        self._attempted.discard(job_id)
+
+    async def _ack(self, stream: str, message_id: str):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.xack(stream, self.group, message_id)
+            pipe.xdel(stream, message_id)
+            await pipe.execute()
+
+    async def release(self, job_id: str) -> bool:
+        """
+        Hand a job this consumer owns back to the cluster right away (shutdown).
+        Returns False if the job did not come from the queue.
+        """
+        owned = self._owned.pop(job_id, None)
+        if owned is None:
+            return False
+        stream, message_id = owned
+        tier = stream.rsplit(":", 1)[-1]
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.xadd(stream, {"job_id": job_id, "tier": tier})
+            if job_id in self._attempted:
+                # A clean handover is not a failed attempt
+                pipe.hincrby(JOB_KEY.format(job_id=job_id), "attempts", -1)
+                self._attempted.discard(job_id)
+            pipe.xack(stream, self.group, message_id)
+            pipe.xdel(stream, message_id)
+            await pipe.execute()
+        logger.info(f"↩️  Job {job_id} re-queued for another worker")
+        return True
+
+    async def _maintain(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await self._heartbeat()
+                await self._reclaim()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Job queue maintenance failed: {e}")
+
+    async def _heartbeat(self):
+        """Reset the idle time of every job this consumer holds"""
+        by_stream: Dict[str, list] = {}
+        for stream, message_id in self._owned.values():
+            by_stream.setdefault(stream, []).append(message_id)
+        for stream, ids in by_stream.items():
+            await self.redis.xclaim(stream, self.group, self.consumer, 0, ids, justid=True)
+
+    async def _reclaim(self):
+        """Take over jobs whose consumer stopped heartbeating"""
+        for tier in self._tier_order():
+            free = self.executor.max_concurrency - self.executor.running - self.executor.queued
+            if free <= 0 or not self.executor.has_capacity:
+                return
+            stream = self.stream(tier)
+            reply = await self.redis.xautoclaim(
+                stream, self.group, self.consumer, self.claim_idle_ms, start_id="0-0", count=free
+            )
+            for message_id, fields in reply[1]:
+                if not fields:
+                    continue  # Entry was deleted while pending
+                logger.warning(f"♻️  Reclaimed stalled job {fields.get('job_id')} from {stream}")
+                self._submit(stream, message_id, fields)
+
+
+def _id_key(message_id: str) -> Tuple[int, int]:
+    ms, _, seq = message_id.partition("-")
+    return int(ms), int(seq or 0)
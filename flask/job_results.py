@@ -0,0 +1,117 @@
+"""
+Job Results
+Compact storage for completed job results, kept apart from job metadata.
+
+A result lives in its own Redis hash job:{id}:result:
+    meta      -> everything except files[], plus a file index (path, language, size)
+    file:{n}  -> one files[] entry
+Every value is zlib-compressed JSON. Status polls never read this hash, and
+downloads can page through files without loading or decompressing the rest.
+
+While a job runs, each finished pipeline phase is checkpointed in job:{id}:checkpoints
+(one compressed field per phase), so a failed or crashed job resumes from
+the first phase without one.
+
+Needs a Redis client created with decode_responses=False.
+"""
+
+import json
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import redis.asyncio as redis
+
+RESULT_KEY = "job:{job_id}:result"
+CHECKPOINT_KEY = "job:{job_id}:checkpoints"
+COMPRESSION_LEVEL = 6
+
+
+def _pack(value: Any) -> bytes:
+    return zlib.compress(json.dumps(value, separators=(",", ":")).encode("utf-8"), COMPRESSION_LEVEL)
+
+
+def _unpack(raw: bytes) -> Any:
+    return json.loads(zlib.decompress(raw).decode("utf-8"))
+
+
+def split_result(result: Dict[str, Any]) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """Return (everything but files[] plus a file_index, files[])"""
+    files = result.get("files") or []
+    meta = {key: value for key, value in result.items() if key != "files"}
+    meta["file_index"] = [
+        {
+            "path": entry.get("path"),
+            "language": entry.get("language"),
+            "size": len(entry.get("content") or "")
+        }
+        for entry in files
+    ]
+    return meta, files
+
+
+def pack_result(result: Dict[str, Any]) -> Dict[str, bytes]:
+    """Split a result into compressed hash fields (see module docstring)"""
+    meta, files = split_result(result)
+    packed = {"meta": _pack(meta)}
+    for n, entry in enumerate(files):
+        packed[f"file:{n}"] = _pack(entry)
+    return packed
+
+
+async def save_result(client: redis.Redis, job_id: str, result: Dict[str, Any], ttl: int) -> Dict[str, int]:
+    """Store a result and return its file count and stored size in bytes"""
+    packed = pack_result(result)
+    key = RESULT_KEY.format(job_id=job_id)
+    async with client.pipeline(transaction=True) as pipe:
+        pipe.delete(key)
+        pipe.hset(key, mapping=packed)
+        pipe.expire(key, ttl)
+        await pipe.execute()
+    return {"files": len(packed) - 1, "bytes": sum(len(value) for value in packed.values())}
+
+
+async def load_result_meta(client: redis.Redis, job_id: str) -> Optional[Dict[str, Any]]:
+    """Result without files[] (includes file_index), or None if not stored"""
+    raw = await client.hget(RESULT_KEY.format(job_id=job_id), "meta")
+    return _unpack(raw) if raw is not None else None
+
+
+async def load_result_files(client: redis.Redis, job_id: str, offset: int, limit: int, total: int) -> List[Dict[str, Any]]:
+    """files[offset:offset + limit] of a stored result"""
+    indexes = range(max(0, offset), min(total, offset + limit))
+    if not indexes:
+        return []
+    raw = await client.hmget(RESULT_KEY.format(job_id=job_id), [f"file:{n}" for n in indexes])
+    return [_unpack(value) for value in raw if value is not None]
+
+
+async def load_result(client: redis.Redis, job_id: str) -> Optional[Dict[str, Any]]:
+    """Reassemble the full result exactly as it was saved, or None if not stored"""
+    stored = await client.hgetall(RESULT_KEY.format(job_id=job_id))
+    if not stored or b"meta" not in stored:
+        return None
+    result = _unpack(stored[b"meta"])
+    total = len(result.pop("file_index", []))
+    result["files"] = [_unpack(stored[f"file:{n}".encode()]) for n in range(total) if f"file:{n}".encode() in stored]
+    return result
+
+
+async def save_checkpoint(client: redis.Redis, job_id: str, phase: str, output: Any, ttl: int) -> int:
+    """Store one finished phase's output and return its stored size in bytes"""
+    packed = _pack(output)
+    key = CHECKPOINT_KEY.format(job_id=job_id)
+    async with client.pipeline(transaction=True) as pipe:
+        pipe.hset(key, phase, packed)
+        pipe.expire(key, ttl)
+        await pipe.execute()
+    return len(packed)
+
+
+async def load_checkpoints(client: redis.Redis, job_id: str) -> Dict[str, Any]:
+    """Every checkpointed phase output of a job, keyed by phase"""
+    stored = await client.hgetall(CHECKPOINT_KEY.format(job_id=job_id))
+    return {phase.decode(): _unpack(raw) for phase, raw in stored.items()}
+
+
+async def delete_checkpoints(client: redis.Redis, job_id: str):
+    await client.delete(CHECKPOINT_KEY.format(job_id=job_id))
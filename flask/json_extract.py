@@ -0,0 +1,336 @@
+"""
+JSON Extract
+Find, repair and parse the JSON document in a model's output.
+
+    extracted = extract_json(completion_text)
+    extracted.value, extracted.fixes, extracted.truncated
+
+    decode_json(completion_text)  # The fast path alone: None if it needs repair
+
+Well-formed output costs one C-speed parse: the document is decoded from its
+first "{" or "[" and whatever surrounds it - markdown fences, prose - is
+ignored.
+
+Otherwise one scan over the document rewrites it into valid JSON, fixing the
+defects models actually produce where they occur:
+- raw newlines, tabs and carriage returns inside strings are escaped, other
+  control characters dropped (outside strings they are whitespace)
+- invalid escapes ("\\d" in a regex) get their backslash escaped
+- a quote inside a string is escaped unless what follows it can follow the
+  string: a colon after a key, a closing bracket of the right kind, or a
+  comma and then the next key (in objects), value (in arrays) or a closing
+  bracket
+- missing commas between values and colons after keys are inserted,
+  trailing commas removed, mismatched closing brackets corrected
+- output cut off mid-document is closed: the open string, a dangling key or
+  colon, then every open container (`truncated` is set)
+The scan jumps from one quote, backslash or bracket to the next with
+compiled regexes, so string contents are copied in bulk.
+
+If that still does not parse, only the damaged region is repaired: the
+innermost object or array (below the top level) around the parser's error
+offset is run through json_repair and spliced back, up to
+MAX_REGION_REPAIRS times. The whole document goes through json_repair only
+as a last resort.
+"""
+
+import json
+import re
+from dataclasses import dataclass
+from typing import Any, List, Optional, Tuple
+
+from json_repair import repair_json
+
+MAX_REGION_REPAIRS = 8
+
+# String content up to the next unescaped quote, and whether it needs no fixing
+_TO_QUOTE = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*', re.DOTALL)
+_VALID_RUN = re.compile(r'(?:[^"\\\x00-\x1f]+|\\["\\/bfnrt]|\\u[0-9a-fA-F]{4})*')
+_ESCAPE = re.compile(r'\\(["\\/bfnrt]|u[0-9a-fA-F]{4})?')
+# Outside strings only structure matters
+_STRUCTURAL = re.compile(r'[{}\[\]",:]')
+_SPACE = re.compile(r'\s*')
+_OTHER_CONTROL = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+_ARRAY_START = re.compile(r'\s*(?:[\]{\["\-0-9]|true\b|false\b|null\b)')
+_CLOSE_AHEAD = re.compile(r'\s*[}\]]')
+_KEY_AHEAD = re.compile(r'\s*"[^"\\\n]{0,200}"\s*:')
+_VALUE_AHEAD = re.compile(r'\s*(?:["{\[\-0-9]|true\b|false\b|null\b)')
+# Whole strings and brackets, for walking JSON that is valid up to a point
+_TOKEN = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|[{}\[\]]', re.DOTALL)
+# Where an object ends and its next sibling (or its parent's end) begins
+_ELEMENT_END = re.compile(r'\}(?=\s*(?:,\s*[{"]|[\]}]|\Z))')
+
+_CLOSERS = {"{": "}", "[": "]"}
+_DECODER = json.JSONDecoder()
+
+
+@dataclass
+class ExtractedJSON:
+    value: Any
+    fixes: int = 0           # Repairs applied (0 = parsed as written)
+    truncated: bool = False  # The document was cut off and had to be closed
+
+    @property
+    def repaired(self) -> bool:
+        return self.fixes > 0
+
+
+def extract_json(text: str) -> ExtractedJSON:
+    """
+    Parse the JSON object (or array) in text, repairing it if needed.
+
+    Raises:
+        ValueError: If there is no JSON document in text or it cannot be repaired
+    """
+    start = _document_start(text)
+    if start < 0:
+        raise ValueError("no JSON object found in output")
+    extracted = decode_json(text, start)
+    if extracted is not None:
+        return extracted
+
+    document, fixes, truncated = _rewrite(text, start)
+    for _ in range(MAX_REGION_REPAIRS + 1):
+        try:
+            return ExtractedJSON(json.loads(document), fixes, truncated)
+        except json.JSONDecodeError as e:
+            error = e
+        spliced = _repair_region(document, error.pos)
+        if spliced is None:
+            break
+        document = spliced
+        fixes += 1
+
+    try:
+        value = repair_json(document, return_objects=True)
+    except Exception:
+        value = None
+    if isinstance(value, (dict, list)) and value:
+        return ExtractedJSON(value, fixes + 1, truncated)
+
+    snippet = document[max(0, error.pos - 150):error.pos + 150]
+    raise ValueError(f"{error.msg} at position {error.pos} (near: {snippet!r})")
+
+
+def decode_json(text: str, start: Optional[int] = None) -> Optional[ExtractedJSON]:
+    """Parse the JSON document in text as written (None if there is none or it needs repair)"""
+    start = _document_start(text) if start is None else start
+    if start < 0:
+        return None
+    try:
+        value, _ = _DECODER.raw_decode(text, start)
+    except json.JSONDecodeError:
+        return None
+    return ExtractedJSON(value)
+
+
+def _document_start(text: str) -> int:
+    """
+    Index of the first "{" or "[" (-1 if neither): a top-level array is not its first object.
+    A "[" not followed by a value ("[see below]" in prose) does not start a document.
+    """
+    obj = text.find("{")
+    array = text.find("[")
+    while array >= 0 and (obj < 0 or array < obj):
+        if _ARRAY_START.match(text, array + 1):
+            return array
+        array = text.find("[", array + 1)
+    return obj
+
+
+def _string_ends(text: str, quote: int, container: str, is_key: bool) -> bool:
+    """Whether the quote at text[quote] closes its string (rather than being an unescaped quote inside it)"""
+    after = _SPACE.match(text, quote + 1).end()
+    if after >= len(text):
+        return True
+    follower = text[after]
+    if is_key:
+        return follower in ':,}"'
+    if follower == "}":
+        return container == "{"
+    if follower == "]":
+        return container == "["
+    if follower == ",":
+        ahead = _KEY_AHEAD if container == "{" else _VALUE_AHEAD
+        return ahead.match(text, after + 1) is not None or _CLOSE_AHEAD.match(text, after + 1) is not None
+    if follower in '"{[':
+        # The next member or element with the comma missing
+        return "\n" in text[quote + 1:after] or (container == "{" and _KEY_AHEAD.match(text, after) is not None)
+    return False
+
+
+def _valid_escape(match: "re.Match[str]") -> str:
+    return match.group() if match.group(1) else "\\\\"
+
+
+def _fix_string(run: str) -> str:
+    """Escape raw control characters and the backslash of invalid escapes in string content"""
+    if "\\" in run:
+        run = _ESCAPE.sub(_valid_escape, run)
+    run = run.replace("\n", "\\n").replace("\r", "\\r").replace("\t", "\\t")
+    return _OTHER_CONTROL.sub("", run)
+
+
+def _rewrite(text: str, start: int) -> Tuple[str, int, bool]:
+    """One pass from text[start] rewriting the document into valid JSON: (document, fixes, truncated)"""
+    out: List[str] = []
+    stack: List[str] = []
+    # Last significant token outside strings: an opener, ",", ":", "k" (a key) or "v" (a value)
+    prev = ""
+    last_comma = -1
+    fixes = 0
+    n = len(text)
+    i = start
+
+    def value_starts():
+        nonlocal fixes
+        if prev == "v":
+            out.append(",")
+            fixes += 1
+        elif prev == "k":
+            out.append(":")
+            fixes += 1
+
+    while i < n:
+        match = _STRUCTURAL.search(text, i)
+        end = match.start() if match else n
+        literal = text[i:end]
+        if literal.strip():
+            value_starts()
+            prev = "v"
+        out.append(literal)
+        if not match:
+            break
+        char = text[end]
+        i = end + 1
+
+        if char == '"':
+            # After a value in an object this is the next key, its comma missing
+            is_key = bool(stack) and stack[-1] == "{" and prev in ("{", ",", "v")
+            value_starts()
+            out.append('"')
+            closed = False
+            while i < n:
+                # Everything up to the next quote, checked (and if need be fixed) in one go
+                run_end = _TO_QUOTE.match(text, i).end()
+                run = text[i:run_end]
+                if _VALID_RUN.match(run).end() < len(run):  # (fullmatch would backtrack)
+                    out.append(_fix_string(run))
+                    fixes += 1
+                else:
+                    out.append(run)
+                i = run_end
+                if i >= n or text[i] == "\\":
+                    i = n  # Cut off (mid-escape, perhaps)
+                    break
+                if _string_ends(text, i, stack[-1], is_key):
+                    out.append('"')
+                    i += 1
+                    closed = True
+                    break
+                out.append('\\"')
+                fixes += 1
+                i += 1
+            if not closed:
+                out.append('"')
+            prev = "k" if is_key else "v"
+            if not closed:
+                break
+
+        elif char in "{[":
+            value_starts()
+            stack.append(char)
+            out.append(char)
+            prev = char
+
+        elif char in "}]":
+            if not stack:
+                fixes += 1  # Stray closer after the document
+                continue
+            if prev == ",":
+                out[last_comma] = ""
+                fixes += 1
+            elif prev == ":" or prev == "k":
+                out.append("null" if prev == ":" else ":null")
+                fixes += 1
+            opener = "{" if char == "}" else "["
+            if stack[-1] != opener and opener in stack:
+                # Closes an outer container: close the inner ones first
+                while stack[-1] != opener:
+                    out.append(_CLOSERS[stack.pop()])
+                    fixes += 1
+            closer = _CLOSERS[stack.pop()]
+            if closer != char:
+                fixes += 1
+            out.append(closer)
+            prev = "v"
+            if not stack:
+                return "".join(out), fixes, False
+
+        elif char == ",":
+            if prev in ("{", "[", ","):
+                fixes += 1  # Empty element
+                continue
+            if prev == ":" or prev == "k":
+                out.append("null" if prev == ":" else ":null")
+                fixes += 1
+            out.append(",")
+            last_comma = len(out) - 1
+            prev = ","
+
+        else:  # ":"
+            out.append(":")
+            prev = ":"
+
+    # Cut off: finish the last member, then close every open container
+    if prev == ",":
+        out[last_comma] = ""
+    elif prev == ":":
+        out.append("null")
+    elif prev == "k":
+        out.append(":null")
+    out.extend(_CLOSERS[opener] for opener in reversed(stack))
+    return "".join(out), fixes + 1, True
+
+
+def _repair_region(document: str, pos: int) -> Optional[str]:
+    """Repair the innermost nested container around pos and splice it back (None if there is none)"""
+    # The document parsed up to pos, so walking it that far is exact
+    open_at: List[int] = []
+    for token in _TOKEN.finditer(document):
+        if token.start() >= pos:
+            break
+        char = token.group()
+        if char in "{[":
+            open_at.append(token.start())
+        elif char in "}]" and open_at:
+            open_at.pop()
+    if len(open_at) < 2:
+        return None
+
+    start = open_at[-1]
+    end = len(document)
+    if document[start] == "{":
+        # Past the error the brackets cannot be trusted; the next sibling boundary can
+        boundary = _ELEMENT_END.search(document, pos)
+        if boundary:
+            end = boundary.end()
+    else:
+        depth = 0
+        for token in _TOKEN.finditer(document, start):
+            char = token.group()
+            if char in "{[":
+                depth += 1
+            elif char in "}]":
+                depth -= 1
+                if depth == 0:
+                    end = token.end()
+                    break
+
+    try:
+        value = repair_json(document[start:end], return_objects=True)
+    except Exception:
+        return None
+    if not isinstance(value, (dict, list)):
+        return None  # Not a container any more: leave it to the whole-document repair
+    return document[:start] + json.dumps(value, ensure_ascii=False) + document[end:]
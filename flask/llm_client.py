@@ -0,0 +1,405 @@
+"""
+LLM Client
+One async interface over the OpenAI and Anthropic SDKs.
+
+    completion = await llm.complete(prompt, system=..., json_mode=True)
+    completion.text, completion.usage.tokens, completion.usage.finish_reason
+
+    usage = Usage()
+    async for delta in llm.stream(prompt, usage=usage):
+        ...
+
+Each adapter turns the same arguments into its provider's request:
+- system prompt: a system message (OpenAI) or the system parameter (Anthropic)
+- json_mode: response_format json_object (OpenAI), or an assistant turn
+  prefilled with "{" (Anthropic), which is put back in front of the output
+- max_tokens: capped at the model's limit (so a request sized for one
+  provider still works after failing over to another); when omitted, OpenAI
+  uses its own default and Anthropic the model's limit
+
+and normalises the response: usage as input/output tokens, finish_reason as
+"stop" or "length" (the output hit max_tokens) where the provider says so.
+
+Prompt caching: `prefix` is a list of static prompt blocks sent, in order,
+before the prompt. Calls that share a system prompt and leading prefix
+blocks can reuse the provider's cache of them:
+- Anthropic: the system prompt and each prefix block are marked with
+  cache_control (at most 4 breakpoints, the last blocks win), so the longest
+  cached run is read at a tenth of the input price
+- OpenAI: prefix blocks are concatenated in front of the prompt unchanged,
+  keeping the prompt byte-identical for its automatic prefix caching
+Input tokens read from (and, on Anthropic, written to) the cache are
+reported as usage.cached_tokens / usage.cache_write_tokens; input_tokens
+always counts the whole prompt. Prefixes shorter than the provider's
+minimum (1024 tokens on most models) are simply not cached.
+CacheWarmup staggers concurrent calls sharing a prefix so that one writes
+the cache and the rest read it.
+
+Transient failures - connection errors, timeouts, 408/409/429 and 5xx - are
+retried with exponential backoff and jitter (honouring Retry-After), up to
+`max_retries` times; streams are only retried while opening. The SDK clients
+should be built with max_retries=0 so retries are not stacked. Each client
+keeps call, retry, failure, token and latency counters for stats(), and
+passes every completed call's usage and duration to `observer`, if given.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+import anthropic
+import openai
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_RETRYABLE_STATUSES = {408, 409, 429}
+
+
+@dataclass
+class Usage:
+    provider: str = ""
+    model: str = ""
+    input_tokens: int = 0
+    output_tokens: int = 0
+    finish_reason: Optional[str] = None  # "stop", "length", or the provider's own reason
+    cached_tokens: int = 0       # Input tokens read from the prompt cache
+    cache_write_tokens: int = 0  # Input tokens written to the prompt cache
+
+    @property
+    def tokens(self) -> int:
+        return self.input_tokens + self.output_tokens
+
+
+@dataclass
+class Completion:
+    text: str
+    usage: Usage
+
+
+class LLMClient:
+    """Provider-neutral chat, JSON mode and streaming with retries and usage accounting"""
+
+    provider = ""
+    connection_errors: Tuple[type, ...] = ()
+    finish_reasons: Dict[str, str] = {}
+
+    def __init__(
+        self,
+        client: Any,
+        default_model: str,
+        model_limits: Optional[Dict[str, int]] = None,
+        default_max_tokens: int = 4096,
+        max_retries: int = 2,
+        backoff: float = 0.5,
+        max_backoff: float = 8.0,
+        timeout: Optional[float] = None,
+        observer: Optional[Callable[[Usage, float], None]] = None
+    ):
+        self.client = client
+        self.default_model = default_model
+        self.model_limits = model_limits or {}
+        self.default_max_tokens = default_max_tokens
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.observer = observer
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cached_tokens = 0
+        self.cache_write_tokens = 0
+        self._latency_total = 0.0
+
+    def max_tokens_for(self, model: str) -> int:
+        return self.model_limits.get(model, self.default_max_tokens)
+
+    async def complete(
+        self,
+        prompt: str,
+        *,
+        system: Optional[str] = None,
+        prefix: Sequence[str] = (),
+        model: Optional[str] = None,
+        max_tokens: Optional[int] = None,
+        temperature: float = 0.7,
+        json_mode: bool = False
+    ) -> Completion:
+        """One completion of prompt"""
+        model = model or self.default_model
+        kwargs = self._request(prompt, system, prefix, model, max_tokens, temperature, json_mode)
+        usage = Usage(self.provider, model)
+        started = time.monotonic()
+        self.calls += 1
+        try:
+            text = await self._retrying(lambda: self._complete(kwargs, usage))
+        except Exception:
+            self.failures += 1
+            raise
+        self._account(usage, started)
+        return Completion(self._prefill(json_mode) + text, usage)
+
+    async def stream(
+        self,
+        prompt: str,
+        *,
+        usage: Usage,
+        system: Optional[str] = None,
+        prefix: Sequence[str] = (),
+        model: Optional[str] = None,
+        max_tokens: Optional[int] = None,
+        temperature: float = 0.7,
+        json_mode: bool = False
+    ) -> AsyncIterator[str]:
+        """Yield text deltas of a completion; usage is filled in as the provider reports it"""
+        model = model or self.default_model
+        kwargs = self._request(prompt, system, prefix, model, max_tokens, temperature, json_mode)
+        usage.provider, usage.model = self.provider, model
+        started = time.monotonic()
+        self.calls += 1
+        try:
+            stream = await self._retrying(lambda: self._open_stream(kwargs))
+            # The prefill goes out with the first model token, not when the connection opens:
+            # time-to-first-token, hedging and cache warm-up all watch the first delta
+            prefill = self._prefill(json_mode)
+            async for delta in self._deltas(stream, usage):
+                if prefill:
+                    delta, prefill = prefill + delta, ""
+                yield delta
+            if prefill:
+                yield prefill
+        except (asyncio.CancelledError, GeneratorExit):
+            raise
+        except Exception:
+            self.failures += 1
+            raise
+        self._account(usage, started)
+
+    # ------------------------------------------------------------------
+    # Provider hooks
+    # ------------------------------------------------------------------
+
+    def _request(self, prompt: str, system: Optional[str], prefix: Sequence[str], model: str,
+                 max_tokens: Optional[int], temperature: float, json_mode: bool) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    async def _complete(self, kwargs: Dict[str, Any], usage: Usage) -> str:
+        raise NotImplementedError
+
+    async def _open_stream(self, kwargs: Dict[str, Any]) -> Any:
+        raise NotImplementedError
+
+    def _deltas(self, stream: Any, usage: Usage) -> AsyncIterator[str]:
+        raise NotImplementedError
+
+    def _prefill(self, json_mode: bool) -> str:
+        """Text the request put in the model's mouth, to restore in front of its output"""
+        return ""
+
+    # ------------------------------------------------------------------
+    # Retries
+    # ------------------------------------------------------------------
+
+    def is_transient(self, error: BaseException) -> bool:
+        if isinstance(error, (asyncio.TimeoutError, *self.connection_errors)):
+            return True
+        status = getattr(error, "status_code", None)
+        return isinstance(status, int) and (status in _RETRYABLE_STATUSES or status >= 500)
+
+    def _delay(self, attempt: int, error: BaseException) -> float:
+        response = getattr(error, "response", None)
+        retry_after = getattr(response, "headers", {}).get("retry-after") if response is not None else None
+        try:
+            if retry_after is not None:
+                return min(self.max_backoff, float(retry_after))
+        except ValueError:
+            pass
+        return min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+    async def _retrying(self, call: Callable[[], Awaitable[T]]) -> T:
+        attempt = 0
+        while True:
+            try:
+                return await call()
+            except Exception as e:
+                if attempt >= self.max_retries or not self.is_transient(e):
+                    raise
+                delay = self._delay(attempt, e)
+                attempt += 1
+                self.retries += 1
+                logger.warning(f"⚠️  {self.provider} call failed ({e}), retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    def _account(self, usage: Usage, started: float):
+        seconds = time.monotonic() - started
+        self.input_tokens += usage.input_tokens
+        self.output_tokens += usage.output_tokens
+        self.cached_tokens += usage.cached_tokens
+        self.cache_write_tokens += usage.cache_write_tokens
+        self._latency_total += seconds
+        if self.observer:
+            try:
+                self.observer(usage, seconds)
+            except Exception as e:
+                logger.warning(f"⚠️  LLM usage observer failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        succeeded = self.calls - self.failures
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "failures": self.failures,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "cached_tokens": self.cached_tokens,
+            "cache_write_tokens": self.cache_write_tokens,
+            "avg_latency_ms": round(self._latency_total / succeeded * 1000) if succeeded > 0 else None
+        }
+
+
+class OpenAIClient(LLMClient):
+    provider = "openai"
+    connection_errors = (openai.APIConnectionError,)
+    finish_reasons = {"stop": "stop", "length": "length"}
+
+    def _request(self, prompt: str, system: Optional[str], prefix: Sequence[str], model: str,
+                 max_tokens: Optional[int], temperature: float, json_mode: bool) -> Dict[str, Any]:
+        messages: List[Dict[str, Any]] = [{"role": "system", "content": system}] if system else []
+        messages.append({"role": "user", "content": "".join(prefix) + prompt})
+        kwargs: Dict[str, Any] = {"model": model, "messages": messages, "temperature": temperature}
+        if max_tokens:
+            kwargs["max_tokens"] = min(max_tokens, self.max_tokens_for(model))
+        if json_mode:
+            kwargs["response_format"] = {"type": "json_object"}
+        if self.timeout:
+            kwargs["timeout"] = self.timeout
+        return kwargs
+
+    async def _complete(self, kwargs: Dict[str, Any], usage: Usage) -> str:
+        response = await self.client.chat.completions.create(**kwargs)
+        if response.usage:
+            self._usage(response.usage, usage)
+        choice = response.choices[0]
+        usage.finish_reason = self.finish_reasons.get(choice.finish_reason, choice.finish_reason)
+        return choice.message.content or ""
+
+    async def _open_stream(self, kwargs: Dict[str, Any]) -> Any:
+        return await self.client.chat.completions.create(**kwargs, stream=True, stream_options={"include_usage": True})
+
+    async def _deltas(self, stream: Any, usage: Usage) -> AsyncIterator[str]:
+        async for chunk in stream:
+            if chunk.choices:
+                choice = chunk.choices[0]
+                if choice.delta.content:
+                    yield choice.delta.content
+                if choice.finish_reason:
+                    usage.finish_reason = self.finish_reasons.get(choice.finish_reason, choice.finish_reason)
+            if chunk.usage:
+                self._usage(chunk.usage, usage)
+
+    @staticmethod
+    def _usage(reported: Any, usage: Usage):
+        usage.input_tokens = reported.prompt_tokens
+        usage.output_tokens = reported.completion_tokens
+        details = getattr(reported, "prompt_tokens_details", None)
+        usage.cached_tokens = getattr(details, "cached_tokens", None) or 0
+
+
+class AnthropicClient(LLMClient):
+    provider = "anthropic"
+    connection_errors = (anthropic.APIConnectionError,)
+    finish_reasons = {"end_turn": "stop", "stop_sequence": "stop", "max_tokens": "length"}
+
+    def _request(self, prompt: str, system: Optional[str], prefix: Sequence[str], model: str,
+                 max_tokens: Optional[int], temperature: float, json_mode: bool) -> Dict[str, Any]:
+        # Cache breakpoints on the system prompt and prefix blocks, the last 4 of them
+        blocks: List[Dict[str, Any]] = [{"type": "text", "text": text} for text in prefix if text]
+        breakpoints = ([{"type": "text", "text": system}] if system else []) + blocks
+        if blocks:
+            for block in breakpoints[-4:]:
+                block["cache_control"] = {"type": "ephemeral"}
+        content = blocks + [{"type": "text", "text": prompt}] if blocks else prompt
+        messages: List[Dict[str, Any]] = [{"role": "user", "content": content}]
+        if json_mode:
+            messages.append({"role": "assistant", "content": "{"})
+        kwargs: Dict[str, Any] = {
+            "model": model,
+            "max_tokens": min(max_tokens or self.max_tokens_for(model), self.max_tokens_for(model)),
+            "temperature": temperature,
+            "messages": messages
+        }
+        if system:
+            kwargs["system"] = breakpoints[:1] if blocks else system
+        if self.timeout:
+            kwargs["timeout"] = self.timeout
+        return kwargs
+
+    def _prefill(self, json_mode: bool) -> str:
+        return "{" if json_mode else ""
+
+    async def _complete(self, kwargs: Dict[str, Any], usage: Usage) -> str:
+        response = await self.client.messages.create(**kwargs)
+        self._input_usage(response.usage, usage)
+        usage.output_tokens = response.usage.output_tokens
+        usage.finish_reason = self.finish_reasons.get(response.stop_reason, response.stop_reason)
+        return "".join(block.text for block in response.content if block.type == "text")
+
+    async def _open_stream(self, kwargs: Dict[str, Any]) -> Any:
+        return await self.client.messages.create(**kwargs, stream=True)
+
+    async def _deltas(self, stream: Any, usage: Usage) -> AsyncIterator[str]:
+        async for event in stream:
+            if event.type == "message_start":
+                self._input_usage(event.message.usage, usage)
+            elif event.type == "content_block_delta" and event.delta.type == "text_delta":
+                yield event.delta.text
+            elif event.type == "message_delta":
+                usage.output_tokens = event.usage.output_tokens
+                if event.delta.stop_reason:
+                    usage.finish_reason = self.finish_reasons.get(event.delta.stop_reason, event.delta.stop_reason)
+
+    @staticmethod
+    def _input_usage(reported: Any, usage: Usage):
+        """Anthropic counts cache reads and writes apart from input_tokens; fold them in"""
+        usage.cached_tokens = getattr(reported, "cache_read_input_tokens", None) or 0
+        usage.cache_write_tokens = getattr(reported, "cache_creation_input_tokens", None) or 0
+        usage.input_tokens = reported.input_tokens + usage.cached_tokens + usage.cache_write_tokens
+
+
+class CacheWarmup:
+    """
+    Stagger calls that share a cacheable prefix: the first call per provider
+    starts straight away and writes the cache, the others wait (up to
+    `timeout`) for its first token - by then the prefix is cached - instead
+    of all paying to write it at once.
+    """
+
+    def __init__(self, timeout: float = 10.0):
+        self.timeout = timeout
+        self._written: Dict[str, asyncio.Event] = {}
+
+    async def stream(self, provider: str, open_stream: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """Yield open_stream()'s deltas once provider's cache is written (or being written by this call)"""
+        written = self._written.get(provider)
+        writer = written is None
+        if writer:
+            written = self._written[provider] = asyncio.Event()
+        else:
+            try:
+                await asyncio.wait_for(written.wait(), self.timeout)
+            except asyncio.TimeoutError:
+                pass
+        try:
+            async for delta in open_stream():
+                written.set()
+                yield delta
+        finally:
+            # A writer that failed before its first token lets the others go
+            written.set()
@@ -0,0 +1,67 @@
+"""
+Loop Monitor
+Measure event-loop lag: how late a timer that should fire every `interval`
+seconds actually fires. Any CPU-bound work on the loop shows up here,
+because nothing else - requests, health checks, streams - runs meanwhile.
+
+stats() reports the latest, mean, p99 and max lag over the last `window`
+samples, and how many samples were stalls (lag of `stall_threshold` or more)
+since start.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LoopLagMonitor:
+    """Sample the event loop's scheduling delay in the background"""
+
+    def __init__(self, interval: float = 0.25, window: int = 240, stall_threshold: float = 0.1):
+        self.interval = interval
+        self.stall_threshold = stall_threshold
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._task: Optional[asyncio.Task] = None
+        self.stalls = 0
+        self.max_lag = 0.0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - expected)
+            self._samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if lag >= self.stall_threshold:
+                self.stalls += 1
+                logger.warning(f"⚠️  Event loop stalled for {lag * 1000:.0f}ms")
+
+    def stats(self) -> Dict[str, Any]:
+        samples = sorted(self._samples)
+        if not samples:
+            return {"samples": 0}
+        return {
+            "samples": len(samples),
+            "lag_ms": round(self._samples[-1] * 1000, 1),
+            "mean_lag_ms": round(sum(samples) / len(samples) * 1000, 1),
+            "p99_lag_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000, 1),
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+            "stalls": self.stalls
+        }
@@ -0,0 +1,167 @@
+"""
+Model Selector
+Picks the cheapest model that meets a tier's latency and quality SLO for a request.
+
+A request's complexity (0-1) is estimated from its size and scope: the length
+of the description, the number of features, the framework and how many
+"heavy" capabilities it mentions (auth, payments, realtime, ...). Complexity
+sets how much output to expect (a share of the call's max_tokens) and the
+quality it needs: 0.5 for a trivial request up to 0.95 for the most complex,
+never below the tier's own floor.
+
+A model is eligible when
+- its max output covers the expected output (otherwise it would truncate),
+- its effective quality meets the requirement, and
+- its expected latency (overhead + expected output / throughput) is within
+  the tier's latency SLO.
+The cheapest eligible model wins, the faster one on equal cost. If none is
+eligible, the fastest model meeting the quality requirement is used, and
+failing that the best model.
+
+Quality and throughput start from the catalog's priors and are learned:
+- throughput: EWMA of output tokens per second, from every completed call
+- JSON failures: EWMA over generations scored 0 (parsed cleanly), 0.5 (had
+  to be repaired) or 1 (truncated or unparseable); effective quality is the
+  prior scaled down by up to half of that rate
+
+State is per process.
+"""
+
+import logging
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+CLEAN = "clean"
+REPAIRED = "repaired"
+FAILED = "failed"
+_OUTCOME_SCORES = {CLEAN: 0.0, REPAIRED: 0.5, FAILED: 1.0}
+
+# Capabilities that make an app noticeably bigger to generate
+_HEAVY_FEATURES = re.compile(
+    r"\b(auth\w*|login|oauth|payments?|stripe|checkout|real-?time|websockets?|chat|"
+    r"admin|dashboards?|analytics|multi-?tenant|uploads?|search|notifications?|"
+    r"i18n|roles?|permissions?|maps?|calendar|reports?|subscriptions?)\b",
+    re.IGNORECASE
+)
+_FRAMEWORK_WEIGHTS = {"nextjs": 0.8, "react": 0.6, "vue": 0.6, "express": 0.5, "fastapi": 0.5, "flask": 0.4}
+
+
+def app_complexity(description: str, features: Iterable[str] = (), framework: Optional[str] = None) -> float:
+    """Estimated complexity of an app request, 0 (trivial) to 1 (as big as they come)"""
+    features = list(features)
+    text = " ".join([description, *features])
+    words = min(1.0, len(description.split()) / 300)
+    feature_count = min(1.0, len(features) / 10)
+    heavy = min(1.0, len({match.lower() for match in _HEAVY_FEATURES.findall(text)}) / 5)
+    stack = _FRAMEWORK_WEIGHTS.get(framework or "", 0.5)
+    return round(0.4 * words + 0.3 * feature_count + 0.15 * heavy + 0.15 * stack, 3)
+
+
+def prompt_complexity(prompt: str, max_tokens: int, ceiling: int = 16384) -> float:
+    """Estimated complexity of a free-form prompt: its length and the output it asks room for"""
+    return round(0.5 * min(1.0, len(prompt) / 8000) + 0.5 * min(1.0, max_tokens / ceiling), 3)
+
+
+@dataclass
+class ModelProfile:
+    provider: str
+    name: str
+    cost: int
+    max_tokens: int
+    quality: float               # Prior, 0-1
+    tokens_per_second: float     # Learned (starts at the prior)
+    json_failure_rate: float = 0.0
+    calls: int = 0
+    generations: int = 0
+
+    @property
+    def effective_quality(self) -> float:
+        return self.quality * (1.0 - 0.5 * self.json_failure_rate)
+
+
+class ModelSelector:
+    """Choose a model per provider from complexity and tier SLOs, learning from outcomes"""
+
+    def __init__(
+        self,
+        catalog: Dict[str, Dict[str, Dict[str, Any]]],
+        slos: Dict[str, Dict[str, float]],
+        overhead: float = 1.5,
+        alpha: float = 0.1,
+        min_output_tokens: int = 500
+    ):
+        self.slos = slos
+        self.overhead = overhead          # Seconds before the first token, on top of throughput
+        self.alpha = alpha
+        self.min_output_tokens = min_output_tokens
+        self.profiles: Dict[str, ModelProfile] = {}
+        for provider, models in catalog.items():
+            for name, info in models.items():
+                self.profiles[name] = ModelProfile(
+                    provider, name, info["cost"], info["max_tokens"], info["quality"], info["tokens_per_second"]
+                )
+        self.choices: Dict[str, int] = {}
+
+    def expected_latency(self, profile: ModelProfile, output_tokens: int) -> float:
+        return self.overhead + output_tokens / max(profile.tokens_per_second, 1.0)
+
+    def choose(self, provider: str, complexity: float, tier: str, max_tokens: int) -> Optional[str]:
+        """The model to use on provider (None if the catalog has no model for it)"""
+        slo = self.slos.get(tier) or self.slos["free"]
+        required = max(slo["min_quality"], 0.5 + 0.45 * complexity)
+        output_tokens = max(self.min_output_tokens, int(complexity * max_tokens))
+        models = [profile for profile in self.profiles.values() if profile.provider == provider]
+        if not models:
+            return None
+
+        capable = [profile for profile in models if profile.max_tokens >= output_tokens] or models
+        good = [profile for profile in capable if profile.effective_quality >= required]
+        eligible = [profile for profile in good if self.expected_latency(profile, output_tokens) <= slo["latency"]]
+        if eligible:
+            chosen = min(eligible, key=lambda profile: (profile.cost, self.expected_latency(profile, output_tokens)))
+        elif good:
+            chosen = min(good, key=lambda profile: self.expected_latency(profile, output_tokens))
+        else:
+            chosen = max(capable, key=lambda profile: profile.effective_quality)
+
+        self.choices[chosen.name] = self.choices.get(chosen.name, 0) + 1
+        logger.info(
+            f"🧭 {provider}: chose {chosen.name} (complexity {complexity:.2f}, needs quality {required:.2f}, "
+            f"~{output_tokens} tokens in ~{self.expected_latency(chosen, output_tokens):.0f}s, {tier} SLO {slo['latency']:.0f}s)"
+        )
+        return chosen.name
+
+    def observe(self, model: str, seconds: float, output_tokens: int):
+        """Learn throughput from a completed call (short answers say little about it)"""
+        profile = self.profiles.get(model)
+        if profile is None:
+            return
+        profile.calls += 1
+        if output_tokens < 50 or seconds <= 0:
+            return
+        throughput = output_tokens / max(seconds - self.overhead, 0.1 * seconds)
+        profile.tokens_per_second += self.alpha * (throughput - profile.tokens_per_second)
+
+    def record_json(self, model: str, outcome: str):
+        """Learn how often a model's structured output needs repair or fails"""
+        profile = self.profiles.get(model)
+        if profile is None:
+            return
+        profile.generations += 1
+        profile.json_failure_rate += self.alpha * (_OUTCOME_SCORES[outcome] - profile.json_failure_rate)
+
+    def stats(self) -> Dict[str, Any]:
+        models: Dict[str, Any] = {}
+        for profile in self.profiles.values():
+            models[profile.name] = {
+                "provider": profile.provider,
+                "chosen": self.choices.get(profile.name, 0),
+                "calls": profile.calls,
+                "tokens_per_second": round(profile.tokens_per_second, 1),
+                "json_failure_rate": round(profile.json_failure_rate, 3),
+                "effective_quality": round(profile.effective_quality, 3)
+            }
+        return {"slos": self.slos, "models": models}
@@ -0,0 +1,364 @@
+"""
+Provider Router
+Health-aware choice between AI providers, with failover and optional hedging.
+
+Each provider has a ProviderHealth: EWMAs of call latency and error rate,
+the recent time-to-first-token / latency samples used for p95 deadlines, and
+a circuit breaker. The breaker opens after `failure_threshold` consecutive
+failures (or an error-rate EWMA above `error_rate_threshold`), stays open
+for `cooldown` seconds, then lets a single probe through (half-open); the
+probe's outcome closes or re-opens it.
+
+In AUTO mode the router tries providers in preference order, healthy ones
+first, and fails over to the next one when a call raises a provider error
+(5xx, timeouts, connection errors, 408/409/429). Client errors such as 400
+are raised straight away - another provider would not fix the request.
+
+With hedging enabled, if the current provider has not answered (call) or
+produced its first token (stream) within max(hedge_min_delay, p95 *
+hedge_multiplier), the next provider is started as well and whichever gets
+there first is used; the other is cancelled. Until a provider has
+`min_samples` samples it uses hedge_max_delay.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+Candidate = Tuple[str, Any]  # (provider name, client)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# HTTP statuses worth retrying on another provider
+_RETRYABLE_STATUSES = {408, 409, 429}
+
+
+class NoProviderAvailableError(Exception):
+    """Every candidate provider failed (the last error is chained)"""
+
+
+def is_provider_error(error: BaseException) -> bool:
+    """True if the failure is the provider's fault (counted, and worth failing over)"""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None)
+    if isinstance(status, int) and 400 <= status < 500 and status not in _RETRYABLE_STATUSES:
+        return False
+    return not isinstance(error, (ValueError, TypeError, KeyError))
+
+
+class ProviderHealth:
+    """Latency, error rate and circuit breaker state of one provider"""
+
+    def __init__(
+        self,
+        name: str,
+        alpha: float = 0.2,
+        samples: int = 200,
+        failure_threshold: int = 5,
+        error_rate_threshold: float = 0.5,
+        cooldown: float = 30.0,
+        min_samples: int = 20
+    ):
+        self.name = name
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.error_rate_threshold = error_rate_threshold
+        self.cooldown = cooldown
+        self.min_samples = min_samples
+        self.latency_ewma: Optional[float] = None
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+        self.calls = 0
+        self.failures = 0
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self._probing = False
+        self._latencies: Deque[float] = deque(maxlen=samples)
+        self._first_tokens: Deque[float] = deque(maxlen=samples)
+
+    def ready(self) -> bool:
+        """Whether a call could go to this provider now"""
+        if self.state == OPEN:
+            return time.monotonic() - self.opened_at >= self.cooldown
+        return self.state == CLOSED or not self._probing
+
+    def acquire(self) -> bool:
+        """Claim a call slot: always when closed, the single probe when half-open"""
+        if not self.ready():
+            return False
+        if self.state != CLOSED:
+            self.state = HALF_OPEN
+            self._probing = True
+        return True
+
+    def record_success(self, latency: float, first_token: Optional[float] = None):
+        self.calls += 1
+        self.consecutive_failures = 0
+        self.error_rate *= 1 - self.alpha
+        self.latency_ewma = latency if self.latency_ewma is None else self.alpha * latency + (1 - self.alpha) * self.latency_ewma
+        self._latencies.append(latency)
+        if first_token is not None:
+            self._first_tokens.append(first_token)
+        if self.state != CLOSED:
+            logger.info(f"✅ Provider {self.name} recovered, circuit closed")
+        self.state = CLOSED
+        self._probing = False
+
+    def release(self):
+        """Give back an abandoned call slot (a hedge loser or a cancelled request)"""
+        self._probing = False
+
+    def record_first_token(self, first_token: float):
+        self._first_tokens.append(first_token)
+
+    def record_failure(self, error: BaseException):
+        self.calls += 1
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.error_rate = self.alpha + (1 - self.alpha) * self.error_rate
+        tripped = (
+            self.consecutive_failures >= self.failure_threshold
+            or (self.calls >= self.min_samples and self.error_rate >= self.error_rate_threshold)
+        )
+        if self.state == HALF_OPEN or (self.state == CLOSED and tripped):
+            logger.error(f"❌ Provider {self.name} circuit opened for {self.cooldown:.0f}s: {error}")
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+    def p95(self, first_token: bool) -> Optional[float]:
+        samples = self._first_tokens if first_token else self._latencies
+        if len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "calls": self.calls,
+            "failures": self.failures,
+            "error_rate": round(self.error_rate, 3),
+            "latency_ewma_ms": round(self.latency_ewma * 1000) if self.latency_ewma is not None else None,
+            "p95_first_token_ms": round(self.p95(True) * 1000) if self.p95(True) is not None else None,
+            "p95_latency_ms": round(self.p95(False) * 1000) if self.p95(False) is not None else None
+        }
+
+
+class ProviderRouter:
+    """Order providers by health, fail over between them and hedge slow ones"""
+
+    def __init__(
+        self,
+        preference: List[str],
+        hedge: bool = False,
+        hedge_multiplier: float = 1.0,
+        hedge_min_delay: float = 1.0,
+        hedge_max_delay: float = 20.0,
+        **health_options: Any
+    ):
+        self.preference = preference
+        self.hedge = hedge
+        self.hedge_multiplier = hedge_multiplier
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_max_delay = hedge_max_delay
+        self.clients: Dict[str, Any] = {}
+        self.health: Dict[str, ProviderHealth] = {name: ProviderHealth(name, **health_options) for name in preference}
+        self.failovers = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def register(self, name: str, client: Any):
+        """Make a configured provider client routable (None = not configured)"""
+        if client is not None:
+            self.clients[name] = client
+
+    def candidates(self, requested: Optional[str] = None, prefer: Optional[str] = None) -> List[Candidate]:
+        """
+        Providers to try, in order. A specific request gets only that provider;
+        "auto" gets every configured one (`prefer` first, if given), those with
+        an open circuit last.
+        """
+        if requested and requested != "auto":
+            return [(requested, self.clients[requested])] if requested in self.clients else []
+        order = [prefer] + [name for name in self.preference if name != prefer] if prefer else self.preference
+        names = [name for name in order if name in self.clients]
+        ready = [name for name in names if self.health[name].ready()]
+        return [(name, self.clients[name]) for name in ready + [name for name in names if name not in ready]]
+
+    def _hedge_delay(self, name: str, first_token: bool) -> float:
+        p95 = self.health[name].p95(first_token)
+        if p95 is None:
+            return self.hedge_max_delay
+        return min(self.hedge_max_delay, max(self.hedge_min_delay, p95 * self.hedge_multiplier))
+
+    # ------------------------------------------------------------------
+    # Unary calls
+    # ------------------------------------------------------------------
+
+    async def call(self, candidates: List[Candidate], fn: Callable[[str, Any], Awaitable[T]]) -> Tuple[str, T]:
+        """Run fn(name, client) on the first provider that succeeds; returns (name, result)"""
+        async def attempt(name: str, client: Any) -> T:
+            started = time.monotonic()
+            try:
+                result = await fn(name, client)
+            except asyncio.CancelledError:
+                self.health[name].release()
+                raise
+            except Exception as e:
+                if is_provider_error(e):
+                    self.health[name].record_failure(e)
+                raise
+            self.health[name].record_success(time.monotonic() - started)
+            return result
+
+        return await self._race(candidates, attempt, False)
+
+    # ------------------------------------------------------------------
+    # Streams
+    # ------------------------------------------------------------------
+
+    async def stream(
+        self,
+        candidates: List[Candidate],
+        open_stream: Callable[[str, Any], AsyncIterator[str]]
+    ) -> Tuple[str, AsyncIterator[str]]:
+        """
+        Open open_stream(name, client) on the first provider that produces a token.
+        Failover and hedging only happen before the first token; after that the
+        stream is committed and errors propagate.
+        """
+        async def attempt(name: str, client: Any) -> Tuple[AsyncIterator[str], Optional[str], float]:
+            started = time.monotonic()
+            iterator = open_stream(name, client).__aiter__()
+            try:
+                first: Optional[str] = await iterator.__anext__()
+            except StopAsyncIteration:
+                first = None
+            except asyncio.CancelledError:
+                self.health[name].release()
+                await _aclose(iterator)
+                raise
+            except Exception as e:
+                if is_provider_error(e):
+                    self.health[name].record_failure(e)
+                raise
+            self.health[name].record_first_token(time.monotonic() - started)
+            return iterator, first, started
+
+        async def discard(opened: Tuple[AsyncIterator[str], Optional[str], float]):
+            await _aclose(opened[0])
+
+        name, (iterator, first, started) = await self._race(candidates, attempt, True, discard)
+        health = self.health[name]
+
+        async def relay() -> AsyncIterator[str]:
+            try:
+                if first is None:
+                    health.record_success(time.monotonic() - started)
+                    return
+                yield first
+                async for delta in iterator:
+                    yield delta
+            except (asyncio.CancelledError, GeneratorExit):
+                health.release()
+                raise
+            except Exception as e:
+                if is_provider_error(e):
+                    health.record_failure(e)
+                raise
+            else:
+                health.record_success(time.monotonic() - started)
+            finally:
+                await _aclose(iterator)
+
+        return name, relay()
+
+    # ------------------------------------------------------------------
+    # Failover + hedging
+    # ------------------------------------------------------------------
+
+    async def _race(
+        self,
+        candidates: List[Candidate],
+        attempt: Callable[[str, Any], Awaitable[T]],
+        first_token: bool,
+        discard: Optional[Callable[[T], Awaitable[None]]] = None
+    ) -> Tuple[str, T]:
+        """Try candidates in order, starting the next early when hedging; discard() losers' results"""
+        if not candidates:
+            raise NoProviderAvailableError("No AI provider configured")
+        # Providers with an open circuit are skipped, unless none is left to try at all
+        pending = [candidate for candidate in candidates if self.health[candidate[0]].ready()] or candidates[:1]
+        running: Dict[asyncio.Task, str] = {}
+        last_error: Optional[BaseException] = None
+        hedged = False
+
+        def launch():
+            name, client = pending.pop(0)
+            self.health[name].acquire()
+            running[asyncio.create_task(attempt(name, client))] = name
+
+        launch()
+        try:
+            while running:
+                timeout = None
+                if self.hedge and pending and len(running) == 1:
+                    timeout = self._hedge_delay(next(iter(running.values())), first_token)
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self.hedges += 1
+                    hedged = True
+                    logger.info(f"⏱️  {next(iter(running.values()))} slower than {timeout:.1f}s, hedging with {pending[0][0]}")
+                    launch()
+                    continue
+                for task in done:
+                    name = running.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        if hedged and name != candidates[0][0]:
+                            self.hedge_wins += 1
+                        return name, task.result()
+                    if not is_provider_error(error):
+                        raise error
+                    logger.warning(f"⚠️  Provider {name} failed: {error}")
+                    last_error = error
+                if not running and pending:
+                    self.failovers += 1
+                    logger.warning(f"🔀 Failing over to {pending[0][0]}")
+                    launch()
+            raise NoProviderAvailableError(f"All AI providers failed: {last_error}") from last_error
+        finally:
+            for task in running:
+                task.cancel()
+            for result in await asyncio.gather(*running, return_exceptions=True):
+                # A loser that finished in the same instant as the winner
+                if discard and not isinstance(result, BaseException):
+                    await discard(result)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "providers": {name: health.stats() for name, health in self.health.items() if name in self.clients},
+            "hedging": self.hedge,
+            "failovers": self.failovers,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins
+        }
+
+
+async def _aclose(iterator: Any):
+    close = getattr(iterator, "aclose", None)
+    if close:
+        try:
+            await close()
+        except Exception:
+            pass
@@ -0,0 +1,283 @@
+"""
+Rate Limiter
+Sliding-window counter rate limiting with O(1) work per request.
+
+Each key keeps two counters: hits in the current fixed window and hits in
+the previous one. The number of hits in the sliding window ending now is
+estimated as
+
+    previous * (fraction of the previous window still inside the sliding one)
+    + current
+
+so a check is a few arithmetic operations whatever the limit (a 10k/hour
+key costs the same as a 10/hour one), and memory is constant per key. Keys
+idle for two full windows hold nothing and are dropped by a sweep that runs
+at most every `sweep_interval` seconds.
+
+The estimate assumes the previous window's hits were evenly spread; it can
+be off by a fraction of one window's traffic, never by more than `limit`.
+
+ClusterRateLimiter runs the same algorithm in Redis, as one Lua script per
+check (a single round trip, atomic across every worker and node), with the
+clock taken from Redis. While Redis is unreachable it falls back to an
+in-process SlidingWindowLimiter, so limits degrade to per-worker instead of
+failing open or closed.
+"""
+
+import logging
+import math
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import redis.asyncio as redis
+
+logger = logging.getLogger(__name__)
+
+# KEYS[1] = counter hash; ARGV = limit, window (whole seconds), cost, force.
+# force=1 adds cost (which may be negative) without checking the limit.
+# Returns allowed, then now/start/current/previous as strings (Lua would truncate floats)
+_HIT_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local force = ARGV[4] == '1'
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local start = tonumber(clock[1]) - (tonumber(clock[1]) % window)
+
+local state = redis.call('HMGET', KEYS[1], 'start', 'current', 'previous')
+local saved = tonumber(state[1])
+local current = tonumber(state[2]) or 0
+local previous = tonumber(state[3]) or 0
+if saved == nil then
+    current, previous = 0, 0
+elseif saved ~= start then
+    if start - saved == window then previous = current else previous = 0 end
+    current = 0
+end
+
+local allowed = 0
+if force or previous * (1 - (now - start) / window) + current + cost <= limit then
+    allowed = 1
+    redis.call('HSET', KEYS[1], 'start', start, 'current', math.max(0, current + cost), 'previous', previous)
+    redis.call('PEXPIRE', KEYS[1], math.ceil((start + 2 * window - now) * 1000))
+end
+return {allowed, tostring(now), tostring(start), tostring(current), tostring(previous)}
+"""
+
+
+@dataclass
+class RateLimitResult:
+    allowed: bool
+    used: int          # Estimated hits in the sliding window, this one included if allowed
+    limit: int
+    remaining: int
+    reset_at: float    # Epoch seconds when a denied hit would be allowed / the window rolls over
+
+    @property
+    def retry_after(self) -> int:
+        return max(0, math.ceil(self.reset_at - time.time()))
+
+
+def _decide(now: float, start: float, current: float, previous: float, window: float, limit: int, cost: int) -> RateLimitResult:
+    """Apply the sliding-window estimate to counters read before this hit"""
+    estimated = previous * (1.0 - (now - start) / window) + current
+    if estimated + cost <= limit:
+        used = math.ceil(estimated + cost)
+        return RateLimitResult(True, used, limit, max(0, limit - used), start + window)
+    return RateLimitResult(False, math.ceil(estimated), limit, 0,
+                           _retry_at(start, current, previous, window, limit, cost))
+
+
+def _retry_at(start: float, current: float, previous: float, window: float, limit: int, cost: int) -> float:
+    """Earliest time `cost` more hits fit, assuming no other hits meanwhile"""
+    if current + cost <= limit and previous > 0:
+        # The previous window's share decays enough before this window ends
+        return start + window * (1.0 - (limit - current - cost) / previous)
+    if cost <= limit and current > 0:
+        # Next window: this window's hits become the decaying share
+        return start + window + window * max(0.0, 1.0 - (limit - cost) / current)
+    return start + window
+
+
+class SlidingWindowLimiter:
+    """In-process sliding-window counters keyed by caller"""
+
+    def __init__(self, sweep_interval: float = 60.0):
+        self.sweep_interval = sweep_interval
+        # key -> [window_start, current, previous, window]
+        self._counters: Dict[str, List[float]] = {}
+        self._last_sweep = time.time()
+        self.allowed = 0
+        self.denied = 0
+        self.swept = 0
+
+    def hit(self, key: str, limit: int, window: float, cost: int = 1, now: Optional[float] = None) -> RateLimitResult:
+        """Count `cost` hits against key unless that would exceed limit per window"""
+        now = time.time() if now is None else now
+        if now - self._last_sweep >= self.sweep_interval:
+            self.sweep(now)
+
+        counter = self._counter(key, window, now)
+        start, current, previous, _ = counter
+
+        result = _decide(now, start, current, previous, window, limit, cost)
+        if result.allowed:
+            counter[1] = current + cost
+            self.allowed += 1
+        else:
+            self.denied += 1
+        return result
+
+    def peek(self, key: str, limit: int, window: float, now: Optional[float] = None) -> RateLimitResult:
+        """Current usage of key, without counting a hit"""
+        now = time.time() if now is None else now
+        start, current, previous, _ = self._counter(key, window, now)
+        return _decide(now, start, current, previous, window, limit, 0)
+
+    def adjust(self, key: str, delta: float, window: float, now: Optional[float] = None):
+        """Add (or with a negative delta, give back) hits without checking the limit"""
+        now = time.time() if now is None else now
+        counter = self._counter(key, window, now)
+        counter[1] = max(0.0, counter[1] + delta)
+
+    def _counter(self, key: str, window: float, now: float) -> List[float]:
+        start = now - (now % window)
+        counter = self._counters.get(key)
+        if counter is None or counter[3] != window:
+            counter = self._counters[key] = [start, 0.0, 0.0, window]
+        elif start != counter[0]:
+            # One window later the current count becomes the previous one; later than that both are 0
+            counter[2] = counter[1] if start - counter[0] == window else 0.0
+            counter[1] = 0.0
+            counter[0] = start
+        return counter
+
+    def sweep(self, now: Optional[float] = None):
+        """Drop keys with no hits in their current or previous window"""
+        now = time.time() if now is None else now
+        idle = [key for key, (start, _, _, window) in self._counters.items() if now - start >= 2 * window]
+        for key in idle:
+            del self._counters[key]
+        self.swept += len(idle)
+        self._last_sweep = now
+
+    def reset(self, key: Optional[str] = None):
+        """Forget one key, or every key"""
+        if key is None:
+            self._counters.clear()
+        else:
+            self._counters.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._counters)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "keys": len(self._counters),
+            "allowed": self.allowed,
+            "denied": self.denied,
+            "swept": self.swept
+        }
+
+
+class ClusterRateLimiter:
+    """Sliding-window limits shared through Redis, per-process while Redis is down"""
+
+    def __init__(self, prefix: str = "ratelimit", sweep_interval: float = 60.0):
+        self.prefix = prefix
+        self.local = SlidingWindowLimiter(sweep_interval=sweep_interval)
+        self.redis: Optional[redis.Redis] = None
+        self._script = None
+        self._degraded = False
+        self.allowed = 0
+        self.denied = 0
+        self.fallbacks = 0
+
+    def attach(self, redis_client: Optional[redis.Redis]):
+        """Count hits in Redis (None = in-process only)"""
+        self.redis = redis_client
+        self._script = redis_client.register_script(_HIT_SCRIPT) if redis_client else None
+
+    async def hit(self, key: str, limit: int, window: int, cost: int = 1) -> RateLimitResult:
+        """Count `cost` hits against key unless that would exceed limit per window"""
+        if not self._script:
+            return self.local.hit(key, limit, window, cost)
+        counters = await self._run(key, limit, window, cost, force=False)
+        if counters is None:
+            return self.local.hit(key, limit, window, cost)
+        allowed, now, start, current, previous = counters
+
+        result = _decide(now, start, current, previous, window, limit, cost)
+        if result.allowed != bool(allowed):
+            # Lua and Python rounded an exact-boundary estimate differently; Redis decided
+            if allowed:
+                result = RateLimitResult(True, limit, limit, 0, start + window)
+            else:
+                result = RateLimitResult(False, limit, limit, 0, _retry_at(start, current, previous, window, limit, cost))
+        if result.allowed:
+            self.allowed += 1
+        else:
+            self.denied += 1
+        return result
+
+    async def peek(self, key: str, limit: int, window: int) -> RateLimitResult:
+        """Current usage of key, without counting a hit"""
+        if self._script:
+            counters = await self._run(key, limit, window, 0, force=False)
+            if counters is not None:
+                _, now, start, current, previous = counters
+                return _decide(now, start, current, previous, window, limit, 0)
+        return self.local.peek(key, limit, window)
+
+    async def adjust(self, key: str, delta: int, window: int):
+        """Add (or with a negative delta, give back) hits without checking the limit"""
+        if not self._script or await self._run(key, 0, window, delta, force=True) is None:
+            self.local.adjust(key, delta, window)
+
+    async def _run(self, key: str, limit: int, window: int, cost: int, force: bool) -> Optional[Tuple[int, float, float, float, float]]:
+        """Run the Lua script; None if Redis failed"""
+        try:
+            allowed, now, start, current, previous = await self._script(
+                keys=[f"{self.prefix}:{key}"], args=[limit, int(window), cost, 1 if force else 0]
+            )
+        except Exception as e:
+            self.fallbacks += 1
+            if not self._degraded:
+                self._degraded = True
+                logger.error(f"❌ Redis rate limiting failed, limiting per process: {e}")
+            return None
+        if self._degraded:
+            self._degraded = False
+            logger.info("✅ Redis rate limiting restored")
+        return int(allowed), float(now), float(start), float(current), float(previous)
+
+    async def reset(self, key: Optional[str] = None):
+        """Forget one key, or every key"""
+        self.local.reset(key)
+        if not self.redis:
+            return
+        try:
+            if key is not None:
+                await self.redis.delete(f"{self.prefix}:{key}")
+                return
+            batch = []
+            async for redis_key in self.redis.scan_iter(match=f"{self.prefix}:*", count=500):
+                batch.append(redis_key)
+                if len(batch) >= 500:
+                    await self.redis.unlink(*batch)
+                    batch = []
+            if batch:
+                await self.redis.unlink(*batch)
+        except Exception as e:
+            logger.warning(f"⚠️  Redis rate limit reset failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "redis" if self.redis and not self._degraded else "local",
+            "allowed": self.allowed,
+            "denied": self.denied,
+            "fallbacks": self.fallbacks,
+            "local": self.local.stats()
+        }
@@ -0,0 +1,195 @@
+"""
+Response Cache
+Two-tier cache: a bounded in-process LRU in front of Redis.
+
+The local tier holds at most `max_entries` values and `max_bytes` of their
+JSON size; the least recently used entries are evicted first, and expired
+entries are dropped as soon as they are met (reads, writes, evictions).
+With a Redis client, every write also goes to `{prefix}:{key}` with the same
+TTL, so all uvicorn workers (and nodes) share hits; a local miss falls back
+to Redis and refills the local tier. Without Redis, the cache is local only.
+
+Redis errors never raise - the cache degrades to the local tier.
+"""
+
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import redis.asyncio as redis
+
+logger = logging.getLogger(__name__)
+
+
+def _size_of(value: Any) -> Tuple[int, str]:
+    """Return (bytes, JSON text) of a value"""
+    encoded = json.dumps(value, separators=(",", ":"), default=str)
+    return len(encoded.encode("utf-8")), encoded
+
+
+class ResponseCache:
+    """Bounded LRU with TTLs, optionally backed by Redis"""
+
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        max_bytes: int = 64 * 1024 * 1024,
+        default_ttl: int = 3600,
+        prefix: str = "cache"
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.prefix = prefix
+        self.redis: Optional[redis.Redis] = None
+        # key -> (value, expires_at, size); most recently used last
+        self._entries: "OrderedDict[str, Tuple[Any, float, int]]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def attach(self, redis_client: Optional[redis.Redis]):
+        """Share entries through Redis (None = local only)"""
+        self.redis = redis_client
+
+    def redis_key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+
+    # ---- local tier (sync; also used directly for in-process job fallbacks) ----
+
+    def get_local(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at, _ = entry
+        if expires_at <= time.time():
+            self._drop(key)
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set_local(self, key: str, value: Any, ttl: Optional[int] = None, size: Optional[int] = None) -> bool:
+        """Store in the local tier; False if the value alone exceeds max_bytes"""
+        if size is None:
+            size, _ = _size_of(value)
+        if key in self._entries:
+            self._drop(key)
+        if size > self.max_bytes:
+            return False
+        ttl = self.default_ttl if ttl is None else ttl
+        self._entries[key] = (value, time.time() + ttl, size)
+        self._bytes += size
+        self._evict()
+        return True
+
+    def update_local(self, key: str, **fields: Any) -> bool:
+        """Merge fields into a cached dict, keeping its expiry (False if not cached)"""
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= time.time():
+            return False
+        value, expires_at, _ = entry
+        value.update(fields)
+        self.set_local(key, value, ttl=max(0.0, expires_at - time.time()))
+        return True
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return self.get_local(key) is not None
+
+    def _drop(self, key: str):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def _evict(self):
+        # Oldest first: expired entries reached on the way are counted as expirations
+        now = time.time()
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            key, (_, expires_at, _) = next(iter(self._entries.items()))
+            self._drop(key)
+            if expires_at <= now:
+                self.expirations += 1
+            else:
+                self.evictions += 1
+
+    # ---- both tiers ----
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = self.get_local(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        if self.redis:
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    pipe.get(self.redis_key(key))
+                    pipe.ttl(self.redis_key(key))
+                    raw, ttl = await pipe.execute()
+                if raw is not None:
+                    value = json.loads(raw)
+                    self.set_local(key, value, ttl=ttl if ttl and ttl > 0 else None, size=len(raw))
+                    self.redis_hits += 1
+                    return value
+            except Exception as e:
+                logger.warning(f"⚠️  Redis cache get failed for {key}: {e}")
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        ttl = self.default_ttl if ttl is None else ttl
+        size, encoded = _size_of(value)
+        self.set_local(key, value, ttl=ttl, size=size)
+        if self.redis:
+            try:
+                await self.redis.set(self.redis_key(key), encoded, ex=ttl)
+            except Exception as e:
+                logger.warning(f"⚠️  Redis cache set failed for {key}: {e}")
+
+    async def delete(self, key: str):
+        if key in self._entries:
+            self._drop(key)
+        if self.redis:
+            try:
+                await self.redis.delete(self.redis_key(key))
+            except Exception as e:
+                logger.warning(f"⚠️  Redis cache delete failed for {key}: {e}")
+
+    async def clear(self):
+        """Empty the local tier and remove this cache's keys from Redis"""
+        self._entries.clear()
+        self._bytes = 0
+        if self.redis:
+            try:
+                batch = []
+                async for redis_key in self.redis.scan_iter(match=f"{self.prefix}:*", count=500):
+                    batch.append(redis_key)
+                    if len(batch) >= 500:
+                        await self.redis.unlink(*batch)
+                        batch = []
+                if batch:
+                    await self.redis.unlink(*batch)
+            except Exception as e:
+                logger.warning(f"⚠️  Redis cache clear failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.redis_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.redis_hits) / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "redis": self.redis is not None
+        }
@@ -0,0 +1,231 @@
+"""
+Semantic Cache
+Finds an earlier app generation whose description means the same thing.
+
+Descriptions are embedded locally - no model download, no API call. Words
+are lower-cased, stemmed and mapped through a small synonym table ("auth",
+"login" -> "authentication"), filler words ("build", "app") are dropped, words
+after a negation ("without", "no") are kept as distinct "not_" terms, and
+each word plus its character 4-grams is hashed into a signed, L2-normalised
+sparse vector. Each framework has its own index; an entry only matches
+requests with the same feature list, and a lookup returns the cache key of
+the most similar description at or above `threshold`.
+
+The generated app itself stays in the response cache under that key; this
+index only maps descriptions to keys. With Redis, index entries are also
+stored in the hash {prefix}:{framework} and each worker re-reads it every
+`sync_interval` seconds, so a generation on one worker is found by all.
+"""
+
+import hashlib
+import json
+import logging
+import math
+import re
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import redis.asyncio as redis
+
+logger = logging.getLogger(__name__)
+
+Vector = Dict[int, float]
+
+_WORD = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an the and or of for to with in on at by from that this which it is are be where can "
+    "i we you me my our your want need please build create make generate develop "
+    "app apps application applications website site web platform system tool simple basic".split()
+)
+_NEGATIONS = frozenset("no not without never except excluding nor".split())
+_CONJUNCTIONS = frozenset("and or".split())
+# Common spellings of the same thing in app descriptions
+_SYNONYMS = {
+    "auth": "authentication", "authenticate": "authentication", "login": "authentication",
+    "signin": "authentication", "signup": "authentication", "register": "authentication",
+    "todo": "task", "todos": "task", "ecommerce": "store", "shop": "store", "shopping": "store",
+    "commerce": "store", "basket": "cart", "db": "database",
+    "postgres": "database", "postgresql": "database", "admin": "dashboard", "graph": "chart",
+    "analytic": "analytics", "stat": "analytics", "statistic": "analytics", "posts": "post",
+    "article": "post", "msg": "message", "chat": "message", "messaging": "message",
+    "payment": "checkout", "pay": "checkout", "billing": "checkout", "user": "account",
+    "profile": "account", "img": "image", "photo": "image", "picture": "image"
+}
+
+
+def _stem(word: str) -> str:
+    if len(word) > 6 and word.endswith("ing"):
+        return word[:-3]
+    # "boxes" -> "box", but "messages" -> "message"
+    if len(word) > 4 and word.endswith("es") and word[:-2].endswith(("s", "x", "z", "ch", "sh")):
+        return word[:-2]
+    if len(word) > 4 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def _bucket(feature: str, dim: int) -> Tuple[int, float]:
+    digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+    value = int.from_bytes(digest, "little")
+    return value % dim, (1.0 if value >> 63 else -1.0)
+
+
+def _terms(text: str) -> List[str]:
+    terms = []
+    # "without auth and analytics": both terms are negated ("not_authentication", "not_analytics")
+    negated = False
+    for word in _WORD.findall(text.lower().replace("-", "")):
+        if word in _NEGATIONS:
+            negated = True
+            continue
+        if word in _STOPWORDS:
+            if word not in _CONJUNCTIONS:
+                negated = False
+            continue
+        word = _SYNONYMS.get(word, word)
+        word = _SYNONYMS.get(_stem(word), _stem(word))
+        if word not in _STOPWORDS:
+            terms.append(f"not_{word}" if negated else word)
+    return terms
+
+
+def embed(text: str, dim: int = 4096) -> Vector:
+    """Hashed bag of normalised words plus their character n-grams (unit length)"""
+    features: List[Tuple[str, float]] = []
+    for word in set(_terms(text)):
+        features.append((f"w:{word}", 1.0))
+        padded = f"<{word}>"
+        grams = [padded[start:start + 4] for start in range(max(1, len(padded) - 3))]
+        for gram in grams:
+            features.append((f"c:{gram}", 0.5 / len(grams)))
+
+    vector: Vector = {}
+    for feature, weight in features:
+        slot, sign = _bucket(feature, dim)
+        vector[slot] = vector.get(slot, 0.0) + sign * weight
+    norm = math.sqrt(sum(value * value for value in vector.values()))
+    if not norm:
+        return {}
+    return {slot: value / norm for slot, value in vector.items() if value}
+
+
+def cosine(a: Vector, b: Vector) -> float:
+    """Dot product of two unit vectors"""
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(value * b.get(slot, 0.0) for slot, value in a.items())
+
+
+def features_signature(features: Sequence[str]) -> str:
+    return "|".join(sorted(feature.strip().lower() for feature in features))
+
+
+class SemanticCache:
+    """Per-framework similarity index over cached generation keys"""
+
+    def __init__(
+        self,
+        threshold: float = 0.88,
+        max_entries: int = 2000,
+        sync_interval: float = 30.0,
+        dim: int = 4096,
+        prefix: str = "semcache"
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.sync_interval = sync_interval
+        self.dim = dim
+        self.prefix = prefix
+        self.redis: Optional[redis.Redis] = None
+        # framework -> {cache key: (vector, features signature, expires_at)}
+        self._index: Dict[str, Dict[str, Tuple[Vector, str, float]]] = {}
+        self._synced: Dict[str, float] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def attach(self, redis_client: Optional[redis.Redis]):
+        """Share the index through Redis (None = local only)"""
+        self.redis = redis_client
+
+    def redis_key(self, framework: str) -> str:
+        return f"{self.prefix}:{framework}"
+
+    async def lookup(self, framework: str, description: str, features: Sequence[str]) -> Optional[Tuple[str, float]]:
+        """Return (cache key, similarity) of the closest match above the threshold"""
+        await self._sync(framework)
+        query = embed(description, self.dim)
+        signature = features_signature(features)
+        now = time.time()
+        best: Optional[Tuple[str, float]] = None
+        for key, (vector, entry_signature, expires_at) in self._index.get(framework, {}).items():
+            if entry_signature != signature or expires_at <= now:
+                continue
+            score = cosine(query, vector)
+            if score >= self.threshold and (best is None or score > best[1]):
+                best = (key, score)
+        if best:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return best
+
+    async def add(self, framework: str, description: str, features: Sequence[str], key: str, ttl: int):
+        vector = embed(description, self.dim)
+        if not vector:
+            return
+        signature = features_signature(features)
+        expires_at = time.time() + ttl
+        self._put(framework, key, (vector, signature, expires_at))
+        if self.redis:
+            try:
+                entry = json.dumps({"v": [[slot, round(value, 5)] for slot, value in vector.items()],
+                                    "f": signature, "exp": expires_at})
+                await self.redis.hset(self.redis_key(framework), key, entry)
+                await self.redis.expire(self.redis_key(framework), ttl)
+            except Exception as e:
+                logger.warning(f"⚠️  Semantic cache index write failed: {e}")
+
+    def discard(self, framework: str, key: str):
+        """Forget a key whose cached generation is gone (Redis copy expires on its own)"""
+        self._index.get(framework, {}).pop(key, None)
+
+    def _put(self, framework: str, key: str, entry: Tuple[Vector, str, float]):
+        entries = self._index.setdefault(framework, {})
+        entries.pop(key, None)
+        entries[key] = entry
+        while len(entries) > self.max_entries:
+            entries.pop(next(iter(entries)))
+
+    async def _sync(self, framework: str):
+        if not self.redis or time.time() - self._synced.get(framework, 0.0) < self.sync_interval:
+            return
+        self._synced[framework] = time.time()
+        try:
+            raw_entries = await self.redis.hgetall(self.redis_key(framework))
+        except Exception as e:
+            logger.warning(f"⚠️  Semantic cache index sync failed: {e}")
+            return
+        now = time.time()
+        expired = []
+        for key, raw in raw_entries.items():
+            try:
+                entry = json.loads(raw)
+            except ValueError:
+                expired.append(key)
+                continue
+            if entry["exp"] <= now:
+                expired.append(key)
+            elif key not in self._index.get(framework, {}):
+                self._put(framework, key, ({slot: value for slot, value in entry["v"]}, entry["f"], entry["exp"]))
+        if expired:
+            try:
+                await self.redis.hdel(self.redis_key(framework), *expired)
+            except Exception as e:
+                logger.warning(f"⚠️  Semantic cache index cleanup failed: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": sum(len(entries) for entries in self._index.values()),
+            "hits": self.hits,
+            "misses": self.misses
+        }
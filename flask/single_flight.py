@@ -0,0 +1,164 @@
+"""
+Single Flight
+Coalesces identical in-flight AI requests into one provider call.
+
+Within a process, callers with the same key await one shared task; the
+work keeps running if the caller that started it disconnects. Across
+workers, the process that wins the Redis lock {prefix}:{key}:lock runs the
+call, stores the result in {prefix}:{key}:result for `result_ttl` seconds
+and announces it on the {prefix}:{key} channel (through a JobEventBus, so a
+process holds one pub/sub connection however many keys it waits on). The
+others wait for that announcement - checking the lock every few seconds in
+case it was missed or the leader died - and read the stored result.
+
+If the leader fails, a waiting worker takes the lock and runs the call
+itself; if waiting takes longer than `wait_timeout`, it stops waiting and
+runs the call. Results must be JSON-serialisable. Without Redis, requests
+are only coalesced within the process.
+"""
+
+import asyncio
+import json
+import logging
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import redis.asyncio as redis
+
+from job_events import JobEventBus
+
+logger = logging.getLogger(__name__)
+
+# Delete the lock only if this worker still holds it
+_RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """Run one call per key at a time, sharing its result with every caller"""
+
+    def __init__(
+        self,
+        prefix: str = "singleflight",
+        lock_ttl: float = 300.0,
+        wait_timeout: float = 300.0,
+        result_ttl: int = 30,
+        check_interval: float = 5.0
+    ):
+        self.prefix = prefix
+        self.lock_ttl = lock_ttl
+        self.wait_timeout = wait_timeout
+        self.result_ttl = result_ttl
+        self.check_interval = check_interval
+        self.redis: Optional[redis.Redis] = None
+        self.events = JobEventBus(channel_prefix=prefix)
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.leads = 0
+        self.coalesced = 0
+        self.remote_hits = 0
+
+    async def start(self, redis_client: Optional[redis.Redis]):
+        """Coalesce across workers when a client is given, in-process otherwise"""
+        self.redis = redis_client
+        await self.events.start(redis_client)
+
+    async def stop(self):
+        await self.events.stop()
+        self.redis = None
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Return fn()'s result, sharing one call among concurrent callers of key"""
+        task = self._inflight.get(key)
+        if task:
+            self.coalesced += 1
+            logger.info(f"🔗 Joined in-flight request: {key}")
+        else:
+            task = asyncio.create_task(self._run(key, fn))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        return await asyncio.shield(task)
+
+    def _finished(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # Retrieved here in case every caller went away
+
+    async def _run(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.redis:
+            self.leads += 1
+            return await fn()
+
+        lock_key = f"{self.prefix}:{key}:lock"
+        result_key = f"{self.prefix}:{key}:result"
+        while True:
+            token = uuid.uuid4().hex
+            try:
+                acquired = await self.redis.set(lock_key, token, nx=True, px=int(self.lock_ttl * 1000))
+            except Exception as e:
+                logger.warning(f"⚠️  Single-flight lock failed for {key}, calling directly: {e}")
+                self.leads += 1
+                return await fn()
+            if acquired:
+                return await self._lead(key, fn, lock_key, result_key, token)
+
+            try:
+                value = await self._follow(key, lock_key, result_key)
+            except Exception as e:
+                logger.warning(f"⚠️  Single-flight wait failed for {key}, calling directly: {e}")
+                self.leads += 1
+                return await fn()
+            if value is not None:
+                self.remote_hits += 1
+                logger.info(f"🔗 Used result of another worker's request: {key}")
+                return value
+            # Leader failed or its result expired; try to take over
+
+    async def _lead(self, key: str, fn: Callable[[], Awaitable[Any]], lock_key: str, result_key: str, token: str) -> Any:
+        self.leads += 1
+        event = "failed"
+        try:
+            value = await fn()
+            try:
+                await self.redis.set(result_key, json.dumps(value), ex=self.result_ttl)
+                event = "done"
+            except Exception as e:
+                logger.warning(f"⚠️  Single-flight result store failed for {key}: {e}")
+            return value
+        finally:
+            try:
+                await self.redis.eval(_RELEASE_SCRIPT, 1, lock_key, token)
+            except Exception as e:
+                logger.warning(f"⚠️  Single-flight unlock failed for {key}: {e}")
+            await self.events.publish(key, event, {})
+
+    async def _follow(self, key: str, lock_key: str, result_key: str) -> Optional[Any]:
+        """Wait for the lock holder; its stored result, or None if it left none"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.wait_timeout
+        async with self.events.subscribe(key) as queue:
+            # Subscribed first, so a leader finishing now is either seen here or announced
+            while await self.redis.exists(lock_key):
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise TimeoutError(f"no result after {self.wait_timeout:.0f}s")
+                try:
+                    await asyncio.wait_for(queue.get(), timeout=min(self.check_interval, remaining))
+                    break
+                except asyncio.TimeoutError:
+                    continue
+        raw = await self.redis.get(result_key)
+        return json.loads(raw) if raw is not None else None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._inflight),
+            "leads": self.leads,
+            "coalesced": self.coalesced,
+            "remote_hits": self.remote_hits,
+            "transport": "redis" if self.redis else "memory"
+        }
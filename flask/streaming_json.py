@@ -0,0 +1,203 @@
+"""
+Streaming JSON
+Incremental parser for multi-file AI generation output.
+
+The models answer with one JSON object shaped like
+    {"files": [{"path": ..., "content": ..., "language": ...}, ...], "instructions": ...}
+StreamingFilesParser consumes the completion chunk by chunk and hands back each
+files[] entry the moment its closing brace arrives. It only buffers the file
+currently being written plus the small non-file "skeleton" of the document,
+never the whole escaped output.
+"""
+
+import json
+import logging
+import re
+from typing import Any, Dict, List, Optional
+
+from json_extract import extract_json
+
+logger = logging.getLogger(__name__)
+
+# Inside a string only quotes and backslashes matter; outside only structure does
+_STRING_SPECIAL = re.compile(r'["\\]')
+_STRUCTURAL = re.compile(r'[{}\[\]"]')
+
+
+class StreamingFilesParser:
+    """Emit files[] entries from a streamed JSON completion as soon as they close"""
+
+    def __init__(self, array_key: str = "files"):
+        self.array_key = array_key
+        self.files: List[Dict[str, Any]] = []
+        self.repairs = 0   # Pieces json.loads rejected and had to be repaired
+        self.skipped = 0   # Entries dropped as unparseable
+
+        self._started = False        # Seen the opening brace of the document
+        self._done = False           # Top-level object closed
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+        self._skeleton: List[str] = []            # Document minus files[] entries
+        self._element: Optional[List[str]] = None  # Entry currently being written
+        self._in_array = False
+        self._array_depth = 0
+        self._saw_array = False
+
+        self._key_parts: Optional[List[str]] = None
+        self._last_key: Optional[str] = None
+
+    @property
+    def complete(self) -> bool:
+        """True once the top-level object has been closed (i.e. output was not truncated)"""
+        return self._done
+
+    def _loads(self, raw: str) -> Any:
+        """Parse JSON allowing raw control characters in strings, repairing as a last resort"""
+        try:
+            return json.loads(raw, strict=False)
+        except json.JSONDecodeError:
+            self.repairs += 1
+            return extract_json(raw).value
+
+    def _write(self, text: str):
+        if not text:
+            return
+        if self._element is not None:
+            self._element.append(text)
+        elif not self._in_array:
+            self._skeleton.append(text)
+        # Commas and whitespace between array entries are dropped
+
+    def _close_element(self) -> Optional[Dict[str, Any]]:
+        raw = "".join(self._element)
+        self._element = None
+        try:
+            entry = self._loads(raw)
+        except Exception as e:
+            self.skipped += 1
+            logger.warning(f"Skipping unparseable {self.array_key}[] entry: {e}")
+            return None
+        if not isinstance(entry, dict):
+            self.skipped += 1
+            logger.warning(f"Skipping non-object {self.array_key}[] entry")
+            return None
+        self.files.append(entry)
+        return entry
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Consume the next piece of output and return the entries it completed"""
+        emitted: List[Dict[str, Any]] = []
+        i, n = 0, len(chunk)
+
+        while i < n and not self._done:
+            if not self._started:
+                # Skip markdown fences or prose before the document starts
+                start = chunk.find("{", i)
+                if start < 0:
+                    break
+                self._started = True
+                i = start
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                    self._write(chunk[i])
+                    if self._key_parts is not None:
+                        self._key_parts.append(chunk[i])
+                    i += 1
+                    continue
+
+                match = _STRING_SPECIAL.search(chunk, i)
+                end = match.start() if match else n
+                self._write(chunk[i:end + 1] if match else chunk[i:])
+                if self._key_parts is not None:
+                    self._key_parts.append(chunk[i:end])
+                if not match:
+                    break
+
+                if chunk[end] == "\\":
+                    self._escape = True
+                    if self._key_parts is not None:
+                        self._key_parts.append("\\")
+                else:
+                    self._in_string = False
+                    if self._key_parts is not None:
+                        try:
+                            self._last_key = json.loads(f'"{"".join(self._key_parts)}"', strict=False)
+                        except json.JSONDecodeError:
+                            self._last_key = None
+                        self._key_parts = None
+                i = end + 1
+                continue
+
+            match = _STRUCTURAL.search(chunk, i)
+            if not match:
+                self._write(chunk[i:])
+                break
+
+            pos = match.start()
+            self._write(chunk[i:pos])
+            char = chunk[pos]
+            i = pos + 1
+
+            if char == '"':
+                self._write(char)
+                self._in_string = True
+                if self._depth == 1 and not self._in_array:
+                    self._key_parts = []
+
+            elif char in "{[":
+                if self._in_array and self._element is None and self._depth == self._array_depth and char == "{":
+                    self._element = [char]
+                elif (char == "[" and self._depth == 1 and not self._saw_array
+                      and self._last_key == self.array_key):
+                    self._write(char)
+                    self._in_array = True
+                    self._saw_array = True
+                    self._array_depth = self._depth + 1
+                else:
+                    self._write(char)
+                self._depth += 1
+
+            else:  # closing } or ]
+                self._depth -= 1
+                if self._element is not None and self._depth == self._array_depth:
+                    self._element.append(char)
+                    entry = self._close_element()
+                    if entry is not None:
+                        emitted.append(entry)
+                elif self._in_array and self._element is None and self._depth == self._array_depth - 1:
+                    self._in_array = False
+                    self._write(char)
+                else:
+                    self._write(char)
+                    if self._depth == 0:
+                        self._done = True
+
+        return emitted
+
+    def finish(self) -> Dict[str, Any]:
+        """
+        Return the whole document with every emitted entry under array_key.
+
+        Truncated output is tolerated: the skeleton is repaired and any entry
+        that never closed is dropped (check `complete` to detect this).
+
+        Raises:
+            ValueError: If no JSON object was found in the stream
+        """
+        if not self._started:
+            raise ValueError("no JSON object found in streamed output")
+
+        skeleton = "".join(self._skeleton)
+        if self._in_array:
+            skeleton += "]"  # Array was cut off mid-stream
+        document = self._loads(skeleton)
+        if not isinstance(document, dict):
+            raise ValueError("streamed output is not a JSON object")
+
+        if self._saw_array:
+            document[self.array_key] = self.files
+        return document
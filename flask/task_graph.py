@@ -0,0 +1,167 @@
+"""
+Task Graph
+Dependency-aware async scheduler used by multi-step pipelines.
+Each task starts as soon as every task it depends on has finished, so
+independent steps overlap instead of waiting on each other.
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, Type
+
+# A task receives the results of all tasks completed so far (keyed by name)
+TaskFn = Callable[[Dict[str, Any]], Awaitable[Any]]
+TaskHook = Callable[[str], Awaitable[None]]
+TaskDoneHook = Callable[[str, Any], Awaitable[None]]
+
+
+@dataclass
+class GraphTask:
+    """A single node in the graph"""
+    name: str
+    fn: TaskFn
+    deps: List[str] = field(default_factory=list)
+    retries: int = 0
+    retry_on: Tuple[Type[BaseException], ...] = (Exception,)
+    backoff: float = 0.5
+
+
+@dataclass
+class TaskStats:
+    """Outcome of one task in the last run()"""
+    status: str = "pending"  # pending | running | completed | failed | cancelled | skipped
+    attempts: int = 0
+    duration_ms: int = 0
+
+
+class TaskGraph:
+    """Run async tasks as soon as their dependencies are satisfied"""
+
+    def __init__(self):
+        self._tasks: Dict[str, GraphTask] = {}
+        self.stats: Dict[str, TaskStats] = {}
+
+    def add(
+        self,
+        name: str,
+        fn: TaskFn,
+        deps: Iterable[str] = (),
+        retries: int = 0,
+        retry_on: Tuple[Type[BaseException], ...] = (Exception,),
+        backoff: float = 0.5
+    ) -> "TaskGraph":
+        """
+        Register a task. Dependencies may be registered later, but must exist before run().
+
+        A task failing with one of retry_on is retried up to `retries` more times,
+        waiting backoff * 2^n seconds between attempts.
+        """
+        if name in self._tasks:
+            raise ValueError(f"Task '{name}' is already registered")
+        self._tasks[name] = GraphTask(
+            name=name, fn=fn, deps=list(deps), retries=retries, retry_on=retry_on, backoff=backoff
+        )
+        return self
+
+    @property
+    def names(self) -> List[str]:
+        """Task names in registration order"""
+        return list(self._tasks)
+
+    async def _execute(self, task: GraphTask, results: Dict[str, Any]) -> Any:
+        stats = self.stats[task.name]
+        stats.status = "running"
+        started = time.perf_counter()
+        try:
+            while True:
+                stats.attempts += 1
+                try:
+                    result = await task.fn(results)
+                    stats.status = "completed"
+                    return result
+                except task.retry_on:
+                    if stats.attempts > task.retries:
+                        raise
+                    await asyncio.sleep(task.backoff * 2 ** (stats.attempts - 1))
+        except asyncio.CancelledError:
+            stats.status = "cancelled"
+            raise
+        except Exception:
+            stats.status = "failed"
+            raise
+        finally:
+            stats.duration_ms = int((time.perf_counter() - started) * 1000)
+
+    def _validate(self, completed: Iterable[str]):
+        known = set(self._tasks) | set(completed)
+        for task in self._tasks.values():
+            missing = [d for d in task.deps if d not in known]
+            if missing:
+                raise ValueError(f"Task '{task.name}' depends on unknown task(s): {missing}")
+
+    async def run(
+        self,
+        on_start: Optional[TaskHook] = None,
+        on_complete: Optional[TaskDoneHook] = None,
+        completed: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Execute the graph and return every task result keyed by task name.
+        Per-task status, attempts and duration are left in self.stats.
+
+        Args:
+            on_start: Awaited right before a task is launched
+            on_complete: Awaited with (name, result) once a task finishes
+            completed: Results that are already known; matching tasks are skipped
+
+        Raises:
+            The first exception raised by any task (remaining tasks are cancelled)
+            ValueError: If the graph has unknown dependencies or a cycle
+        """
+        results: Dict[str, Any] = dict(completed or {})
+        self._validate(results)
+        self.stats = {
+            name: TaskStats(status="skipped" if name in results else "pending")
+            for name in self._tasks
+        }
+
+        pending = {name: task for name, task in self._tasks.items() if name not in results}
+        running: Dict[asyncio.Task, str] = {}
+
+        try:
+            while pending or running:
+                ready = [
+                    task for task in pending.values()
+                    if all(dep in results for dep in task.deps)
+                ]
+                for task in ready:
+                    del pending[task.name]
+                    if on_start:
+                        await on_start(task.name)
+                    running[asyncio.create_task(self._execute(task, results))] = task.name
+
+                if not running:
+                    raise ValueError(f"Task graph has a dependency cycle: {sorted(pending)}")
+
+                done, _ = await asyncio.wait(running.keys(), return_when=asyncio.FIRST_COMPLETED)
+                # Every task that succeeded is recorded (and on_complete'd) before a failure
+                # finishing at the same time is re-raised
+                failed: Optional[asyncio.Task] = None
+                for finished in done:
+                    name = running.pop(finished)
+                    if finished.cancelled() or finished.exception() is not None:
+                        failed = failed or finished
+                        continue
+                    results[name] = finished.result()
+                    if on_complete:
+                        await on_complete(name, results[name])
+                if failed:
+                    failed.result()  # Re-raises the task's failure
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+
+        return results
@@ -0,0 +1,161 @@
+"""
+Tests for the two JSON state machines that read model output:
+json_extract.extract_json (whole documents) and
+streaming_json.StreamingFilesParser (chunk by chunk).
+
+    cd flask && python -m pytest tests
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from json_extract import decode_json, extract_json  # noqa: E402
+from streaming_json import StreamingFilesParser  # noqa: E402
+
+
+def make_document(contents, instructions="npm install && npm run dev"):
+    files = [{"path": f"f{n}.js", "content": content, "language": "javascript"} for n, content in enumerate(contents)]
+    return {"files": files, "instructions": instructions}
+
+
+def stream(text, chunk_size):
+    parser = StreamingFilesParser()
+    emitted = []
+    for start in range(0, len(text), chunk_size):
+        emitted.extend(parser.feed(text[start:start + chunk_size]))
+    return parser, emitted
+
+
+# ----------------------------------------------------------------------
+# extract_json
+# ----------------------------------------------------------------------
+
+def test_clean_document_inside_fences_and_prose():
+    document = make_document(["let a = 1;\n"])
+    extracted = extract_json(f"Here you go:\n```json\n{json.dumps(document)}\n```\nEnjoy!")
+    assert extracted.value == document
+    assert not extracted.repaired and not extracted.truncated
+
+
+def test_unescaped_quotes_inside_content():
+    document = make_document(["let a = 1;\n", 'const s = "oops;\nif (x) { y(); }', "let c = 3;\n", "let d = 4;\n"])
+    text = json.dumps(document).replace(
+        json.dumps(document["files"][1]["content"]), '"const s = "oops;\\nif (x) { y(); }"'
+    )
+    extracted = extract_json(text)
+    assert extracted.value == document
+    assert extracted.repaired
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('[{"a":1},{"b":2}]', [{"a": 1}, {"b": 2}]),
+    ('Here: [1,2,{"x":3}]', [1, 2, {"x": 3}]),
+    ('```json\n[\n  {"path": "a.js"}\n]\n```', [{"path": "a.js"}]),
+    ('See [the docs] below: {"a": 1}', {"a": 1}),
+])
+def test_top_level_arrays(text, expected):
+    assert extract_json(text).value == expected
+    assert decode_json(text).value == expected
+
+
+def test_truncated_mid_key():
+    extracted = extract_json('{"files": [{"path": "a.js", "content": "x"}], "instruc')
+    assert extracted.truncated
+    assert extracted.value["files"] == [{"path": "a.js", "content": "x"}]
+
+
+def test_truncated_mid_string():
+    extracted = extract_json('{"files": [{"path": "a.js", "content": "x"}, {"path": "b.js", "content": "let b =')
+    assert extracted.truncated
+    assert extracted.value["files"][0] == {"path": "a.js", "content": "x"}
+    assert extracted.value["files"][1]["content"] == "let b ="
+
+
+def test_raw_control_characters_and_invalid_escapes():
+    text = '{"files": [{"path": "a.js", "content": "const re = /\\d+/;\n\tdone"}]}'
+    extracted = extract_json(text)
+    assert extracted.value["files"][0]["content"] == "const re = /\\d+/;\n\tdone"
+
+
+def test_no_document_raises():
+    with pytest.raises(ValueError):
+        extract_json("Sorry, I cannot help with that.")
+
+
+# ----------------------------------------------------------------------
+# StreamingFilesParser
+# ----------------------------------------------------------------------
+
+ESCAPES = 'quote \\" backslash \\\\ newline \\n unicode \\u00e9 slash \\/ done'
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7, 64])
+def test_chunk_boundaries_inside_escapes(chunk_size):
+    content = json.loads(f'"{ESCAPES}"')
+    document = make_document([content, content])
+    text = json.dumps(document)
+    parser, emitted = stream(text, chunk_size)
+    assert parser.complete
+    assert emitted == document["files"]
+    assert parser.finish() == document
+
+
+def test_split_at_every_position_of_an_escape():
+    document = make_document(['say "hi"\\ok\u00e9'])
+    text = json.dumps(document, ensure_ascii=True)
+    for cut in range(1, len(text)):
+        parser = StreamingFilesParser()
+        emitted = parser.feed(text[:cut]) + parser.feed(text[cut:])
+        assert emitted == document["files"], cut
+        assert parser.finish() == document, cut
+
+
+def test_escaped_array_key_is_recognised():
+    text = '{"fi\\u006ces": [{"path": "a.js", "content": "x"}], "instructions": "go"}'
+    parser, emitted = stream(text, 4)
+    assert emitted == [{"path": "a.js", "content": "x"}]
+    assert parser.finish()["instructions"] == "go"
+
+
+@pytest.mark.parametrize("tail", ['"instruc', '"instructions": "npm i', '"instructions": '])
+def test_truncated_after_files_keeps_them(tail):
+    files = make_document(["let a = 1;\n", "let b = 2;\n"])["files"]
+    text = '{"files": ' + json.dumps(files) + ', ' + tail
+    parser, emitted = stream(text, 9)
+    assert not parser.complete
+    assert emitted == files
+    assert parser.finish()["files"] == files
+
+
+def test_truncated_mid_file_drops_only_that_file():
+    files = make_document(["let a = 1;\n", "let b = 2;\n"])["files"]
+    text = '{"files": [' + json.dumps(files[0]) + ', {"path": "f1.js", "content": "let b'
+    parser, emitted = stream(text, 5)
+    assert not parser.complete
+    assert emitted == [files[0]]
+    assert parser.finish()["files"] == [files[0]]
+
+
+def test_unescaped_quote_leaves_parser_incomplete_for_full_reparse():
+    # The streaming parser cannot see through an unescaped quote; callers
+    # re-parse the whole output with extract_json when the model stopped normally
+    document = make_document(["let a = 1;\n", 'const s = "oops;\nif (x) { y(); }', "let c = 3;\n", "let d = 4;\n"])
+    text = json.dumps(document).replace(
+        json.dumps(document["files"][1]["content"]), '"const s = "oops;\\nif (x) { y(); }"'
+    )
+    parser, emitted = stream(text, 16)
+    assert not parser.complete
+    assert emitted == document["files"][:1]
+    assert extract_json(text).value == document
+
+
+def test_raw_newlines_in_content_are_accepted():
+    text = '{"files": [{"path": "a.js", "content": "line 1\nline 2"}]}'
+    parser, emitted = stream(text, 3)
+    assert parser.complete
+    assert emitted == [{"path": "a.js", "content": "line 1\nline 2"}]
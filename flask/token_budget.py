@@ -0,0 +1,149 @@
+"""
+Token Budget
+Per-tenant quotas on AI usage, measured in credits rather than requests.
+
+One credit is one token on a model with cost 10 (gpt-4o, Claude 3.5 Sonnet);
+cheaper models charge proportionally less (gpt-4o-mini: 0.5 credits per
+token). Budgets are per tier and per rolling window, enforced by the same
+sliding-window counters as the request limits (ClusterRateLimiter), so they
+are shared by every worker when Redis is up.
+
+A request first reserves its estimated credits - denied with the time the
+budget frees up if that would exceed the tier's budget - and settles once
+the provider reports usage: the difference is charged or refunded. A refund
+that lands after the window rolled over is given back in the new window.
+
+Settled usage is also added to a daily ledger per tenant
+({prefix}:{tenant}:{YYYY-MM-DD}: requests, tokens, credits, per-model tokens),
+kept `ledger_days` days in Redis or in process memory without it.
+"""
+
+import logging
+import math
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+import redis.asyncio as redis
+
+from rate_limiter import ClusterRateLimiter, RateLimitResult
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Reservation:
+    tenant: str
+    credits: int
+    window: int
+    result: Optional[RateLimitResult] = None  # None when rebuilt from a stored job
+
+
+class TokenBudget:
+    """Reserve, settle and account AI credits per tenant"""
+
+    def __init__(
+        self,
+        limiter: ClusterRateLimiter,
+        model_costs: Dict[str, int],
+        reference_cost: int = 10,
+        prefix: str = "usage",
+        ledger_days: int = 35
+    ):
+        self.limiter = limiter
+        self.model_costs = model_costs
+        self.reference_cost = reference_cost
+        self.prefix = prefix
+        self.ledger_days = ledger_days
+        self.redis: Optional[redis.Redis] = None
+        self._ledger: Dict[str, Dict[str, float]] = {}
+        self._ledger_day = ""
+
+    def attach(self, redis_client: Optional[redis.Redis]):
+        """Keep the ledger in Redis (None = in process)"""
+        self.redis = redis_client
+
+    def credits(self, model: Optional[str], tokens: int) -> int:
+        """Credits for tokens on a model (unknown models cost the reference rate)"""
+        cost = self.model_costs.get(model or "", self.reference_cost)
+        return math.ceil(tokens * cost / self.reference_cost)
+
+    @staticmethod
+    def _key(tenant: str) -> str:
+        return f"{tenant}:tokens"
+
+    async def reserve(self, tenant: str, budget: int, window: int, credits: int) -> Reservation:
+        """Hold credits up front; check reservation.result.allowed"""
+        result = await self.limiter.hit(self._key(tenant), budget, window, cost=credits)
+        return Reservation(tenant, credits if result.allowed else 0, window, result)
+
+    async def settle(self, reservation: Reservation, model: Optional[str], tokens: int):
+        """Replace the reserved credits with what the call actually used (never raises)"""
+        await self.settle_models(reservation, {model: tokens})
+
+    async def settle_models(self, reservation: Reservation, tokens_by_model: Dict[Optional[str], int]):
+        """settle() for work spread over several models: each is charged at its own rate"""
+        charges = {model: (tokens, self.credits(model, tokens)) for model, tokens in tokens_by_model.items()}
+        used = sum(credits for _, credits in charges.values())
+        try:
+            if used != reservation.credits:
+                await self.limiter.adjust(self._key(reservation.tenant), used - reservation.credits, reservation.window)
+            reservation.credits = used
+            for model, (tokens, credits) in charges.items():
+                if tokens:
+                    await self._record(reservation.tenant, model or "unknown", tokens, credits)
+        except Exception as e:
+            logger.error(f"❌ Token budget settle failed for {reservation.tenant}: {e}")
+
+    async def remaining(self, tenant: str, budget: int, window: int) -> RateLimitResult:
+        return await self.limiter.peek(self._key(tenant), budget, window)
+
+    def _ledger_key(self, tenant: str, day: str) -> str:
+        return f"{self.prefix}:{tenant}:{day}"
+
+    async def _record(self, tenant: str, model: str, tokens: int, credits: int):
+        key = self._ledger_key(tenant, datetime.utcnow().strftime("%Y-%m-%d"))
+        if self.redis:
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    pipe.hincrby(key, "requests", 1)
+                    pipe.hincrby(key, "tokens", tokens)
+                    pipe.hincrby(key, "credits", credits)
+                    pipe.hincrby(key, f"tokens:{model}", tokens)
+                    pipe.expire(key, self.ledger_days * 86400)
+                    await pipe.execute()
+                return
+            except Exception as e:
+                logger.warning(f"⚠️  Usage ledger write failed for {tenant}, keeping it in memory: {e}")
+        self._prune_ledger()
+        entry = self._ledger.setdefault(key, {})
+        for field, amount in (("requests", 1), ("tokens", tokens), ("credits", credits), (f"tokens:{model}", tokens)):
+            entry[field] = entry.get(field, 0) + amount
+
+    def _prune_ledger(self):
+        """Drop in-memory ledger days older than ledger_days (checked once a day)"""
+        today = datetime.utcnow().strftime("%Y-%m-%d")
+        if today == self._ledger_day:
+            return
+        self._ledger_day = today
+        cutoff = (datetime.utcnow() - timedelta(days=self.ledger_days)).strftime("%Y-%m-%d")
+        for key in [key for key in self._ledger if key.rsplit(":", 1)[1] < cutoff]:
+            del self._ledger[key]
+
+    async def ledger(self, tenant: str, day: Optional[str] = None) -> Dict[str, Any]:
+        """Usage recorded for a tenant on a day (default today, UTC)"""
+        key = self._ledger_key(tenant, day or datetime.utcnow().strftime("%Y-%m-%d"))
+        entry: Dict[str, Any] = dict(self._ledger.get(key, {}))
+        if self.redis:
+            try:
+                for field, value in (await self.redis.hgetall(key)).items():
+                    entry[field] = entry.get(field, 0) + int(value)
+            except Exception as e:
+                logger.warning(f"⚠️  Usage ledger read failed for {tenant}: {e}")
+        models = {field[len("tokens:"):]: int(value) for field, value in entry.items() if field.startswith("tokens:")}
+        return {
+            "requests": int(entry.get("requests", 0)),
+            "tokens": int(entry.get("tokens", 0)),
+            "credits": int(entry.get("credits", 0)),
+            "tokens_by_model": models
+        }
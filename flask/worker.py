@@ -0,0 +1,58 @@
+"""
+VPN Enterprise - Standalone Job Worker
+======================================
+Runs fullstack generation jobs from the Redis Streams queue without serving HTTP,
+so generation capacity scales independently of the API nodes.
+
+    python worker.py
+
+Uses the same environment as the API (REDIS_*, OPENAI_API_KEY, JOB_MAX_CONCURRENCY, ...).
+Set JOB_QUEUE_CONSUME=false on the API containers to leave all jobs to workers.
+SIGTERM drains like the API: running jobs get JOB_DRAIN_TIMEOUT seconds, then
+unfinished ones are re-queued for another worker.
+"""
+
+import asyncio
+import logging
+import signal
+
+import httpx
+
+import app_nexusai_production as api
+
+logger = logging.getLogger("worker")
+
+
+async def main():
+    api.http_client = httpx.AsyncClient(timeout=10.0)
+    # Same Redis-backed budgets, ledger and caches as the API, so jobs settle where they were reserved
+    await api.start_shared_state()
+    if not api.redis_client or api.JOB_QUEUE_BACKEND != "redis":
+        logger.error("❌ Worker needs Redis and JOB_QUEUE_BACKEND=redis")
+        await api.http_client.aclose()
+        await api.stop_shared_state()
+        raise SystemExit(1)
+
+    await api.start_job_runtime(consume=True)
+    if not api.job_queue:
+        await api.stop_job_runtime()
+        await api.http_client.aclose()
+        await api.stop_shared_state()
+        raise SystemExit(1)
+    logger.info(f"🚀 Worker '{api.job_queue.consumer}' running (Ctrl+C or SIGTERM to stop)")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+    logger.info("🛑 Worker shutting down, draining jobs...")
+    await api.stop_job_runtime()
+    api.cpu_pool.shutdown()
+    await api.http_client.aclose()
+    await api.stop_shared_state()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())